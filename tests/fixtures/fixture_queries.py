@@ -0,0 +1,59 @@
+import pytest
+from django.core.signals import request_finished, request_started
+
+from core.queries import QueryInspector, assert_query_budget
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        'markers',
+        'query_budget(queries, threshold=None): каждый запрос тестового '
+        'клиента укладывается в бюджет запросов к БД и не делает N+1'
+    )
+
+
+@pytest.fixture
+def query_budget():
+    """Контекстный менеджер: `with query_budget(4): client.get(url)`."""
+    return assert_query_budget
+
+
+@pytest.fixture(autouse=True)
+def _query_budget_marker(request):
+    marker = request.node.get_closest_marker('query_budget')
+    if marker is None:
+        yield
+        return
+    budget = marker.args[0] if marker.args else marker.kwargs['queries']
+    threshold = marker.kwargs.get('threshold')
+    requests = []
+
+    def started(**kwargs):
+        inspector = QueryInspector(threshold)
+        context = inspector.capture()
+        context.__enter__()
+        requests.append((inspector, context))
+
+    def finished(**kwargs):
+        if requests and requests[-1][1] is not None:
+            inspector, context = requests[-1]
+            context.__exit__(None, None, None)
+            requests[-1] = (inspector, None)
+
+    request_started.connect(started)
+    request_finished.connect(finished)
+    try:
+        yield
+    finally:
+        request_started.disconnect(started)
+        request_finished.disconnect(finished)
+    problems = [
+        inspector for inspector, _ in requests
+        if inspector.count > budget or inspector.repeated
+    ]
+    if problems:
+        pytest.fail('\n'.join(
+            f'{inspector.count} запросов при бюджете {budget}\n'
+            f'{inspector.report()}'
+            for inspector in problems
+        ))
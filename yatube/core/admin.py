@@ -0,0 +1,35 @@
+from django.contrib import admin
+from django.utils import timezone
+
+from .models import Task
+
+
+class TaskAdmin(admin.ModelAdmin):
+    list_display = (
+        'pk',
+        'name',
+        'status',
+        'attempts',
+        'created',
+        'run_at',
+        'finished'
+    )
+    list_filter = ('status', 'name')
+    search_fields = ('key',)
+    readonly_fields = (
+        'name', 'args', 'key', 'attempts', 'created', 'started',
+        'finished', 'error'
+    )
+    actions = ('retry',)
+
+    def retry(self, request, queryset):
+        updated = queryset.exclude(status=Task.RUNNING).update(
+            status=Task.PENDING,
+            run_at=timezone.now(),
+            attempts=0
+        )
+        self.message_user(request, f'Поставлено в очередь: {updated}')
+    retry.short_description = 'Выполнить снова'
+
+
+admin.site.register(Task, TaskAdmin)
@@ -1,5 +1,16 @@
 from django.apps import AppConfig
+from django.core.signals import request_started
+from django.utils.module_loading import autodiscover_modules
 
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        from . import metrics
+        from .db import check_connections
+        if metrics.enabled():
+            metrics.instrument_templates()
+        request_started.connect(check_connections)
+        # Задачи регистрируются при импорте модулей tasks.py приложений.
+        autodiscover_modules('tasks')
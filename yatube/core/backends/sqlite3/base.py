@@ -0,0 +1,22 @@
+"""SQLite с настройкой соединения из ключей `DATABASES`.
+
+`PRAGMAS` выполняются на каждом новом соединении. При `TRANSACTION_MODE`
+(`IMMEDIATE`) блоки `atomic` начинаются с `BEGIN IMMEDIATE`: транзакция
+сразу берет блокировку записи и при занятой базе ждет `busy_timeout`.
+Обычный `BEGIN` берет ее только на первой записи, и если другой
+писатель успел закоммитить после чтения в этой транзакции, SQLite
+отвечает «database is locked» сразу, не дожидаясь таймаута.
+"""
+from django.db.backends.sqlite3 import base
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        for name, value in (self.settings_dict.get('PRAGMAS') or {}).items():
+            conn.execute(f'PRAGMA {name} = {value}')
+        return conn
+
+    def _start_transaction_under_autocommit(self):
+        mode = self.settings_dict.get('TRANSACTION_MODE')
+        self.cursor().execute(f'BEGIN {mode}' if mode else 'BEGIN')
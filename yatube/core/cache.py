@@ -0,0 +1,282 @@
+"""Двухуровневый кэш: L1 в памяти процесса перед общим L2.
+
+L1 — небольшой LRU в памяти воркера, L2 — любой кэш из `CACHES`, общий
+для всех воркеров (Redis, файловый и т.п.). Запись всегда идет в L2,
+а ключи измененных записей публикуются в L2 как сообщения об инвалидации
+с порядковым номером и меткой отправителя. Каждый процесс не чаще
+`INVALIDATION_INTERVAL` секунд сверяет номер и выбрасывает из своего L1
+ключи, измененные другими процессами (свои записи в его L1 уже свежие),
+поэтому L1 не отдает устаревшие данные дольше этого интервала.
+На L2 без атомарного `incr` (файловый кэш) в редкой гонке сообщение
+может потеряться, тогда запись живет в L1 не дольше `L1_TIMEOUT`.
+
+Пример настройки:
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'OPTIONS': {'L2': 'shared', 'L1_MAX_ENTRIES': 1000},
+        },
+        'shared': {...},
+    }
+"""
+import pickle
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+INVALIDATION_SEQ_KEY = 'tiered:invalidation:seq'
+INVALIDATION_KEY = 'tiered:invalidation:{}'
+INVALIDATION_TIMEOUT = 300
+
+
+class LRUStore:
+    """Потокобезопасный LRU со сроком жизни записей."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self._lock:
+            self._data[key] = (time.monotonic() + timeout, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._l2_alias = options['L2']
+        self._l1 = LRUStore(options.get('L1_MAX_ENTRIES', 1000))
+        self._l1_timeout = options.get('L1_TIMEOUT', 30)
+        self._interval = options.get('INVALIDATION_INTERVAL', 0.5)
+        self._max_backlog = options.get('INVALIDATION_MAX_BACKLOG', 500)
+        self._seen_seq = None
+        self._checked_at = 0
+        self._lock = threading.Lock()
+        self._stats = Counter()
+        # Метка этого L1 в сообщениях об инвалидации.
+        self._origin = uuid.uuid4().hex
+
+    @property
+    def l2(self):
+        return caches[self._l2_alias]
+
+    def stats(self):
+        """Счетчики попаданий и промахов по уровням."""
+        stats = dict(self._stats)
+        stats['l1_size'] = len(self._l1)
+        return stats
+
+    def _l1_key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def _l1_set(self, l1_key, value, timeout):
+        if timeout == DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            timeout = self._l1_timeout
+        timeout = min(timeout, self._l1_timeout)
+        if timeout > 0:
+            self._l1.set(
+                l1_key,
+                pickle.dumps(value, pickle.HIGHEST_PROTOCOL),
+                timeout
+            )
+
+    def _l1_get(self, l1_key):
+        value = self._l1.get(l1_key)
+        if value is None:
+            return None
+        return pickle.loads(value)
+
+    def _publish(self, l1_keys):
+        """Сообщает остальным процессам, что ключи изменились."""
+        if not l1_keys:
+            return
+        l2 = self.l2
+        try:
+            last = l2.incr(INVALIDATION_SEQ_KEY, len(l1_keys))
+        except ValueError:
+            l2.add(INVALIDATION_SEQ_KEY, 0, None)
+            last = l2.incr(INVALIDATION_SEQ_KEY, len(l1_keys))
+        first = last - len(l1_keys) + 1
+        l2.set_many({
+            INVALIDATION_KEY.format(seq): (self._origin, key)
+            for seq, key in zip(range(first, last + 1), l1_keys)
+        }, INVALIDATION_TIMEOUT)
+
+    def _sync(self):
+        """Применяет к L1 сообщения об инвалидации из L2."""
+        now = time.monotonic()
+        if now - self._checked_at < self._interval:
+            return
+        with self._lock:
+            if now - self._checked_at < self._interval:
+                return
+            self._checked_at = now
+            current = self.l2.get(INVALIDATION_SEQ_KEY, 0)
+            seen, self._seen_seq = self._seen_seq, current
+            if seen is None or current == seen:
+                return
+            if current < seen or current - seen > self._max_backlog:
+                self._l1.clear()
+                self._stats['l1_flushes'] += 1
+                return
+            messages = self.l2.get_many([
+                INVALIDATION_KEY.format(seq)
+                for seq in range(seen + 1, current + 1)
+            ])
+            if len(messages) < current - seen:
+                self._l1.clear()
+                self._stats['l1_flushes'] += 1
+                return
+            for origin, l1_key in messages.values():
+                if origin != self._origin:
+                    self._l1.delete(l1_key)
+                    self._stats['invalidations'] += 1
+
+    def get(self, key, default=None, version=None):
+        self._sync()
+        l1_key = self._l1_key(key, version)
+        value = self._l1_get(l1_key)
+        if value is not None:
+            self._stats['l1_hits'] += 1
+            metrics.cache_lookup(1, 0)
+            return value
+        self._stats['l1_misses'] += 1
+        value = self.l2.get(key, version=version)
+        if value is None:
+            self._stats['l2_misses'] += 1
+            metrics.cache_lookup(0, 1)
+            return default
+        self._stats['l2_hits'] += 1
+        metrics.cache_lookup(1, 0)
+        self._l1_set(l1_key, value, DEFAULT_TIMEOUT)
+        return value
+
+    def get_many(self, keys, version=None):
+        self._sync()
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._l1_get(self._l1_key(key, version))
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        self._stats['l1_hits'] += len(found)
+        self._stats['l1_misses'] += len(missing)
+        if missing:
+            from_l2 = self.l2.get_many(missing, version=version)
+            self._stats['l2_hits'] += len(from_l2)
+            self._stats['l2_misses'] += len(missing) - len(from_l2)
+            for key, value in from_l2.items():
+                l1_key = self._l1_key(key, version)
+                self._l1_set(l1_key, value, DEFAULT_TIMEOUT)
+            found.update(from_l2)
+        metrics.cache_lookup(len(found), len(keys) - len(found))
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        l1_key = self._l1_key(key, version)
+        self.l2.set(key, value, timeout, version=version)
+        self._l1_set(l1_key, value, timeout)
+        self._publish([l1_key])
+        self._stats['sets'] += 1
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            l1_key = self._l1_key(key, version)
+            self._l1_set(l1_key, value, timeout)
+            self._publish([l1_key])
+            self._stats['sets'] += 1
+        return added
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.l2.set_many(data, timeout, version=version)
+        l1_keys = []
+        for key, value in data.items():
+            l1_key = self._l1_key(key, version)
+            if key not in failed:
+                self._l1_set(l1_key, value, timeout)
+            l1_keys.append(l1_key)
+        self._publish(l1_keys)
+        self._stats['sets'] += len(data)
+        return failed
+
+    def delete(self, key, version=None):
+        l1_key = self._l1_key(key, version)
+        self._l1.delete(l1_key)
+        self.l2.delete(key, version=version)
+        self._publish([l1_key])
+        self._stats['deletes'] += 1
+
+    def delete_many(self, keys, version=None):
+        l1_keys = [self._l1_key(key, version) for key in keys]
+        for l1_key in l1_keys:
+            self._l1.delete(l1_key)
+        self.l2.delete_many(keys, version=version)
+        self._publish(l1_keys)
+        self._stats['deletes'] += len(l1_keys)
+
+    def incr(self, key, delta=1, version=None):
+        l1_key = self._l1_key(key, version)
+        self._l1.delete(l1_key)
+        value = self.l2.incr(key, delta, version=version)
+        self._publish([l1_key])
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def has_key(self, key, version=None):
+        self._sync()
+        if self._l1_get(self._l1_key(key, version)) is not None:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def clear(self):
+        self._l1.clear()
+        self.l2.clear()
+        # Скачок номера больше INVALIDATION_MAX_BACKLOG заставит
+        # остальные процессы полностью сбросить свой L1.
+        self.l2.set(INVALIDATION_SEQ_KEY, int(time.time() * 1000), None)
+        with self._lock:
+            self._seen_seq = None
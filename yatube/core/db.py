@@ -0,0 +1,21 @@
+"""Проверка переиспользуемых соединений с БД.
+
+При `CONN_MAX_AGE` соединение живет между запросами. С ключом
+`CONN_HEALTH_CHECKS` перед запросом такое соединение проверяется
+и закрывается, если сервер или пулер его оборвал, — иначе первый
+запрос после обрыва упал бы с ошибкой. В Django 4.1+ то же делает
+сам Django по этой же настройке.
+"""
+from django.db import connections
+
+
+def check_connections(**kwargs):
+    """Закрывает оборванные переиспользуемые соединения."""
+    for connection in connections.all():
+        if (
+            connection.settings_dict.get('CONN_HEALTH_CHECKS')
+            and connection.connection is not None
+            and not connection.in_atomic_block
+            and not connection.is_usable()
+        ):
+            connection.close()
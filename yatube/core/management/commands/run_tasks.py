@@ -0,0 +1,80 @@
+import signal
+import time
+from concurrent.futures import FIRST_COMPLETED, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import tasks
+
+
+class Command(BaseCommand):
+    help = (
+        'Воркер очереди фоновых задач: забирает готовые задачи из БД '
+        'и выполняет их в пуле потоков или процессов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--executor', choices=('thread', 'process'), default='thread',
+            help='Пул потоков для задач с вводом-выводом, пул процессов '
+                 'для тяжелых вычислений (картинки).'
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument(
+            '--poll', type=float, default=1.0,
+            help='Пауза в секундах, когда очередь пуста.'
+        )
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Выполнить готовые задачи в текущем процессе и выйти.'
+        )
+
+    def handle(self, *args, **options):
+        if options['once']:
+            done = tasks.run_pending(limit=10 ** 6)
+            self.stdout.write(f'Выполнено задач: {done}')
+            return
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        executor = tasks.make_executor(
+            options['executor'], options['concurrency']
+        )
+        self.stdout.write(
+            f"Воркер запущен: {options['executor']} x "
+            f"{options['concurrency']}"
+        )
+        try:
+            self.loop(executor, options['concurrency'], options['poll'])
+        finally:
+            # Начатые задачи дорабатывают, новые не берутся.
+            executor.shutdown(wait=True)
+
+    def stop(self, signum, frame):
+        self.stopping = True
+
+    def loop(self, executor, concurrency, poll):
+        running = set()
+        maintained = 0
+        while not self.stopping:
+            if time.monotonic() - maintained > 60:
+                maintained = time.monotonic()
+                tasks.requeue_stale(settings.TASKS_TIMEOUT)
+                tasks.purge(settings.TASKS_KEEP_DONE)
+            claimed = tasks.claim(concurrency - len(running))
+            for task_id in claimed:
+                running.add(executor.submit(tasks.execute_in_worker, task_id))
+            if running:
+                done, running = wait(
+                    running,
+                    timeout=0 if claimed else poll,
+                    return_when=FIRST_COMPLETED
+                )
+                for future in done:
+                    if future.exception():
+                        self.stderr.write(
+                            f'Ошибка воркера: {future.exception()!r}'
+                        )
+            elif not claimed:
+                time.sleep(poll)
@@ -0,0 +1,314 @@
+"""Метрики запросов по вьюхам, собираемые в памяти процесса.
+
+`MetricsMiddleware` считает каждый запрос и его полное время, а у доли
+запросов (`METRICS_SAMPLE_RATE`) еще и время в БД, число SQL-запросов
+и повторов одинаковых запросов, время рендера шаблонов и попадания
+в кэш. Остальные запросы обходятся двумя вызовами `perf_counter`.
+Данные копятся в `registry` и отдаются вьюхами `core.views`: JSON для
+сотрудников и текстовый формат Prometheus.
+
+Рендер шаблонов оборачивается замером только при включенных метриках
+(`enabled()`); сигнал `template_rendered` для этого не годится: Django
+отправляет его лишь в тестах.
+"""
+import random
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import connections
+
+# Границы корзин гистограммы времени ответа, в секундах.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+UNRESOLVED = '<unresolved>'
+
+_local = threading.local()
+
+
+class Recorder:
+    """Замеры одного выбранного запроса."""
+
+    def __init__(self):
+        self.db_time = 0.0
+        self.queries = 0
+        self.statements = Counter()
+        self.template_time = 0.0
+        self.template_depth = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - started
+            self.queries += 1
+            self.statements[(sql, repr(params))] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.statements.values())
+
+
+def current():
+    """Recorder текущего запроса или None, если запрос не выбран."""
+    return getattr(_local, 'recorder', None)
+
+
+def cache_lookup(hits, misses):
+    """Вызывается кэшем: учитывает попадания в выбранном запросе."""
+    recorder = current()
+    if recorder is not None:
+        recorder.cache_hits += hits
+        recorder.cache_misses += misses
+
+
+def timed_render(render):
+    """Обертка рендера шаблона: учитывает время внешнего рендера."""
+    def wrapper(self, *args, **kwargs):
+        recorder = current()
+        if recorder is None:
+            return render(self, *args, **kwargs)
+        recorder.template_depth += 1
+        started = time.perf_counter()
+        try:
+            return render(self, *args, **kwargs)
+        finally:
+            recorder.template_depth -= 1
+            if not recorder.template_depth:
+                recorder.template_time += time.perf_counter() - started
+    wrapper.timed = True
+    return wrapper
+
+
+def enabled():
+    """Метрики собираются: middleware подключен и выборка не пуста."""
+    return (
+        'core.metrics.MetricsMiddleware' in settings.MIDDLEWARE
+        and getattr(settings, 'METRICS_SAMPLE_RATE', 0.1) > 0
+    )
+
+
+def instrument_templates():
+    """Оборачивает рендер шаблонов Django замером времени, один раз."""
+    from django.template.backends.django import Template
+    if not getattr(Template.render, 'timed', False):
+        Template.render = timed_render(Template.render)
+
+
+class ViewStats:
+    FIELDS = (
+        'requests', 'sampled', 'errors', 'duration', 'duration_max',
+        'db_time', 'queries', 'duplicates', 'template_time',
+        'cache_hits', 'cache_misses',
+    )
+
+    def __init__(self):
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+        self.buckets = [0] * len(BUCKETS)
+
+    def as_dict(self):
+        data = {field: getattr(self, field) for field in self.FIELDS}
+        data['buckets'] = dict(zip(BUCKETS, self.buckets))
+        return data
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = defaultdict(ViewStats)
+
+    def add(self, view, duration, status, recorder=None):
+        with self._lock:
+            stats = self._views[view]
+            stats.requests += 1
+            stats.duration += duration
+            stats.duration_max = max(stats.duration_max, duration)
+            if status >= 500:
+                stats.errors += 1
+            for i, bound in enumerate(BUCKETS):
+                if duration <= bound:
+                    stats.buckets[i] += 1
+                    break
+            if recorder is not None:
+                stats.sampled += 1
+                stats.db_time += recorder.db_time
+                stats.queries += recorder.queries
+                stats.duplicates += recorder.duplicates
+                stats.template_time += recorder.template_time
+                stats.cache_hits += recorder.cache_hits
+                stats.cache_misses += recorder.cache_misses
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                view: stats.as_dict()
+                for view, stats in sorted(self._views.items())
+            }
+
+    def reset(self):
+        with self._lock:
+            self._views.clear()
+
+
+registry = Registry()
+
+
+def summary():
+    """Средние по вьюхам в миллисекундах, для JSON-эндпоинта."""
+    result = {}
+    for view, data in registry.snapshot().items():
+        sampled = data['sampled'] or None
+        lookups = data['cache_hits'] + data['cache_misses']
+
+        def per_sample(value, scale=1):
+            return round(value * scale / sampled, 2) if sampled else None
+
+        result[view] = {
+            'requests': data['requests'],
+            'sampled': data['sampled'],
+            'errors': data['errors'],
+            'mean_ms': round(data['duration'] * 1000 / data['requests'], 2),
+            'max_ms': round(data['duration_max'] * 1000, 2),
+            'db_ms': per_sample(data['db_time'], 1000),
+            'queries': per_sample(data['queries']),
+            'duplicate_queries': per_sample(data['duplicates']),
+            'template_ms': per_sample(data['template_time'], 1000),
+            'cache_hit_ratio': (
+                round(data['cache_hits'] / lookups, 3) if lookups else None
+            ),
+        }
+    return result
+
+
+def prometheus():
+    """Метрики в текстовом формате Prometheus 0.0.4."""
+    snapshot = registry.snapshot()
+    lines = []
+
+    def metric(name, kind, help_text, values):
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        lines.extend(values)
+
+    def label(view):
+        view = view.replace('\\', '\\\\').replace('"', '\\"')
+        return f'view="{view}"'
+
+    histogram = []
+    for view, data in snapshot.items():
+        cumulative = 0
+        for bound, count in data['buckets'].items():
+            cumulative += count
+            histogram.append(
+                f'yatube_request_duration_seconds_bucket'
+                f'{{{label(view)},le="{bound}"}} {cumulative}'
+            )
+        histogram.append(
+            f'yatube_request_duration_seconds_bucket'
+            f'{{{label(view)},le="+Inf"}} {data["requests"]}'
+        )
+        histogram.append(
+            f'yatube_request_duration_seconds_sum{{{label(view)}}} '
+            f'{data["duration"]}'
+        )
+        histogram.append(
+            f'yatube_request_duration_seconds_count{{{label(view)}}} '
+            f'{data["requests"]}'
+        )
+    metric(
+        'yatube_request_duration_seconds', 'histogram',
+        'Время ответа вьюхи.', histogram
+    )
+    counters = (
+        ('errors', 'yatube_request_errors_total', 'Ответов с кодом 5xx.'),
+        ('sampled', 'yatube_sampled_requests_total',
+         'Запросов с подробными замерами.'),
+        ('db_time', 'yatube_db_seconds_total',
+         'Время в БД у выбранных запросов.'),
+        ('queries', 'yatube_db_queries_total',
+         'SQL-запросов у выбранных запросов.'),
+        ('duplicates', 'yatube_db_duplicate_queries_total',
+         'Повторов одинаковых SQL-запросов у выбранных запросов.'),
+        ('template_time', 'yatube_template_seconds_total',
+         'Время рендера шаблонов у выбранных запросов.'),
+        ('cache_hits', 'yatube_cache_hits_total',
+         'Попаданий в кэш у выбранных запросов.'),
+        ('cache_misses', 'yatube_cache_misses_total',
+         'Промахов кэша у выбранных запросов.'),
+    )
+    for field, name, help_text in counters:
+        metric(name, 'counter', help_text, [
+            f'{name}{{{label(view)}}} {data[field]}'
+            for view, data in snapshot.items()
+        ])
+    return '\n'.join(lines) + '\n'
+
+
+def prometheus_tasks(stats):
+    """Метрики очереди фоновых задач по `core.tasks.stats()`."""
+    gauges = (
+        ('pending', 'yatube_task_queue_depth', 'Задач в очереди.'),
+        ('running', 'yatube_tasks_running', 'Задач в работе.'),
+        ('failed', 'yatube_tasks_failed', 'Задач, исчерпавших повторы.'),
+        ('oldest_pending_seconds', 'yatube_task_oldest_pending_seconds',
+         'Сколько ждет самая старая готовая задача.'),
+        ('wait_p50_seconds', 'yatube_task_wait_p50_seconds',
+         'Медиана ожидания до начала выполнения за последний час.'),
+        ('wait_max_seconds', 'yatube_task_wait_max_seconds',
+         'Наибольшее ожидание до начала выполнения за последний час.'),
+        ('run_p50_seconds', 'yatube_task_run_p50_seconds',
+         'Медиана времени выполнения за последний час.'),
+    )
+    lines = []
+    for field, name, help_text in gauges:
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        lines.extend(
+            f'{name}{{task="{task}"}} {data.get(field, 0)}'
+            for task, data in sorted(stats.items())
+        )
+    return '\n'.join(lines) + '\n'
+
+
+class MetricsMiddleware:
+    """Считает время и ресурсы запросов по имени вьюхи."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        rate = getattr(settings, 'METRICS_SAMPLE_RATE', 0.1)
+        recorder = Recorder() if random.random() < rate else None
+        started = time.perf_counter()
+        if recorder is None:
+            response = self.get_response(request)
+        else:
+            response = self.sampled_response(request, recorder)
+        duration = time.perf_counter() - started
+        match = getattr(request, 'resolver_match', None)
+        registry.add(
+            match.view_name if match else UNRESOLVED,
+            duration,
+            response.status_code,
+            recorder
+        )
+        return response
+
+    def sampled_response(self, request, recorder):
+        _local.recorder = recorder
+        wrappers = [
+            connection.execute_wrapper(recorder)
+            for connection in connections.all()
+        ]
+        try:
+            for wrapper in wrappers:
+                wrapper.__enter__()
+            return self.get_response(request)
+        finally:
+            for wrapper in reversed(wrappers):
+                wrapper.__exit__(None, None, None)
+            _local.recorder = None
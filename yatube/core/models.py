@@ -0,0 +1,60 @@
+from django.db import models
+
+
+class Task(models.Model):
+    """Фоновая задача в очереди, см. core/tasks.py."""
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Не выполнена'),
+    )
+
+    name = models.CharField('Задача', max_length=100)
+    args = models.TextField('Аргументы (JSON)', default='[]')
+    key = models.CharField(
+        'Ключ',
+        max_length=200,
+        blank=True,
+        help_text='Пока задача с ключом ждет в очереди, такая же '
+                  'задача не ставится повторно'
+    )
+    status = models.CharField(
+        'Статус',
+        max_length=10,
+        choices=STATUSES,
+        default=PENDING
+    )
+    attempts = models.PositiveSmallIntegerField('Попыток', default=0)
+    created = models.DateTimeField('Поставлена', auto_now_add=True)
+    run_at = models.DateTimeField('Выполнить после')
+    started = models.DateTimeField('Начата', null=True, blank=True)
+    finished = models.DateTimeField('Завершена', null=True, blank=True)
+    error = models.TextField('Последняя ошибка', blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'],
+                name='task_queue_idx'
+            ),
+            models.Index(fields=['key', 'status'], name='task_key_idx'),
+        ]
+        constraints = [
+            # Второй такой же задачи в очереди быть не может, даже если
+            # их ставят одновременно: enqueue() ловит IntegrityError.
+            models.UniqueConstraint(
+                fields=['key', 'status'],
+                condition=models.Q(status='pending') & ~models.Q(key=''),
+                name='task_pending_key_uniq'
+            ),
+        ]
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+
+    def __str__(self):
+        return f'{self.name} #{self.pk}'
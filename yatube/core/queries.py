@@ -0,0 +1,152 @@
+"""Поиск N+1: повторов SQL-запросов одной формы в пределах запроса.
+
+`QueryInspector` подключается к `connection.execute_wrapper` и запоминает
+форму каждого запроса (SQL без параметров, списки `IN (...)` схлопнуты)
+вместе с местом, откуда он пришел: шаблон и строка для запросов из
+рендера, иначе файл и строка кода проекта. Форма, повторенная
+`QUERY_REPEAT_THRESHOLD` раз и больше, — почти всегда ленивое обращение
+к связанной модели в цикле (`{{ comment.author.username }}` без
+`select_related`).
+
+В разработке (DEBUG) `QueryInspectorMiddleware` пишет такие повторы
+в лог `core.queries`. В тестах `assert_query_budget` падает, если вьюха
+превысила заявленное число запросов или повторяет запросы.
+"""
+import logging
+import os
+import re
+import sys
+from collections import Counter, OrderedDict
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.template.base import Node
+
+logger = logging.getLogger(__name__)
+
+IN_LIST_RE = re.compile(r'\bIN \((?:%s, )*%s\)')
+# Обертки запросов из самого core не считаются местом вызова.
+INSTRUMENTATION = {
+    __file__,
+    os.path.join(os.path.dirname(__file__), 'metrics.py'),
+}
+
+
+def default_threshold():
+    return getattr(settings, 'QUERY_REPEAT_THRESHOLD', 3)
+
+
+def shape(sql):
+    """SQL без значений: запросы с разными id дают одну форму."""
+    return IN_LIST_RE.sub('IN (...)', sql)
+
+
+def origin():
+    """Откуда пришел запрос: `шаблон:строка` или `файл:строка`."""
+    frame = sys._getframe(1)
+    code_origin = None
+    while frame is not None:
+        node = frame.f_locals.get('self')
+        # type(), а не isinstance: ленивые объекты вроде request.user
+        # подменяют __class__ и при проверке сами пошли бы в БД.
+        if issubclass(type(node), Node) and getattr(node, 'token', None):
+            name = getattr(node.origin, 'template_name', None)
+            return f'{name or node.origin.name}:{node.token.lineno}'
+        filename = frame.f_code.co_filename
+        if code_origin is None and is_project_file(filename):
+            code_origin = (
+                f'{os.path.relpath(filename, settings.BASE_DIR)}:'
+                f'{frame.f_lineno}'
+            )
+        frame = frame.f_back
+    return code_origin or '<unknown>'
+
+
+def is_project_file(filename):
+    return (
+        filename.startswith(settings.BASE_DIR)
+        and filename not in INSTRUMENTATION
+        and 'site-packages' not in filename
+    )
+
+
+class QueryInspector:
+    """Запоминает формы запросов и места, откуда они выполнены."""
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or default_threshold()
+        self.shapes = OrderedDict()
+
+    def __call__(self, execute, sql, params, many, context):
+        self.shapes.setdefault(shape(sql), Counter())[origin()] += 1
+        return execute(sql, params, many, context)
+
+    @contextmanager
+    def capture(self):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    @property
+    def count(self):
+        return sum(sum(origins.values()) for origins in self.shapes.values())
+
+    @property
+    def repeated(self):
+        """Формы, повторенные не меньше `threshold` раз: {форма: места}."""
+        return {
+            sql: origins for sql, origins in self.shapes.items()
+            if sum(origins.values()) >= self.threshold
+        }
+
+    def report(self):
+        lines = []
+        for sql, origins in self.repeated.items():
+            lines.append(f'{sum(origins.values())} x {sql}')
+            for place, count in origins.most_common():
+                lines.append(f'    {count} x {place}')
+        return '\n'.join(lines)
+
+
+@contextmanager
+def assert_query_budget(budget, threshold=None):
+    """Падает, если в блоке больше `budget` запросов или есть N+1.
+
+        with assert_query_budget(4):
+            client.get(url)
+    """
+    inspector = QueryInspector(threshold)
+    with inspector.capture():
+        yield inspector
+    problems = []
+    if inspector.count > budget:
+        problems.append(
+            f'Выполнено {inspector.count} запросов при бюджете {budget}.'
+        )
+    if inspector.repeated:
+        problems.append('Повторяющиеся запросы (N+1):\n' + inspector.report())
+    if problems:
+        raise AssertionError('\n'.join(problems))
+
+
+class QueryInspectorMiddleware:
+    """В DEBUG пишет в лог повторяющиеся запросы каждого запроса."""
+
+    def __init__(self, get_response):
+        if not settings.DEBUG:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        inspector = QueryInspector()
+        with inspector.capture():
+            response = self.get_response(request)
+        if inspector.repeated:
+            logger.warning(
+                'N+1 на %s %s:\n%s',
+                request.method, request.get_full_path(), inspector.report()
+            )
+        return response
@@ -0,0 +1,117 @@
+"""Чтение с реплик БД для тяжелых вьюх.
+
+Вьюхи, обернутые в `replica_reads`, на время запроса читают с одной
+из реплик `DATABASE_REPLICAS` (реплика выбирается на запрос, чтобы
+все его запросы видели один снимок данных). Запись и все остальные
+вьюхи идут в `default`.
+
+Реплика отстает от primary, поэтому после запроса, меняющего данные
+(любой метод кроме GET/HEAD/OPTIONS/TRACE), `PrimaryStickinessMiddleware`
+ставит cookie, и `REPLICA_STICKY_SECONDS` секунд этот пользователь
+читает с primary — так он сразу видит собственный пост или комментарий.
+
+Внутри `primary_reads()` обернутые вьюхи тоже читают с primary. Так
+отвечают страницы с ETag и Last-Modified: версия сдвигается при коммите
+на primary, и отстающая реплика отрендерила бы под новым валидатором
+старые строки, которые клиенты и прокси хранили бы до следующей записи.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+
+STICKY_COOKIE = 'primary_until'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+_state = threading.local()
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', ())
+
+
+def current_replica():
+    """Реплика текущего запроса или None, если читаем с primary."""
+    return getattr(_state, 'replica', None)
+
+
+def sticky(request):
+    """Пользователь недавно писал и должен читать с primary."""
+    try:
+        until = float(request.COOKIES.get(STICKY_COOKIE, 0))
+    except ValueError:
+        return False
+    return until > time.time()
+
+
+@contextmanager
+def primary_reads():
+    """Вьюхи с `replica_reads` внутри блока читают с primary."""
+    previous = getattr(_state, 'primary', False)
+    _state.primary = True
+    try:
+        yield
+    finally:
+        _state.primary = previous
+
+
+def replica_reads(view):
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        aliases = replicas()
+        if (
+            not aliases
+            or request.method not in SAFE_METHODS
+            or sticky(request)
+            or getattr(_state, 'primary', False)
+        ):
+            return view(request, *args, **kwargs)
+        _state.replica = random.choice(aliases)
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            _state.replica = None
+    return wrapper
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return current_replica()
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # На репликах те же данные, что и на primary.
+        aliases = {'default', *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in replicas():
+            return False
+        return None
+
+
+class PrimaryStickinessMiddleware:
+    """После записи закрепляет чтение пользователя за primary."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if request.method not in SAFE_METHODS and replicas():
+            window = settings.REPLICA_STICKY_SECONDS
+            response.set_cookie(
+                STICKY_COOKIE,
+                str(time.time() + window),
+                max_age=window,
+                httponly=True,
+                samesite='Lax'
+            )
+        return response
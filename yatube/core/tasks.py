@@ -0,0 +1,253 @@
+"""Очередь фоновых задач в БД.
+
+Задача — функция, зарегистрированная декоратором `@task` в модуле
+`tasks.py` любого приложения. `enqueue()` записывает ее вызов строкой
+`Task` в той же транзакции, что и изменение данных: откат отменяет
+и задачу, а воркер видит ее только после коммита. Команда `run_tasks`
+забирает готовые задачи условным UPDATE (так несколько воркеров
+не возьмут одну задачу) и выполняет их в пуле потоков или процессов.
+
+Упавшая задача повторяется через `retry_delay * 2 ** (попытка - 1)`
+секунд, пока не кончатся `retries`. Задача может выполниться больше
+одного раза (повтор, падение воркера посреди работы), поэтому функции
+задач должны быть идемпотентны. `stats()` отдает глубину очереди,
+ожидание до начала выполнения и время работы для метрик.
+"""
+import json
+import logging
+import multiprocessing
+import traceback
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Count, F, Min
+from django.utils import timezone
+
+from .models import Task
+
+logger = logging.getLogger(__name__)
+
+_registry = {}
+
+
+def task(name=None, retries=3, retry_delay=10):
+    """Регистрирует функцию как задачу и добавляет ей `enqueue()`."""
+    def decorator(func):
+        task_name = name or f'{func.__module__}.{func.__name__}'
+        _registry[task_name] = (func, retries, retry_delay)
+
+        def enqueue_task(*args, key='', delay=0):
+            return enqueue(task_name, *args, key=key, delay=delay)
+        func.task_name = task_name
+        func.enqueue = enqueue_task
+        return func
+    return decorator
+
+
+def enqueue(name, *args, key='', delay=0):
+    """Ставит задачу в очередь; при TASKS_EAGER выполняет ее сразу.
+
+    Задача с `key` не ставится, если такая же еще ждет в очереди.
+    """
+    if name not in _registry:
+        raise KeyError(f'Неизвестная задача {name}')
+    if getattr(settings, 'TASKS_EAGER', False):
+        func, _, _ = _registry[name]
+        func(*json.loads(json.dumps(args)))
+        return None
+    task = Task(
+        name=name,
+        args=json.dumps(args),
+        key=key,
+        run_at=timezone.now() + timedelta(seconds=delay)
+    )
+    if not key:
+        task.save()
+        return task
+    try:
+        with transaction.atomic():
+            task.save()
+    except IntegrityError:
+        return None
+    return task
+
+
+def claim(limit):
+    """Забирает до `limit` готовых задач; возвращает их id."""
+    now = timezone.now()
+    candidates = Task.objects.filter(
+        status=Task.PENDING,
+        run_at__lte=now
+    ).order_by('run_at', 'pk').values_list('pk', flat=True)[:limit]
+    claimed = []
+    for pk in list(candidates):
+        if Task.objects.filter(pk=pk, status=Task.PENDING).update(
+            status=Task.RUNNING,
+            started=now,
+            attempts=F('attempts') + 1
+        ):
+            claimed.append(pk)
+    return claimed
+
+
+def execute(task_id):
+    """Выполняет взятую задачу и записывает результат."""
+    current = Task.objects.get(pk=task_id)
+    func, retries, retry_delay = _registry.get(current.name, (None, 0, 0))
+    try:
+        if func is None:
+            raise KeyError(f'Неизвестная задача {current.name}')
+        func(*json.loads(current.args))
+    except Exception:
+        error = traceback.format_exc()
+        logger.exception('Задача %s упала', current)
+        now = timezone.now()
+        if func is not None and current.attempts <= retries:
+            delay = retry_delay * 2 ** (current.attempts - 1)
+            requeue(current, now + timedelta(seconds=delay), error)
+        else:
+            fail(current, error)
+        return False
+    Task.objects.filter(pk=task_id).update(
+        status=Task.DONE,
+        finished=timezone.now()
+    )
+    return True
+
+
+def execute_in_worker(task_id):
+    """`execute` для пула: соединения с БД у потока или процесса свои."""
+    close_old_connections()
+    try:
+        return execute(task_id)
+    finally:
+        close_old_connections()
+
+
+def run_pending(limit=100):
+    """Выполняет готовые задачи в текущем потоке (тесты, cron)."""
+    done = 0
+    while True:
+        claimed = claim(limit - done)
+        for task_id in claimed:
+            execute(task_id)
+        done += len(claimed)
+        if not claimed or done >= limit:
+            return done
+
+
+def fail(task, error):
+    Task.objects.filter(pk=task.pk).update(
+        status=Task.FAILED,
+        finished=timezone.now(),
+        error=error
+    )
+
+
+def requeue(task, run_at, error):
+    """Возвращает задачу в очередь. Если такая же задача с ключом уже
+    ждет, повтор не нужен, и эта задача помечается упавшей."""
+    try:
+        with transaction.atomic():
+            Task.objects.filter(pk=task.pk).update(
+                status=Task.PENDING,
+                run_at=run_at,
+                error=error
+            )
+    except IntegrityError:
+        fail(task, error + '\nТакая же задача уже в очереди.')
+
+
+def requeue_stale(timeout):
+    """Возвращает в очередь задачи, чей воркер пропал посреди работы.
+
+    Задача, исчерпавшая попытки, помечается упавшей: иначе задача,
+    которая роняет воркер (нехватка памяти, сбой в C-библиотеке),
+    бралась бы снова бесконечно. Возвращает число возвращенных задач.
+    """
+    stale = Task.objects.filter(
+        status=Task.RUNNING,
+        started__lt=timezone.now() - timedelta(seconds=timeout)
+    ).only('pk', 'name', 'attempts', 'error')
+    requeued = 0
+    for current in stale:
+        _, retries, _ = _registry.get(current.name, (None, 0, 0))
+        error = 'Воркер пропал посреди выполнения задачи.'
+        if current.attempts > retries:
+            fail(current, error)
+        else:
+            requeue(current, timezone.now(), error)
+            requeued += 1
+    return requeued
+
+
+def purge(keep):
+    """Удаляет выполненные задачи старше `keep` секунд."""
+    return Task.objects.filter(
+        status=Task.DONE,
+        finished__lt=timezone.now() - timedelta(seconds=keep)
+    ).delete()[0]
+
+
+def _setup_process():
+    import django
+    django.setup()
+
+
+def make_executor(kind, concurrency):
+    if kind == 'process':
+        # spawn, а не fork: дочерний процесс не должен унаследовать
+        # открытые соединения с БД родителя.
+        return ProcessPoolExecutor(
+            max_workers=concurrency,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_setup_process
+        )
+    return ThreadPoolExecutor(
+        max_workers=concurrency,
+        thread_name_prefix='tasks'
+    )
+
+
+def stats(window=3600, sample=1000):
+    """Глубина очереди, ожидание и время выполнения по задачам."""
+    now = timezone.now()
+    result = {}
+    counts = Task.objects.values('name', 'status').annotate(
+        count=Count('pk')
+    ).order_by()
+    for row in counts:
+        data = result.setdefault(row['name'], {
+            status: 0 for status, _ in Task.STATUSES
+        })
+        data[row['status']] = row['count']
+    oldest = Task.objects.filter(
+        status=Task.PENDING,
+        run_at__lte=now
+    ).values('name').annotate(oldest=Min('run_at')).order_by()
+    for row in oldest:
+        result[row['name']]['oldest_pending_seconds'] = (
+            now - row['oldest']
+        ).total_seconds()
+    recent = Task.objects.filter(
+        status=Task.DONE,
+        finished__gte=now - timedelta(seconds=window)
+    ).order_by('-finished').values_list(
+        'name', 'run_at', 'started', 'finished'
+    )
+    timings = {}
+    for name, run_at, started, finished in recent[:sample]:
+        waits, durations = timings.setdefault(name, ([], []))
+        waits.append((started - run_at).total_seconds())
+        durations.append((finished - started).total_seconds())
+    for name, (waits, durations) in timings.items():
+        waits.sort()
+        durations.sort()
+        result[name].update({
+            'wait_p50_seconds': waits[len(waits) // 2],
+            'wait_max_seconds': waits[-1],
+            'run_p50_seconds': durations[len(durations) // 2],
+        })
+    return result
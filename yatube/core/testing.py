@@ -0,0 +1,30 @@
+"""Помощники для тестов."""
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def capture_on_commit_callbacks(using=DEFAULT_DB_ALIAS, execute=False):
+    """Собирает колбэки `transaction.on_commit`, поставленные в блоке.
+
+    `TestCase` откатывает транзакцию теста, и колбэки не выполняются;
+    с `execute=True` они выполняются при выходе из блока, как при
+    коммите; колбэки, поставленные самими колбэками, тоже собираются
+    и выполняются. Аналог `TestCase.captureOnCommitCallbacks` из Django 4.1.
+    """
+    callbacks = []
+    connection = connections[using]
+    start = len(connection.run_on_commit)
+    try:
+        yield callbacks
+    finally:
+        while True:
+            count = len(connection.run_on_commit)
+            for _, callback in connection.run_on_commit[start:count]:
+                callbacks.append(callback)
+                if execute:
+                    callback()
+            if count == len(connection.run_on_commit):
+                break
+            start = count
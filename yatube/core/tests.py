@@ -1,5 +1,36 @@
 from django.conf import settings
-from django.test import TestCase, Client
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import IntegrityError, connection, router, transaction
+from django.http import HttpResponse
+from django.template import Context, Template
+from django.test import (
+    Client, RequestFactory, SimpleTestCase, TestCase, override_settings
+)
+from django.urls import reverse
+from django.utils import timezone
+
+from posts.models import Post
+
+from . import metrics, tasks
+from .cache import TieredCache
+from .models import Task
+from .queries import QueryInspector, assert_query_budget, shape
+from .routers import (
+    STICKY_COOKIE, PrimaryStickinessMiddleware, current_replica,
+    primary_reads, replica_reads
+)
+
+User = get_user_model()
+
+CALLS = []
+
+
+@tasks.task(name='core.tests.record', retries=1, retry_delay=10)
+def record(value):
+    if value == 'fail':
+        raise ValueError(value)
+    CALLS.append(value)
 
 
 class CustomPageTest(TestCase):
@@ -13,3 +44,383 @@ class CustomPageTest(TestCase):
             response = self.client.get('/unexisting_page/')
             self.assertEqual(response.status_code, 404)
             self.assertTemplateUsed(response, 'core/404.html')
+
+
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'tiered-tests',
+    },
+})
+class TieredCacheTest(TestCase):
+    """Тестируем двухуровневый кэш."""
+    def setUp(self):
+        caches['shared'].clear()
+        self.worker_1 = self.make_worker()
+        self.worker_2 = self.make_worker()
+
+    def make_worker(self):
+        return TieredCache('', {
+            'OPTIONS': {'L2': 'shared', 'INVALIDATION_INTERVAL': 0},
+        })
+
+    def test_l1_hit_after_l2_hit(self):
+        """Значение из L2 оседает в L1 процесса."""
+        self.worker_1.set('key', 'value')
+        self.assertEqual(self.worker_2.get('key'), 'value')
+        self.assertEqual(self.worker_2.get('key'), 'value')
+        stats = self.worker_2.stats()
+        self.assertEqual(stats['l2_hits'], 1)
+        self.assertEqual(stats['l1_hits'], 1)
+
+    def test_invalidation_reaches_other_workers(self):
+        """Запись в одном процессе выбрасывает ключ из L1 другого."""
+        self.worker_1.set('key', 'old')
+        self.worker_2.get('key')
+        self.worker_1.set('key', 'new')
+        self.assertEqual(self.worker_2.get('key'), 'new')
+        self.worker_1.delete('key')
+        self.assertIsNone(self.worker_2.get('key'))
+
+    def test_own_writes_stay_in_l1(self):
+        """Своя запись не выбрасывает ключ из собственного L1."""
+        self.worker_1.set('key', 'value')
+        self.worker_2.set('other', 'value')
+        self.assertEqual(self.worker_1.get('key'), 'value')
+        stats = self.worker_1.stats()
+        self.assertEqual(stats['l1_hits'], 1)
+        self.assertNotIn('l2_hits', stats)
+
+    def test_get_many_reads_both_tiers(self):
+        """get_many берет часть ключей из L1, остальные из L2."""
+        self.worker_1.set_many({'a': 1, 'b': 2})
+        self.worker_2.get('a')
+        self.assertEqual(
+            self.worker_2.get_many(['a', 'b', 'c']),
+            {'a': 1, 'b': 2}
+        )
+        stats = self.worker_2.stats()
+        self.assertEqual(stats['l1_hits'], 1)
+        self.assertEqual(stats['l2_misses'], 1)
+
+    def test_clear_flushes_other_workers(self):
+        """Очистка кэша сбрасывает L1 всех процессов."""
+        self.worker_1.set('key', 'value')
+        self.worker_2.get('key')
+        self.worker_1.clear()
+        self.assertIsNone(self.worker_2.get('key'))
+
+    def test_cached_values_are_copies(self):
+        """Изменение полученного объекта не портит значение в L1."""
+        self.worker_1.set('key', ['value'])
+        self.worker_1.get('key').append('other')
+        self.assertEqual(self.worker_1.get('key'), ['value'])
+
+
+@override_settings(METRICS_SAMPLE_RATE=1, METRICS_TOKEN='secret')
+class MetricsTest(TestCase):
+    """Тестируем метрики запросов."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+
+    def setUp(self):
+        metrics.registry.reset()
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_requests_are_counted_by_view(self):
+        """Запросы учитываются по имени вьюхи вместе с БД и шаблонами."""
+        self.client.get(reverse('posts:index'))
+        self.client.get(reverse('posts:index'))
+        self.client.get('/unexisting_page/')
+        stats = self.staff_client.get(reverse('core:metrics_stats')).json()
+        index = stats['views']['posts:index']
+        self.assertEqual(index['requests'], 2)
+        self.assertEqual(index['sampled'], 2)
+        self.assertGreater(index['queries'], 0)
+        self.assertGreater(index['template_ms'], 0)
+        self.assertIsNotNone(index['cache_hit_ratio'])
+        self.assertEqual(stats['views'][metrics.UNRESOLVED]['requests'], 1)
+
+    def test_templates_timed_only_when_enabled(self):
+        """Рендер шаблонов оборачивается, только если метрики включены."""
+        self.assertTrue(metrics.enabled())
+        with override_settings(METRICS_SAMPLE_RATE=0):
+            self.assertFalse(metrics.enabled())
+        with override_settings(MIDDLEWARE=[]):
+            self.assertFalse(metrics.enabled())
+        from django.template.backends.django import Template
+        render = Template.render
+        metrics.instrument_templates()
+        self.assertIs(Template.render, render)
+        self.assertTrue(render.timed)
+
+    def test_duplicate_queries(self):
+        """Одинаковые SQL-запросы с одинаковыми параметрами — повторы."""
+        recorder = metrics.Recorder()
+        for _ in range(3):
+            recorder(lambda *args: None, 'SELECT 1', (1,), False, {})
+        recorder(lambda *args: None, 'SELECT 1', (2,), False, {})
+        self.assertEqual(recorder.queries, 4)
+        self.assertEqual(recorder.duplicates, 2)
+
+    def test_access(self):
+        """Метрики видят только сотрудники и Prometheus с токеном."""
+        urls = (reverse('core:metrics'), reverse('core:metrics_stats'))
+        user_client = Client()
+        user_client.force_login(self.user)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self.client.get(url).status_code, 403)
+                self.assertEqual(user_client.get(url).status_code, 403)
+                self.assertEqual(
+                    self.client.get(
+                        url, HTTP_AUTHORIZATION='Bearer wrong'
+                    ).status_code,
+                    403
+                )
+                self.assertEqual(
+                    self.client.get(
+                        url, HTTP_AUTHORIZATION='Bearer secret'
+                    ).status_code,
+                    200
+                )
+
+    def test_prometheus_format(self):
+        """Экспорт отдает гистограмму и счетчики по вьюхам."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(
+            reverse('core:metrics'), HTTP_AUTHORIZATION='Bearer secret'
+        )
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        body = response.content.decode()
+        self.assertIn('# TYPE yatube_request_duration_seconds histogram', body)
+        self.assertIn(
+            'yatube_request_duration_seconds_count{view="posts:index"} 1',
+            body
+        )
+        self.assertIn('yatube_db_queries_total{view="posts:index"}', body)
+
+
+class DatabaseSettingsTest(TestCase):
+    """Тестируем настройку соединений SQLite."""
+    def test_pragmas_applied(self):
+        """PRAGMA из настроек выполняются на новом соединении."""
+        pragmas = connection.settings_dict.get('PRAGMAS')
+        if connection.vendor != 'sqlite' or not pragmas:
+            self.skipTest('SQLite без PRAGMAS')
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertEqual(cursor.fetchone()[0], pragmas['busy_timeout'])
+
+
+class QueryInspectorTest(TestCase):
+    """Тестируем поиск N+1."""
+    @classmethod
+    def setUpTestData(cls):
+        for i in range(3):
+            author = User.objects.create_user(username=f'author{i}')
+            Post.objects.create(author=author, text=f'Пост {i}')
+
+    def test_repeated_query_points_to_template_line(self):
+        """Повтор запроса из шаблона указывает на его строку."""
+        template = Template(
+            '{% for post in posts %}\n'
+            '{{ post.author.username }}\n'
+            '{% endfor %}'
+        )
+        inspector = QueryInspector(threshold=2)
+        with inspector.capture():
+            template.render(Context({'posts': Post.objects.all()}))
+        self.assertEqual(inspector.count, 4)
+        [origins] = inspector.repeated.values()
+        self.assertEqual(origins, {'<unknown source>:2': 3})
+
+    def test_budget(self):
+        """Бюджет ловит и лишние запросы, и N+1."""
+        with self.assertRaisesMessage(AssertionError, 'бюджете 1'):
+            with assert_query_budget(1):
+                list(Post.objects.all())
+                list(User.objects.all())
+        with self.assertRaisesMessage(AssertionError, 'N+1'):
+            with assert_query_budget(10):
+                for post in Post.objects.all():
+                    post.author.username
+        with assert_query_budget(1):
+            for post in Post.objects.select_related('author'):
+                post.author.username
+
+    def test_shape_ignores_in_lists(self):
+        """Списки IN разной длины дают одну форму запроса."""
+        self.assertEqual(
+            shape('SELECT 1 WHERE id IN (%s, %s, %s)'),
+            shape('SELECT 1 WHERE id IN (%s)')
+        )
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=10)
+class ReplicaRouterTest(SimpleTestCase):
+    """Тестируем чтение с реплик и возврат на primary после записи."""
+    def setUp(self):
+        self.factory = RequestFactory()
+
+        @replica_reads
+        def view(request):
+            return HttpResponse(router.db_for_read(Post))
+        self.view = view
+
+    def read_db(self, request):
+        return self.view(request).content.decode()
+
+    def test_reads_go_to_replica(self):
+        """GET обернутой вьюхи читает с реплики только на время запроса."""
+        self.assertEqual(self.read_db(self.factory.get('/')), 'replica1')
+        self.assertIsNone(current_replica())
+        self.assertEqual(router.db_for_read(Post), 'default')
+        self.assertEqual(router.db_for_write(Post), 'default')
+
+    def test_writes_and_sticky_requests_use_primary(self):
+        """POST и запросы вскоре после записи читают с primary."""
+        self.assertEqual(self.read_db(self.factory.post('/')), 'default')
+        middleware = PrimaryStickinessMiddleware(
+            lambda request: HttpResponse()
+        )
+        response = middleware(self.factory.post('/'))
+        cookie = response.cookies[STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        request = self.factory.get('/')
+        request.COOKIES[STICKY_COOKIE] = cookie.value
+        self.assertEqual(self.read_db(request), 'default')
+        request.COOKIES[STICKY_COOKIE] = '0'
+        self.assertEqual(self.read_db(request), 'replica1')
+
+    def test_primary_reads_block(self):
+        """Внутри primary_reads обернутые вьюхи читают с primary."""
+        with primary_reads():
+            self.assertEqual(self.read_db(self.factory.get('/')), 'default')
+        self.assertEqual(self.read_db(self.factory.get('/')), 'replica1')
+
+    def test_no_migrations_on_replica(self):
+        self.assertFalse(router.allow_migrate('replica1', 'posts'))
+        self.assertTrue(router.allow_migrate('default', 'posts'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        """Без реплик все читают с default и cookie не ставится."""
+        self.assertEqual(self.read_db(self.factory.get('/')), 'default')
+        middleware = PrimaryStickinessMiddleware(
+            lambda request: HttpResponse()
+        )
+        response = middleware(self.factory.post('/'))
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+
+@override_settings(TASKS_EAGER=False)
+class TaskQueueTest(TestCase):
+    """Тестируем очередь фоновых задач."""
+    def setUp(self):
+        CALLS.clear()
+
+    def test_enqueue_and_run(self):
+        """Задача выполняется воркером, а не при постановке."""
+        task = record.enqueue('a')
+        self.assertEqual(CALLS, [])
+        self.assertEqual(task.status, Task.PENDING)
+        self.assertEqual(tasks.run_pending(), 1)
+        self.assertEqual(CALLS, ['a'])
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.DONE)
+        self.assertEqual(task.attempts, 1)
+
+    def test_eager(self):
+        with self.settings(TASKS_EAGER=True):
+            self.assertIsNone(record.enqueue('a'))
+        self.assertEqual(CALLS, ['a'])
+        self.assertFalse(Task.objects.exists())
+
+    def test_delay(self):
+        """Отложенная задача не берется раньше срока."""
+        record.enqueue('a', delay=60)
+        self.assertEqual(tasks.run_pending(), 0)
+
+    def test_key_deduplicates_pending(self):
+        record.enqueue('a', key='same')
+        self.assertIsNone(record.enqueue('a', key='same'))
+        tasks.run_pending()
+        self.assertIsNotNone(record.enqueue('a', key='same'))
+
+    def test_retry_then_fail(self):
+        """Упавшая задача повторяется с задержкой, затем помечается."""
+        task = record.enqueue('fail')
+        tasks.run_pending()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.PENDING)
+        self.assertGreater(task.run_at, timezone.now())
+        self.assertIn('ValueError', task.error)
+        Task.objects.filter(pk=task.pk).update(run_at=timezone.now())
+        tasks.run_pending()
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(task.attempts, 2)
+
+    def test_claim_once(self):
+        """Взятая задача не достается второму воркеру."""
+        record.enqueue('a')
+        self.assertEqual(len(tasks.claim(10)), 1)
+        self.assertEqual(tasks.claim(10), [])
+
+    def test_requeue_stale(self):
+        record.enqueue('a')
+        tasks.claim(10)
+        self.assertEqual(tasks.requeue_stale(600), 0)
+        self.assertEqual(tasks.requeue_stale(-1), 1)
+        self.assertEqual(tasks.run_pending(), 1)
+
+    def test_stale_task_out_of_attempts_fails(self):
+        """Задача, раз за разом роняющая воркер, не берется бесконечно."""
+        task = record.enqueue('a')
+        tasks.claim(10)
+        Task.objects.filter(pk=task.pk).update(attempts=3)
+        self.assertEqual(tasks.requeue_stale(-1), 0)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertIn('Воркер пропал', task.error)
+
+    def test_key_is_unique_in_queue(self):
+        """Ключ защищен ограничением БД, а не только проверкой."""
+        record.enqueue('a', key='same')
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Task.objects.create(
+                name='core.tests.record', key='same', run_at=timezone.now()
+            )
+        self.assertIsNone(record.enqueue('a', key='same'))
+        self.assertEqual(Task.objects.count(), 1)
+
+    def test_retry_with_duplicate_in_queue(self):
+        """Повтор не ставится, если такая же задача уже ждет."""
+        task = record.enqueue('fail', key='same')
+        tasks.claim(10)
+        record.enqueue('fail', key='same')
+        tasks.execute(task.pk)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.FAILED)
+        self.assertEqual(
+            Task.objects.filter(key='same', status=Task.PENDING).count(), 1
+        )
+
+    def test_stats_and_metrics(self):
+        record.enqueue('a')
+        record.enqueue('b')
+        tasks.run_pending(limit=1)
+        data = tasks.stats()['core.tests.record']
+        self.assertEqual(data[Task.PENDING], 1)
+        self.assertEqual(data[Task.DONE], 1)
+        self.assertIn('oldest_pending_seconds', data)
+        self.assertIn('run_p50_seconds', data)
+        text = metrics.prometheus_tasks(tasks.stats())
+        self.assertIn('yatube_task_queue_depth', text)
@@ -0,0 +1,10 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'core'
+
+urlpatterns = [
+    path('', views.metrics_prometheus, name='metrics'),
+    path('stats/', views.metrics_stats, name='metrics_stats'),
+]
@@ -1,4 +1,11 @@
+import hmac
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import render
+from django.views.decorators.cache import never_cache
+
+from . import metrics, tasks
 
 
 def page_not_found(request, exception):
@@ -16,3 +23,32 @@ def csrf_failure(request, reason=''):
 
 def server_error(request):
     return render(request, 'core/500.html', status=500)
+
+
+def metrics_allowed(request):
+    """Сотрудник сайта или запрос с `Authorization: Bearer METRICS_TOKEN`."""
+    if request.user.is_staff:
+        return True
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    return bool(token) and hmac.compare_digest(header, f'Bearer {token}')
+
+
+@never_cache
+def metrics_stats(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return JsonResponse(
+        {'views': metrics.summary(), 'tasks': tasks.stats()},
+        json_dumps_params={'ensure_ascii': False}
+    )
+
+
+@never_cache
+def metrics_prometheus(request):
+    if not metrics_allowed(request):
+        return HttpResponseForbidden()
+    return HttpResponse(
+        metrics.prometheus() + metrics.prometheus_tasks(tasks.stats()),
+        content_type='text/plain; version=0.0.4; charset=utf-8'
+    )
@@ -1,6 +1,45 @@
+import csv
+
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+
+from . import moderation, search
+from .bulk import to_json
+from .models import Comment, Follow, Group, Post
+from .paginator import EstimatedCountPaginator
+
+EXPORT_FIELDS = (
+    ('id', 'pk'),
+    ('pub_date', 'pub_date'),
+    ('author', 'author__username'),
+    ('group', 'group__slug'),
+    ('text', 'text'),
+)
+EXPORT_CHUNK_SIZE = 2000
+# С этих символов табличные редакторы начинают формулу.
+FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+
+
+class Echo:
+    """Файлоподобный объект для csv.writer: строку не пишет, а отдает."""
+
+    def write(self, value):
+        return value
 
-from .models import Group, Post
+
+def csv_cell(value):
+    """Значение ячейки, которое редактор не выполнит как формулу."""
+    value = to_json(value)
+    if isinstance(value, str) and value.startswith(FORMULA_PREFIXES):
+        return "'" + value
+    return value
+
+
+def csv_lines(header, rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(header)
+    for row in rows:
+        yield writer.writerow(map(csv_cell, row))
 
 
 class PostAdmin(admin.ModelAdmin):
@@ -11,15 +50,122 @@ class PostAdmin(admin.ModelAdmin):
         'author',
         'group'
     )
+    list_select_related = ('author', 'group')
     search_fields = ('text',)
     list_filter = ('pub_date',)
     list_editable = ('group',)
+    date_hierarchy = 'pub_date'
+    raw_id_fields = ('author',)
     empty_value_display = '-пусто-'
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('export_csv',)
+
+    def get_search_results(self, request, queryset, search_term):
+        """Ищет по полнотекстовому индексу вместо LIKE по всей таблице."""
+        if not search_term:
+            return queryset, False
+        return search.matching_posts(queryset, search_term), False
+
+    def get_changelist_formset(self, request, **kwargs):
+        """Список групп для колонки `group` читается один раз на страницу,
+        а не отдельным запросом в каждой строке."""
+        formset = super().get_changelist_formset(request, **kwargs)
+        field = formset.form.base_fields['group']
+        field.choices = list(field.choices)
+        return formset
+
+    def export_csv(self, request, queryset):
+        """Отдает выбранные посты в CSV потоком, читая БД пачками."""
+        rows = queryset.order_by('pk').values_list(
+            *(lookup for _, lookup in EXPORT_FIELDS)
+        ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        response = StreamingHttpResponse(
+            csv_lines([name for name, _ in EXPORT_FIELDS], rows),
+            content_type='text/csv; charset=utf-8'
+        )
+        response['Content-Disposition'] = 'attachment; filename="posts.csv"'
+        return response
+    export_csv.short_description = 'Выгрузить в CSV'
 
 
 class GroupAdmin(admin.ModelAdmin):
     prepopulated_fields = {'slug': ('title',)}
 
 
+class CommentAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'text', 'author', 'post', 'created')
+    list_select_related = ('author', 'post')
+    search_fields = ('=author__username',)
+    list_filter = ('created',)
+    date_hierarchy = 'created'
+    raw_id_fields = ('author', 'post')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('delete_comments', 'delete_authors_comments')
+
+    def get_actions(self, request):
+        """Штатное удаление по одной строке заменено своим."""
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_comments(self, request, queryset):
+        """Удаляет выбранные комментарии одним запросом на пачку."""
+        count = moderation.delete_comments(queryset)
+        self.message_user(request, f'Удалено комментариев: {count}')
+    delete_comments.short_description = 'Удалить выбранные комментарии'
+    delete_comments.allowed_permissions = ('delete',)
+
+    def delete_authors_comments(self, request, queryset):
+        """Удаляет все комментарии авторов выбранных комментариев."""
+        count = moderation.delete_comments_by_authors(set(
+            queryset.order_by().values_list('author_id', flat=True).distinct()
+        ))
+        self.message_user(request, f'Удалено комментариев: {count}')
+    delete_authors_comments.short_description = (
+        'Удалить все комментарии их авторов'
+    )
+    delete_authors_comments.allowed_permissions = ('delete',)
+
+
+class FollowAdmin(admin.ModelAdmin):
+    list_display = ('pk', 'user', 'author', 'created')
+    list_select_related = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    list_filter = ('created',)
+    date_hierarchy = 'created'
+    raw_id_fields = ('user', 'author')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    actions = ('delete_follows', 'delete_followers_follows')
+
+    def get_actions(self, request):
+        actions = super().get_actions(request)
+        actions.pop('delete_selected', None)
+        return actions
+
+    def delete_follows(self, request, queryset):
+        """Удаляет выбранные подписки, в том числе все подписки окна
+        по дате при выборе всех строк фильтра."""
+        count = moderation.delete_follows(queryset)
+        self.message_user(request, f'Удалено подписок: {count}')
+    delete_follows.short_description = 'Удалить выбранные подписки'
+    delete_follows.allowed_permissions = ('delete',)
+
+    def delete_followers_follows(self, request, queryset):
+        """Удаляет все подписки подписчиков из выбранных строк."""
+        count = moderation.delete_follows_by_users(set(
+            queryset.order_by().values_list('user_id', flat=True).distinct()
+        ))
+        self.message_user(request, f'Удалено подписок: {count}')
+    delete_followers_follows.short_description = (
+        'Удалить все подписки этих подписчиков'
+    )
+    delete_followers_follows.allowed_permissions = ('delete',)
+
+
 admin.site.register(Post, PostAdmin)
 admin.site.register(Group, GroupAdmin)
+admin.site.register(Comment, CommentAdmin)
+admin.site.register(Follow, FollowAdmin)
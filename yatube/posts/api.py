@@ -0,0 +1,259 @@
+"""JSON API только для чтения: ленты постов, группы, комментарии, подписки.
+
+Ответы собираются вручную из словарей, без универсальных сериализаторов.
+Списки постов и комментариев разбиваются курсором (`?cursor=`),
+`?fields=` оставляет в объектах только нужные поля, `?limit=` задает
+размер страницы. ETag и Last-Modified считаются по версиям из
+`posts.versions`, поэтому неизмененная лента отдает `304` без запросов
+к таблицам постов. Ответы авторизованным пользователям помечаются
+`private`, а все ответы — `Vary: Cookie`, как страницы сайта.
+"""
+from functools import wraps
+from urllib.parse import urlencode
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition, require_GET
+
+from . import timeline, versions
+from .models import Comment, Follow, Group, Post, User
+from .paginator import CursorPaginator
+
+LIMIT = 10
+MAX_LIMIT = 100
+
+
+class ApiError(Exception):
+    def __init__(self, status, detail):
+        super().__init__(detail)
+        self.status = status
+        self.detail = detail
+
+
+def iso(value):
+    return value.isoformat() if value else None
+
+
+POST_FIELDS = {
+    'id': lambda post: post.pk,
+    'text': lambda post: post.text,
+    'pub_date': lambda post: iso(post.pub_date),
+    'updated': lambda post: iso(post.updated),
+    'author': lambda post: post.author.username,
+    'group': lambda post: post.group.slug if post.group_id else None,
+    'image': lambda post: post.image.url if post.image else None,
+    'thumbnail': lambda post: post.image_variants.get('src'),
+    'comments_count': lambda post: post.comment_count,
+}
+COMMENT_FIELDS = {
+    'id': lambda comment: comment.pk,
+    'post': lambda comment: comment.post_id,
+    'author': lambda comment: comment.author.username,
+    'text': lambda comment: comment.text,
+    'created': lambda comment: iso(comment.created),
+}
+GROUP_FIELDS = {
+    'id': lambda group: group.pk,
+    'title': lambda group: group.title,
+    'slug': lambda group: group.slug,
+    'description': lambda group: group.description,
+}
+
+
+def serializer(request, fields):
+    """Функция, превращающая объект в словарь с полями из `?fields=`."""
+    requested = request.GET.get('fields')
+    if requested:
+        names = [name.strip() for name in requested.split(',')]
+        unknown = [name for name in names if name not in fields]
+        if unknown:
+            raise ApiError(400, f'Неизвестные поля: {", ".join(unknown)}.')
+        fields = {name: fields[name] for name in names}
+    items = list(fields.items())
+    return lambda obj: {name: getter(obj) for name, getter in items}
+
+
+def page_size(request):
+    try:
+        limit = int(request.GET.get('limit', LIMIT))
+    except ValueError:
+        raise ApiError(400, 'limit должен быть числом.')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    query = request.GET.copy()
+    query['cursor'] = cursor
+    return request.build_absolute_uri(
+        f'{request.path}?{urlencode(sorted(query.items()))}'
+    )
+
+
+def paginated(request, object_list, fields, keys=('pub_date', 'pk')):
+    serialize = serializer(request, fields)
+    paginator = CursorPaginator(object_list, page_size(request), keys)
+    page = paginator.get_cursor_page(request.GET.get('cursor'))
+    return {
+        'results': [serialize(obj) for obj in page],
+        'next': page_url(request, page.next_cursor),
+        'previous': page_url(request, page.previous_cursor),
+    }
+
+
+def get_or_error(queryset, **lookup):
+    obj = queryset.filter(**lookup).first()
+    if obj is None:
+        raise ApiError(404, 'Не найдено.')
+    return obj
+
+
+def feed_scopes(request):
+    return [versions.FEED]
+
+
+def post_scopes(request, post_id):
+    return versions.post_page(post_id)
+
+
+def groups_scopes(request):
+    return [versions.GROUPS]
+
+
+def group_scopes(request, slug):
+    return versions.group_page(slug)
+
+
+def author_scopes(request, username):
+    return versions.author_page(username)
+
+
+def follow_scopes(request):
+    return timeline.feed_scopes(request.user.pk)
+
+
+def api_login_required(view):
+    @wraps(view)
+    def wrapper(request, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'detail': 'Нужна авторизация.'}, status=401)
+        return view(request, **kwargs)
+    return wrapper
+
+
+def cache_headers(view):
+    """Cache-Control и Vary как у `views.public_page`: ответы
+    авторизованным пользователям персональны, их нельзя хранить прокси."""
+    @wraps(view)
+    def wrapper(request, **kwargs):
+        response = view(request, **kwargs)
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, max_age=0)
+        else:
+            patch_cache_control(
+                response,
+                public=True,
+                max_age=settings.PUBLIC_PAGE_MAX_AGE,
+                must_revalidate=True
+            )
+        patch_vary_headers(response, ('Cookie',))
+        return response
+    return wrapper
+
+
+def api_view(scopes, login_required=False):
+    """Оборачивает вьюху: только GET, условные ответы, заголовки
+    кэширования, ошибки в JSON."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, **kwargs):
+            try:
+                data = view(request, **kwargs)
+            except ApiError as error:
+                return JsonResponse(
+                    {'detail': error.detail}, status=error.status
+                )
+            return JsonResponse(
+                data, json_dumps_params={'ensure_ascii': False}
+            )
+        wrapper = condition(**versions.validators(scopes))(wrapper)
+        if login_required:
+            wrapper = api_login_required(wrapper)
+        return require_GET(cache_headers(wrapper))
+    return decorator
+
+
+@api_view(feed_scopes)
+def post_list(request):
+    """Лента всех постов."""
+    return paginated(
+        request, Post.objects.for_feed().with_comment_count(), POST_FIELDS
+    )
+
+
+@api_view(post_scopes)
+def post_detail(request, post_id):
+    post = get_or_error(
+        Post.objects.for_feed().with_comment_count(), pk=post_id
+    )
+    return serializer(request, POST_FIELDS)(post)
+
+
+@api_view(post_scopes)
+def comment_list(request, post_id):
+    """Комментарии к посту, новые сначала."""
+    get_or_error(Post.objects.all(), pk=post_id)
+    return paginated(
+        request,
+        Comment.objects.filter(post_id=post_id).select_related('author'),
+        COMMENT_FIELDS,
+        keys=('created', 'pk')
+    )
+
+
+@api_view(groups_scopes)
+def group_list(request):
+    serialize = serializer(request, GROUP_FIELDS)
+    return {
+        'results': [
+            serialize(group) for group in Group.objects.order_by('title')
+        ]
+    }
+
+
+@api_view(group_scopes)
+def group_posts(request, slug):
+    group = get_or_error(Group.objects.all(), slug=slug)
+    return paginated(
+        request, group.posts.for_feed().with_comment_count(), POST_FIELDS
+    )
+
+
+@api_view(author_scopes)
+def author_posts(request, username):
+    author = get_or_error(User.objects.all(), username=username)
+    return paginated(
+        request, author.posts.for_feed().with_comment_count(), POST_FIELDS
+    )
+
+
+@api_view(follow_scopes, login_required=True)
+def follow_posts(request):
+    """Лента постов авторов, на которых подписан пользователь."""
+    return paginated(
+        request,
+        timeline.feed(request.user).with_comment_count(),
+        POST_FIELDS,
+        timeline.FEED_KEYS
+    )
+
+
+@api_view(follow_scopes, login_required=True)
+def follow_list(request):
+    """Авторы, на которых подписан пользователь."""
+    authors = Follow.objects.filter(user=request.user).order_by(
+        'author__username'
+    ).values_list('author__username', flat=True)
+    return {'results': [{'author': username} for username in authors]}
@@ -1,5 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.core.signals import request_started
 
 
 class PostsConfig(AppConfig):
     name = 'posts'
+
+    def ready(self):
+        from . import signals  # noqa: F401
+        if getattr(settings, 'CACHE_WARMUP_THREAD', False):
+            from .warmup import start_on_request
+            request_started.connect(start_on_request)
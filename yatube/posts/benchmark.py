@@ -0,0 +1,384 @@
+"""Нагрузочный прогон вьюх posts на синтетических данных.
+
+`Dataset` наполняет БД пользователями, группами, постами (часть с
+картинками), комментариями и подписками пачками через `posts.bulk`.
+Данные зависят только от параметров и `seed`, поэтому прогоны на разных
+коммитах сравнимы. `Mix` — смесь запросов, описанная в JSONL (по строке
+на вид запроса с весом; `method` и `data` задают POST-запросы). `run()`
+гоняет смесь через WSGI-обработчик в нескольких потоках и считает
+перцентили задержки и число запросов к БД на запрос; `measure_memory()`
+отдельным последовательным проходом снимает пик выделенной памяти
+по каждому виду запроса.
+"""
+import json
+import random
+import statistics
+import threading
+import time
+import tracemalloc
+from collections import defaultdict
+from datetime import timedelta
+from io import BytesIO
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, connections
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from . import bulk, thumbnails
+from .models import Post, User
+
+WORDS = (
+    'кот собака город море книга музыка дорога солнце дождь зима лето '
+    'работа друг дом сад река лес поезд кофе утро вечер история фильм '
+    'python django код тест база запрос лента пост'
+).split()
+
+# Смесь по умолчанию: только GET, чтобы прогон не менял данные.
+DEFAULT_MIX = [
+    {'name': 'index', 'view': 'posts:index', 'weight': 25},
+    {'name': 'index_deep', 'view': 'posts:index', 'weight': 3,
+     'query': {'page': '{page}'}},
+    {'name': 'group_list', 'view': 'posts:group_list', 'weight': 10,
+     'kwargs': {'slug': '{group}'}},
+    {'name': 'profile', 'view': 'posts:profile', 'weight': 10,
+     'kwargs': {'username': '{author}'}},
+    {'name': 'post_detail', 'view': 'posts:post_detail', 'weight': 20,
+     'kwargs': {'post_id': '{post}'}},
+    {'name': 'comments', 'view': 'posts:comments', 'weight': 3,
+     'kwargs': {'post_id': '{post}'}},
+    {'name': 'search', 'view': 'posts:search', 'weight': 5,
+     'query': {'q': '{word}'}},
+    {'name': 'follow_index', 'view': 'posts:follow_index', 'weight': 10,
+     'auth': True},
+    {'name': 'post_create', 'view': 'posts:post_create', 'weight': 2,
+     'auth': True},
+    {'name': 'post_edit', 'view': 'posts:post_edit', 'weight': 2,
+     'auth': True, 'kwargs': {'post_id': '{own_post}'}},
+    {'name': 'api_posts', 'view': 'posts:api_posts', 'weight': 5},
+    {'name': 'api_post', 'view': 'posts:api_post', 'weight': 2,
+     'kwargs': {'post_id': '{post}'}},
+    {'name': 'api_comments', 'view': 'posts:api_comments', 'weight': 1,
+     'kwargs': {'post_id': '{post}'}},
+    {'name': 'api_follow_posts', 'view': 'posts:api_follow_posts',
+     'weight': 2, 'auth': True},
+]
+
+# Смесь записи для benchmark_writes: новые посты и комментарии.
+WRITE_MIX = [
+    {'name': 'post_create', 'view': 'posts:post_create', 'weight': 1,
+     'auth': True, 'method': 'post',
+     'data': {'text': '{text}', 'group': '{group_id}'}},
+    {'name': 'add_comment', 'view': 'posts:add_comment', 'weight': 3,
+     'auth': True, 'method': 'post', 'kwargs': {'post_id': '{post}'},
+     'data': {'text': '{text}'}},
+]
+
+
+class Dataset:
+    """Синтетические данные, определяемые параметрами и seed."""
+
+    def __init__(self, users=200, groups=10, posts=5000, comments=20000,
+                 follows=20, images=0.2, seed=1):
+        self.sizes = {
+            'users': users,
+            'groups': groups,
+            'posts': posts,
+            'comments': comments,
+            'follows': follows,
+            'images': images,
+        }
+        self.seed = seed
+        self.rng = random.Random(seed)
+        self.started = timezone.now() - timedelta(days=365)
+        self.post_authors = {}
+
+    def text(self, words):
+        return ' '.join(self.rng.choice(WORDS) for _ in range(words))
+
+    def moment(self, index, total):
+        return self.started + timedelta(days=365) * (index / total)
+
+    def create(self):
+        sizes = self.sizes
+        password = make_password(None)
+        User.objects.bulk_create(
+            (User(username=f'user{i}', password=password,
+                  first_name='Пользователь', last_name=str(i))
+             for i in range(1, sizes['users'] + 1)),
+            batch_size=1000
+        )
+        self.user_ids = list(
+            User.objects.order_by('pk').values_list('pk', flat=True)
+        )
+        self.load('group', (
+            {'id': i, 'title': f'Группа {i}', 'slug': f'group-{i}',
+             'description': self.text(20)}
+            for i in range(1, sizes['groups'] + 1)
+        ))
+        images = self.images()
+        self.load('post', self.posts(images))
+        self.load('comment', (
+            {'id': i, 'post_id': self.rng.randint(1, sizes['posts']),
+             'author_id': self.rng.choice(self.user_ids),
+             'text': self.text(12),
+             'created': self.moment(i, sizes['comments'])}
+            for i in range(1, sizes['comments'] + 1)
+        ))
+        self.load('follow', self.follows())
+        # Счетчики и ленты всех пользователей — один раз в конце.
+        bulk.finish('post')
+
+    def load(self, name, rows):
+        for _ in bulk.import_rows(name, rows):
+            pass
+
+    def images(self, count=5):
+        """Несколько картинок с готовыми вариантами на всех постов."""
+        result = []
+        for i in range(count):
+            image = Image.new('RGB', (1600, 900), (40 * i, 90, 160))
+            draw = ImageDraw.Draw(image)
+            for _ in range(60):
+                x, y = self.rng.randrange(1600), self.rng.randrange(900)
+                draw.ellipse(
+                    (x, y, x + self.rng.randrange(300),
+                     y + self.rng.randrange(300)),
+                    fill=tuple(self.rng.randrange(256) for _ in range(3))
+                )
+            buffer = BytesIO()
+            image.save(buffer, 'JPEG', quality=90)
+            name = default_storage.save(
+                f'posts/benchmark_{i}.jpg', ContentFile(buffer.getvalue())
+            )
+            post = Post(pk=0, image=name)
+            result.append((name, json.dumps(thumbnails.build(post))))
+        return result
+
+    def posts(self, images):
+        sizes = self.sizes
+        for i in range(1, sizes['posts'] + 1):
+            author_id = self.rng.choice(self.user_ids)
+            self.post_authors.setdefault(author_id, []).append(i)
+            image, variants = (
+                self.rng.choice(images)
+                if self.rng.random() < sizes['images'] else ('', '')
+            )
+            moment = self.moment(i, sizes['posts'])
+            yield {
+                'id': i,
+                'text': self.text(self.rng.randint(10, 80)),
+                'pub_date': moment,
+                'updated': moment,
+                'author_id': author_id,
+                'group_id': (
+                    self.rng.randint(1, sizes['groups'])
+                    if self.rng.random() < 0.7 else None
+                ),
+                'image': image,
+                'thumbnails': variants,
+            }
+
+    def follows(self):
+        pk = 0
+        for user_id in self.user_ids:
+            count = min(self.sizes['follows'], len(self.user_ids) - 1)
+            authors = self.rng.sample(
+                [other for other in self.user_ids if other != user_id],
+                count
+            )
+            for author_id in authors:
+                pk += 1
+                yield {'id': pk, 'user_id': user_id, 'author_id': author_id}
+
+
+class Mix:
+    """Взвешенная смесь запросов."""
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.weights = [entry.get('weight', 1) for entry in entries]
+
+    @classmethod
+    def from_jsonl(cls, path):
+        with open(path, encoding='utf-8') as stream:
+            return cls([json.loads(line) for line in stream if line.strip()])
+
+    def choose(self, rng):
+        return rng.choices(self.entries, self.weights)[0]
+
+
+class Worker(threading.Thread):
+    """Поток с собственными клиентами, гоняющий смесь запросов."""
+
+    def __init__(self, runner, index):
+        super().__init__(name=f'benchmark-{index}')
+        self.runner = runner
+        self.rng = random.Random(runner.dataset.seed + index)
+        self.anonymous = Client()
+        self.user_id = runner.logged_in[index % len(runner.logged_in)]
+        self.client = Client()
+        self.client.force_login(User.objects.get(pk=self.user_id))
+        self.queries = 0
+
+    def count_query(self, execute, sql, params, many, context):
+        self.queries += 1
+        return execute(sql, params, many, context)
+
+    def run(self):
+        try:
+            with connection.execute_wrapper(self.count_query):
+                while not self.runner.done():
+                    self.request(self.runner.mix.choose(self.rng))
+        finally:
+            connections.close_all()
+
+    def request(self, entry):
+        url = self.runner.url(entry, self.rng, self.user_id)
+        data = self.runner.fill(entry.get('data', {}), self.rng, self.user_id)
+        client = self.client if entry.get('auth') else self.anonymous
+        send = getattr(client, entry.get('method', 'get'))
+        self.queries = 0
+        started = time.perf_counter()
+        try:
+            status = send(url, data).status_code
+        except DatabaseError:
+            # Например, «database is locked» у SQLite под записью.
+            status = 500
+        elapsed = time.perf_counter() - started
+        self.runner.record(entry['name'], elapsed, self.queries, status)
+
+
+class Runner:
+    def __init__(self, dataset, mix, concurrency=4, requests=1000,
+                 duration=None):
+        self.dataset = dataset
+        self.mix = mix
+        self.concurrency = concurrency
+        self.requests = requests
+        self.duration = duration
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.queries = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.memory = {}
+        self.sent = 0
+        self.logged_in = [
+            author_id for author_id in sorted(dataset.post_authors)
+        ][:max(concurrency, 1)]
+
+    def fill(self, params, rng, user_id):
+        """Подставляет случайные значения вместо `{post}`, `{word}`..."""
+        dataset = self.dataset
+        sizes = dataset.sizes
+        values = {
+            'post': lambda: rng.randint(1, sizes['posts']),
+            'own_post': lambda: rng.choice(dataset.post_authors[user_id]),
+            'group': lambda: f"group-{rng.randint(1, sizes['groups'])}",
+            'group_id': lambda: rng.randint(1, sizes['groups']),
+            'author': lambda: f"user{rng.randint(1, sizes['users'])}",
+            'word': lambda: rng.choice(WORDS),
+            'text': lambda: ' '.join(rng.choices(WORDS, k=12)),
+            'page': lambda: rng.randint(2, 50),
+        }
+        return {
+            key: values[value[1:-1]]()
+            if isinstance(value, str) and value[1:-1] in values
+            else value
+            for key, value in params.items()
+        }
+
+    def url(self, entry, rng, user_id):
+        url = reverse(
+            entry['view'],
+            kwargs=self.fill(entry.get('kwargs', {}), rng, user_id)
+        )
+        query = self.fill(entry.get('query', {}), rng, user_id)
+        if query:
+            url += '?' + '&'.join(f'{k}={v}' for k, v in query.items())
+        return url
+
+    def done(self):
+        with self.lock:
+            if self.duration is not None:
+                return time.monotonic() >= self.deadline
+            if self.sent >= self.requests:
+                return True
+            self.sent += 1
+            return False
+
+    def record(self, name, elapsed, queries, status):
+        with self.lock:
+            self.latencies[name].append(elapsed)
+            self.queries[name].append(queries)
+            if status >= 400:
+                self.errors[name] += 1
+
+    def run(self):
+        workers = [Worker(self, i) for i in range(self.concurrency)]
+        self.deadline = time.monotonic() + (self.duration or 0)
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        self.elapsed = time.perf_counter() - started
+
+    def measure_memory(self, samples=5):
+        """Пик выделенной памяти на запрос, последовательно по видам."""
+        worker = Worker(self, 0)
+        rng = random.Random(self.dataset.seed)
+        tracemalloc.start()
+        try:
+            for entry in self.mix.entries:
+                peak = 0
+                for _ in range(samples):
+                    url = self.url(entry, rng, worker.user_id)
+                    client = (
+                        worker.client if entry.get('auth')
+                        else worker.anonymous
+                    )
+                    tracemalloc.reset_peak()
+                    base = tracemalloc.get_traced_memory()[0]
+                    client.get(url)
+                    peak = max(peak, tracemalloc.get_traced_memory()[1] - base)
+                self.memory[entry['name']] = peak
+        finally:
+            tracemalloc.stop()
+
+    def report(self):
+        views = {}
+        for name, latencies in sorted(self.latencies.items()):
+            latencies = sorted(latencies)
+            queries = self.queries[name]
+            views[name] = {
+                'requests': len(latencies),
+                'errors': self.errors[name],
+                'p50_ms': percentile(latencies, 50) * 1000,
+                'p95_ms': percentile(latencies, 95) * 1000,
+                'p99_ms': percentile(latencies, 99) * 1000,
+                'queries_mean': statistics.mean(queries),
+                'queries_max': max(queries),
+                'memory_peak_kib': self.memory.get(name, 0) / 1024,
+            }
+        total = sum(view['requests'] for view in views.values())
+        return {
+            'dataset': dict(self.dataset.sizes, seed=self.dataset.seed),
+            'concurrency': self.concurrency,
+            'requests': total,
+            'elapsed_s': self.elapsed,
+            'throughput_rps': total / self.elapsed if self.elapsed else 0,
+            'views': views,
+        }
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга для отсортированных значений."""
+    if not values:
+        return 0
+    rank = max(0, min(len(values) - 1, round(percent / 100 * len(values)) - 1))
+    return values[rank]
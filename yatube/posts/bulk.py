@@ -0,0 +1,259 @@
+"""Массовый импорт и экспорт групп, постов, комментариев и подписок.
+
+Строки читаются и пишутся потоком в NDJSON (объект JSON на строку)
+или CSV с заголовком. Экспорт идет серверным курсором (`iterator()`),
+поэтому память не зависит от объема таблицы. Импорт вставляет объекты
+пачками через `bulk_create`: сигналы моделей при этом не отправляются.
+Версии страниц, карточки и поисковый индекс обновляются после каждой
+пачки, а счетчики авторов и ленты подписок затронутых пользователей
+пересобираются один раз в конце через `finish()`.
+"""
+import csv
+import json
+import time
+from contextlib import contextmanager
+
+from django.core.management.color import no_style
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.db.models import Max
+
+from . import follow_graph, search, timeline, versions
+from .models import AuthorStats, Comment, Follow, Group, Post
+
+# Имя в командах: (модель, выгружаемые поля).
+MODELS = {
+    'group': (Group, ('id', 'title', 'slug', 'description')),
+    'post': (Post, (
+        'id', 'text', 'pub_date', 'updated', 'author_id', 'group_id',
+        'image', 'thumbnails',
+    )),
+    'comment': (Comment, ('id', 'post_id', 'author_id', 'text', 'created')),
+    'follow': (Follow, ('id', 'user_id', 'author_id', 'created')),
+}
+FORMATS = ('ndjson', 'csv')
+# По скольку пользователей пересобирать счетчики и ленты в `finish`.
+FINISH_BATCH_SIZE = 500
+
+User = get_user_model()
+
+
+def to_json(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else value
+
+
+def export_rows(name, batch_size=2000):
+    """Словари с полями объектов, читаемые из БД потоком."""
+    model, fields = MODELS[name]
+    rows = model.objects.order_by('pk').values_list(*fields)
+    for row in rows.iterator(chunk_size=batch_size):
+        yield dict(zip(fields, map(to_json, row)))
+
+
+def write_rows(rows, stream, fmt, fields):
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fields)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield row
+        return
+    for row in rows:
+        stream.write(json.dumps(row, ensure_ascii=False) + '\n')
+        yield row
+
+
+def read_rows(stream, fmt):
+    if fmt == 'csv':
+        yield from csv.DictReader(stream)
+        return
+    for line in stream:
+        if line.strip():
+            yield json.loads(line)
+
+
+def build_object(model, fields, row):
+    """Объект модели из строки файла; пустые значения CSV — это NULL."""
+    values = {}
+    for name in fields:
+        if name not in row:
+            continue
+        field = model._meta.get_field(name)
+        value = row[name]
+        if value == '' and field.null:
+            value = None
+        values[field.attname] = field.to_python(value)
+    return model(**values)
+
+
+@contextmanager
+def preserved_dates(model):
+    """Не дает auto_now и auto_now_add затереть даты из файла."""
+    patched = [
+        (field, field.auto_now, field.auto_now_add)
+        for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False)
+        or getattr(field, 'auto_now_add', False)
+    ]
+    for field, _, _ in patched:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in patched:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def import_rows(name, rows, batch_size=2000, ignore_conflicts=False,
+                users=None):
+    """Вставляет строки пачками. Возвращает итератор размеров пачек.
+
+    В множество `users`, если оно передано, добавляются id
+    пользователей, чьи счетчики и ленты меняет загрузка, для `finish`.
+    """
+    model, fields = MODELS[name]
+    objects = (build_object(model, fields, row) for row in rows)
+    with preserved_dates(model):
+        for batch in batches(objects, batch_size):
+            with transaction.atomic():
+                last_pk = None
+                if any(obj.pk is None for obj in batch):
+                    last_pk = model.objects.aggregate(last=Max('pk'))['last']
+                model.objects.bulk_create(
+                    batch, ignore_conflicts=ignore_conflicts
+                )
+                inserted = inserted_objects(model, batch, last_pk)
+                refresh_caches(name, inserted)
+                if users is not None:
+                    users.update(affected_users(name, inserted))
+            yield len(batch)
+    reset_sequence(model)
+
+
+def inserted_objects(model, batch, last_pk):
+    """Объекты пачки с id. `bulk_create` проставляет id только
+    в PostgreSQL и без `ignore_conflicts`, поэтому строки без id
+    перечитываются: это строки с id больше `last_pk`, последнего
+    до вставки."""
+    known = [obj for obj in batch if obj.pk is not None]
+    if len(known) == len(batch):
+        return batch
+    fresh = model.objects.filter(pk__gt=last_pk or 0).exclude(
+        pk__in=[obj.pk for obj in known]
+    ).order_by('pk')
+    return known + list(fresh)
+
+
+def affected_users(name, objects):
+    """Пользователи, чьи счетчики и ленты меняют загруженные объекты."""
+    if name == 'post':
+        return {post.author_id for post in objects}
+    if name == 'follow':
+        return {follow.user_id for follow in objects} | {
+            follow.author_id for follow in objects
+        }
+    return set()
+
+
+def refresh_caches(name, batch):
+    """Сдвигает версии и карточки и обновляет поисковый индекс,
+    как это сделали бы сигналы."""
+    scopes = set()
+    if name == 'group':
+        scopes.add(versions.GROUPS)
+    elif name == 'post':
+        for post in batch:
+            scopes.update(versions.post_scopes(
+                post.pk, post.author_id, post.group_id
+            ))
+            search.index_post(post)
+        timeline.touch_followers({post.author_id for post in batch})
+    elif name == 'comment':
+        for comment in batch:
+            search.index_comment(comment)
+        posts = Post.objects.filter(
+            pk__in={comment.post_id for comment in batch}
+        )
+        for pk, author_id, group_id in posts.values_list(
+            'pk', 'author_id', 'group_id'
+        ):
+            scopes.update(versions.post_scopes(pk, author_id, group_id))
+        timeline.touch_followers(posts.values('author_id'))
+    else:
+        for follow in batch:
+            scopes.update((
+                versions.follows(follow.user_id),
+                versions.author(follow.user_id),
+                versions.author(follow.author_id),
+            ))
+        follow_graph.forget(
+            {follow.user_id for follow in batch}
+            | {follow.author_id for follow in batch}
+        )
+    if scopes:
+        versions.bump(*scopes)
+
+
+def reset_sequence(model):
+    """После вставки с явными id сдвигает автоинкремент (PostgreSQL)."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    if statements:
+        with connection.cursor() as cursor:
+            for sql in statements:
+                cursor.execute(sql)
+
+
+def finish(name, users=None):
+    """Пересобирает счетчики и ленты подписок, которые при импорте
+    не вели сигналы: для пользователей `users`, собранных `import_rows`,
+    или, без них, для всех."""
+    if name not in ('post', 'follow'):
+        return
+    if users is None:
+        AuthorStats.objects.rebuild()
+        timeline.rebuild()
+        return
+    readers = set() if name == 'post' else users
+    for chunk in batches(sorted(users), FINISH_BATCH_SIZE):
+        AuthorStats.objects.rebuild(User.objects.filter(pk__in=chunk))
+        if name == 'post':
+            # Новые посты авторов попадают в ленты их подписчиков.
+            readers.update(Follow.objects.filter(
+                author_id__in=chunk
+            ).values_list('user_id', flat=True))
+    for chunk in batches(sorted(readers), FINISH_BATCH_SIZE):
+        timeline.rebuild(User.objects.filter(pk__in=chunk))
+
+
+class Progress:
+    """Печатает число обработанных строк и скорость не чаще раза
+    в `interval` секунд."""
+
+    def __init__(self, write, interval=1.0):
+        self.write = write
+        self.interval = interval
+        self.count = 0
+        self.started = self.reported = time.monotonic()
+
+    @property
+    def rate(self):
+        elapsed = time.monotonic() - self.started
+        return self.count / elapsed if elapsed else 0
+
+    def step(self, count=1):
+        self.count += count
+        now = time.monotonic()
+        if now - self.reported >= self.interval:
+            self.reported = now
+            self.write(f'{self.count} строк, {self.rate:.0f} строк/с')
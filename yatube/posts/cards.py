@@ -0,0 +1,98 @@
+"""Кэширование отрендеренных карточек постов.
+
+Карточка (`includes/post.html`) кэшируется по id поста, времени его
+правки `updated` и счетчику `card_version`. Правка поста сдвигает
+`updated`, а то, что меняет вид карточки без правки (имя автора,
+группа, готовые варианты картинки), — `card_version`: `updated` видят
+пользователи как дату изменения, и трогать его ради кэша нельзя.
+Старая запись в кэше просто перестает читаться и истекает сама.
+
+Недостающую карточку рендерит только один процесс — тот, кто первым
+поставил блокировку ее ключа (`cache.add` атомарен). Остальные до
+`POST_CARD_LOCK_WAIT` секунд ждут ее в кэше, а не рендерят ту же
+карточку параллельно; не дождавшись, рендерят сами, но в кэш не пишут.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+CARD_TEMPLATE = 'includes/post.html'
+CARD_TIMEOUT = getattr(settings, 'POST_CARD_TIMEOUT', 60 * 60 * 24)
+LOCK_KEY = 'post_card_lock:{}'
+LOCK_TIMEOUT = getattr(settings, 'POST_CARD_LOCK_TIMEOUT', 10)
+LOCK_WAIT = getattr(settings, 'POST_CARD_LOCK_WAIT', 0.2)
+LOCK_POLL = 0.02
+
+
+def card_key(post):
+    updated = int(post.updated.timestamp() * 1000000)
+    return f'post_card:{post.pk}:{updated}:{post.card_version}'
+
+
+def render_cards(posts):
+    """Возвращает пары (пост, html карточки), читая кэш одним запросом."""
+    posts = list(posts)
+    keys = {post.pk: card_key(post) for post in posts}
+    html = cache.get_many(keys.values())
+    missing = [post for post in posts if keys[post.pk] not in html]
+    if missing:
+        html.update(render_missing(missing, keys))
+    return [(post, mark_safe(html[keys[post.pk]])) for post in posts]
+
+
+def warm(posts):
+    """Рендерит в кэш карточки, которых там нет. Возвращает их число.
+
+    Карточки, которые уже рендерит другой процесс, пропускаются.
+    """
+    posts = list(posts)
+    keys = {post.pk: card_key(post) for post in posts}
+    cached = cache.get_many(keys.values())
+    missing = [post for post in posts if keys[post.pk] not in cached]
+    return len(render_missing(missing, keys, wait=False))
+
+
+def render_missing(posts, keys, wait=True):
+    """Рендерит карточки постов под блокировкой; см. описание модуля.
+
+    Возвращает словарь {ключ: html}. С `wait=False` карточки, чьи ключи
+    заблокированы другим процессом, не рендерятся и в ответ не входят.
+    """
+    owned = [
+        post for post in posts
+        if cache.add(LOCK_KEY.format(keys[post.pk]), 1, LOCK_TIMEOUT)
+    ]
+    html = {
+        keys[post.pk]: render_to_string(CARD_TEMPLATE, {'post': post})
+        for post in owned
+    }
+    if html:
+        cache.set_many(html, CARD_TIMEOUT)
+        cache.delete_many([LOCK_KEY.format(key) for key in html])
+    if not wait:
+        return html
+    waiting = [keys[post.pk] for post in posts if keys[post.pk] not in html]
+    deadline = time.monotonic() + LOCK_WAIT
+    while waiting and time.monotonic() < deadline:
+        time.sleep(LOCK_POLL)
+        html.update(cache.get_many(waiting))
+        waiting = [key for key in waiting if key not in html]
+    for post in posts:
+        if keys[post.pk] not in html:
+            html[keys[post.pk]] = render_to_string(
+                CARD_TEMPLATE, {'post': post}
+            )
+    return html
+
+
+def touch(posts):
+    """Сдвигает версию карточек у выбранных постов."""
+    return posts.update(card_version=F('card_version') + 1)
+
+
+def forget(post):
+    cache.delete(card_key(post))
@@ -0,0 +1,192 @@
+"""Граф подписок в кэше: кто на кого подписан.
+
+Для каждого пользователя в кэше лежат два отсортированных массива id
+(`array`, 8 байт на подписку вместо объекта на строку): на кого он
+подписан и кто подписан на него. Отсутствующие массивы читаются
+из основной БД (не с реплики: отставший массив жил бы в кэше
+`FOLLOW_GRAPH_TIMEOUT`) одним запросом на всю пачку пользователей.
+Массивы длиннее `FOLLOW_GRAPH_MAX_CACHED` (подписчики знаменитостей)
+не кэшируются.
+
+Сигналы `Follow` не правят массивы в кэше, а выбрасывают их: правка
+«прочитать — изменить — записать» без блокировки теряла бы одну
+из одновременных подписок. Массивы выбрасываются сразу и еще раз
+после коммита, чтобы не осталась копия, прочитанная до него.
+"""
+import random
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+
+from . import timeline, versions
+from .models import AuthorStats, Follow, User
+
+KEY = 'follow_graph:{}:{}'
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+# Поле «владельца» массива и поле соседей в строке Follow.
+COLUMNS = {
+    FOLLOWING: ('user_id', 'author_id'),
+    FOLLOWERS: ('author_id', 'user_id'),
+}
+TIMEOUT = getattr(settings, 'FOLLOW_GRAPH_TIMEOUT', 60 * 60)
+MAX_CACHED = getattr(settings, 'FOLLOW_GRAPH_MAX_CACHED', 10000)
+BULK_LIMIT = getattr(settings, 'FOLLOW_BULK_LIMIT', 100)
+# Сколько подписок пользователя смотреть при подборе рекомендаций.
+SUGGESTION_SOURCES = 200
+
+
+def adjacency(kind, user_ids):
+    """Массивы соседей `kind` для пользователей: {id: array}."""
+    keys = {user_id: KEY.format(kind, user_id) for user_id in user_ids}
+    cached = cache.get_many(keys.values())
+    result = {}
+    missing = []
+    for user_id, key in keys.items():
+        if key in cached:
+            result[user_id] = cached[key]
+        else:
+            missing.append(user_id)
+    if missing:
+        own, other = COLUMNS[kind]
+        loaded = {user_id: [] for user_id in missing}
+        rows = Follow.objects.using(router.db_for_write(Follow)).filter(
+            **{f'{own}__in': missing}
+        ).order_by(own, other).values_list(own, other)
+        for user_id, neighbour in rows.iterator():
+            loaded[user_id].append(neighbour)
+        loaded = {
+            user_id: array('Q', ids) for user_id, ids in loaded.items()
+        }
+        cache.set_many({
+            keys[user_id]: ids
+            for user_id, ids in loaded.items()
+            if len(ids) <= MAX_CACHED
+        }, TIMEOUT)
+        result.update(loaded)
+    return result
+
+
+def following(user_id):
+    return adjacency(FOLLOWING, [user_id])[user_id]
+
+
+def followers(user_id):
+    return adjacency(FOLLOWERS, [user_id])[user_id]
+
+
+def contains(ids, value):
+    index = bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def is_following(user_id, author_id):
+    return contains(following(user_id), author_id)
+
+
+def added(user_id, author_id):
+    """Выбрасывает массивы обоих участников новой подписки."""
+    forget_pair(user_id, author_id)
+
+
+def removed(user_id, author_id):
+    forget_pair(user_id, author_id)
+
+
+def forget_pair(user_id, author_id):
+    keys = [KEY.format(FOLLOWING, user_id), KEY.format(FOLLOWERS, author_id)]
+    cache.delete_many(keys)
+    transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def forget(user_ids):
+    """Выбрасывает массивы пользователей, например после импорта."""
+    cache.delete_many([
+        KEY.format(kind, user_id)
+        for user_id in user_ids
+        for kind in (FOLLOWING, FOLLOWERS)
+    ])
+
+
+@transaction.atomic
+def follow_many(user_id, author_ids):
+    """Подписывает пользователя на авторов одной вставкой.
+
+    Возвращает id авторов, на которых подписка появилась. Проверки
+    идут по таблице, а не по кэшу, который мог отстать. Вставка идет
+    без сигналов, поэтому счетчики, ленту, версии и массивы графа
+    она обновляет сама.
+    """
+    new = list(User.objects.filter(pk__in=author_ids).exclude(
+        pk=user_id
+    ).exclude(
+        following__user_id=user_id
+    ).order_by('pk').values_list('pk', flat=True))
+    if not new:
+        return []
+    Follow.objects.bulk_create(
+        [Follow(user_id=user_id, author_id=author_id) for author_id in new],
+        ignore_conflicts=True
+    )
+    AuthorStats.objects.rebuild(User.objects.filter(pk__in=[user_id, *new]))
+    versions.bump(
+        versions.follows(user_id),
+        versions.author(user_id),
+        *(versions.author(author_id) for author_id in new)
+    )
+    for author_id in new:
+        timeline.backfill(user_id, author_id)
+        added(user_id, author_id)
+    return new
+
+
+@transaction.atomic
+def unfollow_many(user_id, author_ids):
+    """Отписывает пользователя от авторов; возвращает их id.
+
+    Подписки удаляются одним запросом через `moderation.delete_follows`,
+    без сигналов на каждую строку: счетчики, ленту, версии и массивы
+    графа оно обновляет само.
+    """
+    from .moderation import delete_follows
+    subscriptions = Follow.objects.filter(
+        user_id=user_id,
+        author_id__in=author_ids
+    )
+    removed_ids = sorted(subscriptions.values_list('author_id', flat=True))
+    if removed_ids:
+        delete_follows(subscriptions)
+    return removed_ids
+
+
+def suggestions(user_id, limit=10):
+    """Кого читать: авторы, на которых подписаны авторы пользователя.
+
+    Кандидаты ранжируются по числу таких путей длины 2. Если подписок
+    нет, предлагаются авторы с наибольшим числом подписчиков.
+    Возвращает список пар (id автора, число общих подписок).
+    """
+    sources = following(user_id)
+    skip = {user_id, *sources}
+    if len(sources) > SUGGESTION_SOURCES:
+        sources = random.Random(user_id).sample(
+            list(sources), SUGGESTION_SOURCES
+        )
+    counts = Counter()
+    for ids in adjacency(FOLLOWING, sources).values():
+        counts.update(ids)
+    for author_id in skip:
+        counts.pop(author_id, None)
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    if len(ranked) >= limit:
+        return ranked[:limit]
+    popular = AuthorStats.objects.filter(followers_count__gt=0).exclude(
+        author_id__in=[user_id, *(author_id for author_id, _ in ranked)]
+    ).exclude(author__following__user_id=user_id).order_by(
+        '-followers_count', 'author_id'
+    ).values_list('author_id', flat=True)[:limit - len(ranked)]
+    return ranked + [(author_id, 0) for author_id in popular]
@@ -0,0 +1,119 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from PIL import Image
+
+from posts import thumbnails
+from posts.models import Post
+from posts.views import LIMIT
+
+EXTENSIONS = ('.jpg', '.jpeg', '.png', '.gif', '.webp', '.bmp', '.tif')
+
+
+def choose(variants, viewport):
+    """Вариант, который выберет браузер для экрана шириной viewport px:
+    лучший доступный формат и самая узкая ширина не меньше экрана.
+    """
+    for fmt in thumbnails.supported_formats():
+        candidates = sorted(
+            (v for v in variants if v['format'] == fmt),
+            key=lambda v: v['width']
+        )
+        for variant in candidates:
+            if variant['width'] >= viewport:
+                return variant
+        if candidates:
+            return candidates[-1]
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает вес картинок в ленте: прежняя JPEG-карточка 960px '
+        'против адаптивных вариантов для экранов разной ширины.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            help='Файлы или каталоги с картинками. '
+                 'По умолчанию берутся картинки постов.'
+        )
+        parser.add_argument(
+            '--limit',
+            type=int,
+            default=100,
+            help='Сколько картинок взять из выборки.'
+        )
+        parser.add_argument(
+            '--viewport',
+            type=int,
+            nargs='+',
+            default=[480, 960, 1440],
+            help='Ширины экранов в физических пикселях.'
+        )
+
+    def sample(self, paths, limit):
+        if not paths:
+            posts = Post.objects.exclude(image='').only('image')[:limit]
+            for post in posts:
+                yield post.image.name, thumbnails.open_image(post.image)
+            return
+        files = []
+        for path in paths:
+            if os.path.isdir(path):
+                files.extend(
+                    os.path.join(root, name)
+                    for root, _, names in os.walk(path)
+                    for name in sorted(names)
+                    if name.lower().endswith(EXTENSIONS)
+                )
+            else:
+                files.append(path)
+        for path in files[:limit]:
+            with Image.open(path) as image:
+                image.load()
+                yield path, image
+
+    def handle(self, *args, **options):
+        viewports = options['viewport']
+        baseline_quality = getattr(settings, 'THUMBNAIL_QUALITY', 95)
+        baseline = 0
+        optimized = dict.fromkeys(viewports, 0)
+        count = 0
+        for name, image in self.sample(options['paths'], options['limit']):
+            baseline += len(thumbnails.render(
+                image, thumbnails.RATIO[0], 'JPEG', baseline_quality
+            )[0])
+            variants = []
+            for width in thumbnails.target_widths(image.width):
+                for fmt in thumbnails.supported_formats():
+                    content, _ = thumbnails.render(image, width, fmt)
+                    variants.append({
+                        'format': fmt, 'width': width, 'bytes': len(content)
+                    })
+            for viewport in viewports:
+                optimized[viewport] += choose(variants, viewport)['bytes']
+            count += 1
+            self.stdout.write(f'{name}: {len(variants)} вариантов')
+        if not count:
+            raise CommandError('Нет картинок для сравнения.')
+
+        formats = ', '.join(thumbnails.supported_formats())
+        self.stdout.write(f'Картинок: {count}, форматы: {formats}.')
+        page = LIMIT / count
+        self.stdout.write(
+            f'Прежняя карточка (JPEG q{baseline_quality}): '
+            f'{baseline / 1024:.1f} КиБ, '
+            f'{baseline * page / 1024:.1f} КиБ на страницу ленты.'
+        )
+        for viewport in viewports:
+            total = optimized[viewport]
+            saved = 1 - total / baseline
+            self.stdout.write(self.style.SUCCESS(
+                f'Экран {viewport}px: {total / 1024:.1f} КиБ, '
+                f'{total * page / 1024:.1f} КиБ на страницу ленты, '
+                f'экономия {saved:.0%}.'
+            ))
@@ -0,0 +1,183 @@
+import json
+import shutil
+import subprocess
+import tempfile
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import benchmark
+
+COLUMNS = (
+    ('requests', 'запросов', '{:>8}'),
+    ('errors', 'ошибок', '{:>6}'),
+    ('p50_ms', 'p50 мс', '{:>8.1f}'),
+    ('p95_ms', 'p95 мс', '{:>8.1f}'),
+    ('p99_ms', 'p99 мс', '{:>8.1f}'),
+    ('queries_mean', 'SQL ср.', '{:>7.1f}'),
+    ('queries_max', 'SQL макс', '{:>8}'),
+    ('memory_peak_kib', 'память КиБ', '{:>10.0f}'),
+)
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочный прогон вьюх posts: создает тестовую БД с '
+        'синтетическими данными, гоняет смесь запросов в несколько потоков '
+        'и печатает перцентили задержки, число SQL-запросов и память.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--groups', type=int, default=10)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument(
+            '--follows', type=int, default=20,
+            help='Подписок на пользователя.'
+        )
+        parser.add_argument(
+            '--images', type=float, default=0.2,
+            help='Доля постов с картинками.'
+        )
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--mix',
+            help='JSONL со смесью запросов; по умолчанию смесь из '
+                 'posts.benchmark.DEFAULT_MIX.'
+        )
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument(
+            '--duration', type=float,
+            help='Гонять смесь столько секунд вместо --requests.'
+        )
+        parser.add_argument(
+            '--memory-samples', type=int, default=5,
+            help='Запросов каждого вида для замера памяти, 0 — не мерить.'
+        )
+        parser.add_argument(
+            '--warmup', type=int, default=200,
+            help='Запросов прогрева кэшей до замеров.'
+        )
+        parser.add_argument(
+            '-o', '--output',
+            help='Сохранить результаты в JSON для сравнения.'
+        )
+        parser.add_argument(
+            '--compare',
+            help='JSON прошлого прогона: напечатать изменение p95 и SQL.'
+        )
+
+    def handle(self, *args, **options):
+        mix = (
+            benchmark.Mix.from_jsonl(options['mix']) if options['mix']
+            else benchmark.Mix(benchmark.DEFAULT_MIX)
+        )
+        media_root = tempfile.mkdtemp(prefix='yatube_benchmark_')
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            with override_settings(
+                ALLOWED_HOSTS=['testserver'],
+                MEDIA_ROOT=media_root,
+                DEBUG=False
+            ):
+                report = self.benchmark(mix, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+        report['revision'] = git_revision()
+        self.print_report(report)
+        if options['compare']:
+            with open(options['compare'], encoding='utf-8') as stream:
+                self.print_comparison(json.load(stream), report)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(report, stream, ensure_ascii=False, indent=2)
+
+    def benchmark(self, mix, options):
+        cache.clear()
+        dataset = benchmark.Dataset(
+            users=options['users'],
+            groups=options['groups'],
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=options['follows'],
+            images=options['images'],
+            seed=options['seed'],
+        )
+        self.stderr.write('Создаю данные...')
+        dataset.create()
+        if options['warmup']:
+            self.stderr.write('Прогрев...')
+            benchmark.Runner(
+                dataset, mix, options['concurrency'], options['warmup']
+            ).run()
+        self.stderr.write('Замер...')
+        runner = benchmark.Runner(
+            dataset,
+            mix,
+            concurrency=options['concurrency'],
+            requests=options['requests'],
+            duration=options['duration'],
+        )
+        runner.run()
+        if options['memory_samples']:
+            runner.measure_memory(options['memory_samples'])
+        return runner.report()
+
+    def print_report(self, report):
+        self.stdout.write(
+            f"Коммит {report['revision'] or '?'}, данные {report['dataset']}"
+        )
+        self.stdout.write(
+            f"{report['requests']} запросов в {report['concurrency']} "
+            f"потока(ов) за {report['elapsed_s']:.1f} с, "
+            f"{report['throughput_rps']:.0f} запросов/с"
+        )
+        header = f"{'вьюха':<18}" + ''.join(
+            f' {title:>{len(fmt.format(0))}}' for _, title, fmt in COLUMNS
+        )
+        self.stdout.write(header)
+        for name, view in report['views'].items():
+            self.stdout.write(f'{name:<18}' + ''.join(
+                ' ' + fmt.format(view[key]) for key, _, fmt in COLUMNS
+            ))
+
+    def print_comparison(self, old, new):
+        self.stdout.write(
+            f"Сравнение с {old.get('revision') or 'прошлым прогоном'}:"
+        )
+        if old.get('dataset') != new['dataset']:
+            self.stdout.write(self.style.WARNING(
+                'Параметры данных различаются, сравнение неточное.'
+            ))
+        for name, view in new['views'].items():
+            before = old['views'].get(name)
+            if not before:
+                continue
+            change = (
+                view['p95_ms'] / before['p95_ms'] - 1
+                if before['p95_ms'] else 0
+            )
+            line = (
+                f"{name:<18} p95 {before['p95_ms']:.1f} → "
+                f"{view['p95_ms']:.1f} мс ({change:+.0%}), SQL "
+                f"{before['queries_mean']:.1f} → {view['queries_mean']:.1f}"
+            )
+            style = self.style.ERROR if change > 0.1 else self.style.SUCCESS
+            self.stdout.write(style(line))
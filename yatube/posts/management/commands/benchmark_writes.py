@@ -0,0 +1,158 @@
+import json
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from posts import benchmark
+
+from .benchmark_views import git_revision
+
+# Режимы SQLite: стандартный и с PRAGMA из settings.SQLITE_PRAGMAS
+# и BEGIN IMMEDIATE, см. core/backends/sqlite3.
+SQLITE_MODES = ('sqlite', 'sqlite-tuned')
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает пропускную способность записи (post_create, '
+        'add_comment в несколько потоков) в режимах БД: SQLite как есть, '
+        'SQLite с WAL и прочими PRAGMA или настроенный PostgreSQL.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modes',
+            help='Режимы через запятую: sqlite, sqlite-tuned (для SQLite) '
+                 'или current — база из настроек как есть. По умолчанию '
+                 'оба режима SQLite или current для другой СУБД.'
+        )
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=500)
+        parser.add_argument('--comments', type=int, default=1000)
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--concurrency', type=int, default=4)
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument(
+            '--duration', type=float,
+            help='Писать столько секунд вместо --requests.'
+        )
+        parser.add_argument(
+            '-o', '--output',
+            help='Сохранить результаты в JSON, например, чтобы сравнить '
+                 'прогоны на SQLite и PostgreSQL.'
+        )
+
+    def handle(self, *args, **options):
+        modes = self.modes(options['modes'])
+        directory = tempfile.mkdtemp(prefix='yatube_writes_')
+        reports = {}
+        try:
+            for mode in modes:
+                self.stderr.write(f'Режим {mode}...')
+                with self.database(mode, directory), override_settings(
+                    ALLOWED_HOSTS=['testserver'],
+                    MEDIA_ROOT=os.path.join(directory, 'media'),
+                    DEBUG=False
+                ):
+                    reports[mode] = self.benchmark(options)
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        self.print_report(reports)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as stream:
+                json.dump(
+                    {'revision': git_revision(),
+                     'vendor': connection.vendor,
+                     'modes': reports},
+                    stream, ensure_ascii=False, indent=2
+                )
+
+    def modes(self, value):
+        sqlite = connection.vendor == 'sqlite'
+        if not value:
+            return list(SQLITE_MODES) if sqlite else ['current']
+        modes = [mode.strip() for mode in value.split(',') if mode.strip()]
+        for mode in modes:
+            if mode in SQLITE_MODES and not sqlite:
+                raise CommandError(
+                    f'Режим {mode} доступен только для SQLite.'
+                )
+            if mode not in SQLITE_MODES and mode != 'current':
+                raise CommandError(f'Неизвестный режим {mode}.')
+        return modes
+
+    @contextmanager
+    def database(self, mode, directory):
+        """Тестовая БД режима; у SQLite — файл, чтобы потоки делили его."""
+        settings_dict = connection.settings_dict
+        saved = {
+            key: settings_dict.get(key)
+            for key in ('PRAGMAS', 'TRANSACTION_MODE')
+        }
+        saved['TEST'] = dict(settings_dict['TEST'])
+        if mode in SQLITE_MODES:
+            settings_dict['TEST']['NAME'] = os.path.join(
+                directory, f'{mode}.sqlite3'
+            )
+            tuned = mode == 'sqlite-tuned'
+            settings_dict['PRAGMAS'] = (
+                getattr(settings, 'SQLITE_PRAGMAS', {}) if tuned else {}
+            )
+            settings_dict['TRANSACTION_MODE'] = 'IMMEDIATE' if tuned else None
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False
+        )
+        try:
+            yield
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            settings_dict.update(saved)
+
+    def benchmark(self, options):
+        cache.clear()
+        dataset = benchmark.Dataset(
+            users=options['users'],
+            groups=5,
+            posts=options['posts'],
+            comments=options['comments'],
+            follows=5,
+            images=0,
+            seed=options['seed'],
+        )
+        dataset.create()
+        runner = benchmark.Runner(
+            dataset,
+            benchmark.Mix(benchmark.WRITE_MIX),
+            concurrency=options['concurrency'],
+            requests=options['requests'],
+            duration=options['duration'],
+        )
+        runner.run()
+        return runner.report()
+
+    def print_report(self, reports):
+        self.stdout.write(
+            f"{'режим':<14} {'записей':>8} {'ошибок':>6} {'в сек.':>8} "
+            f"{'вьюха':<12} {'p50 мс':>8} {'p95 мс':>8} {'p99 мс':>8}"
+        )
+        for mode, report in reports.items():
+            errors = sum(
+                view['errors'] for view in report['views'].values()
+            )
+            prefix = (
+                f"{mode:<14} {report['requests']:>8} {errors:>6} "
+                f"{report['throughput_rps']:>8.0f}"
+            )
+            for name, view in report['views'].items():
+                self.stdout.write(
+                    f"{prefix} {name:<12} {view['p50_ms']:>8.1f} "
+                    f"{view['p95_ms']:>8.1f} {view['p99_ms']:>8.1f}"
+                )
+                prefix = ' ' * len(prefix)
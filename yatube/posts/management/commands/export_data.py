@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = 'Выгружает группы, посты, комментарии или подписки в NDJSON/CSV.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=bulk.MODELS)
+        parser.add_argument(
+            '-o', '--output',
+            default='-',
+            help='Файл для выгрузки, по умолчанию stdout.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=bulk.FORMATS,
+            default='ndjson'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Сколько строк читать из БД за один раз.'
+        )
+
+    def handle(self, *args, **options):
+        name = options['model']
+        progress = bulk.Progress(self.stderr.write)
+        stream = (
+            self.stdout if options['output'] == '-'
+            else open(options['output'], 'w', encoding='utf-8', newline='')
+        )
+        try:
+            rows = bulk.export_rows(name, options['batch_size'])
+            for _ in bulk.write_rows(
+                rows, stream, options['format'], bulk.MODELS[name][1]
+            ):
+                progress.step()
+        finally:
+            if stream is not self.stdout:
+                stream.close()
+        self.stderr.write(self.style.SUCCESS(
+            f'Выгружено строк: {progress.count} '
+            f'({progress.rate:.0f} строк/с).'
+        ))
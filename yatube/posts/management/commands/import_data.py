@@ -0,0 +1,71 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from posts import bulk
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает группы, посты, комментарии или подписки из NDJSON/CSV '
+        'пачками через bulk_create, без сигналов моделей. Счетчики '
+        'и ленты подписок затронутых пользователей пересобираются в конце.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=bulk.MODELS)
+        parser.add_argument(
+            'input',
+            help='Файл с данными, «-» — stdin.'
+        )
+        parser.add_argument(
+            '--format',
+            choices=bulk.FORMATS,
+            default='ndjson'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=2000,
+            help='Сколько объектов вставлять одним запросом.'
+        )
+        parser.add_argument(
+            '--ignore-conflicts',
+            action='store_true',
+            help='Пропускать строки, уже существующие в БД.'
+        )
+        parser.add_argument(
+            '--skip-rebuild',
+            action='store_true',
+            help='Не пересобирать счетчики и ленты после загрузки.'
+        )
+
+    def handle(self, *args, **options):
+        name = options['model']
+        progress = bulk.Progress(self.stderr.write)
+        users = set()
+        stream = (
+            sys.stdin if options['input'] == '-'
+            else open(options['input'], encoding='utf-8', newline='')
+        )
+        try:
+            rows = bulk.read_rows(stream, options['format'])
+            for count in bulk.import_rows(
+                name,
+                rows,
+                batch_size=options['batch_size'],
+                ignore_conflicts=options['ignore_conflicts'],
+                users=users
+            ):
+                progress.step(count)
+        finally:
+            if stream is not sys.stdin:
+                stream.close()
+        self.stderr.write(
+            f'Загружено строк: {progress.count} '
+            f'({progress.rate:.0f} строк/с).'
+        )
+        if not options['skip_rebuild']:
+            bulk.finish(name, users)
+            self.stderr.write('Счетчики и ленты пересобраны.')
+        self.stderr.write(self.style.SUCCESS('Готово.'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.models import AuthorStats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счетчики постов, подписчиков и подписок авторов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Сколько строк вставлять за один запрос.'
+        )
+
+    def handle(self, *args, **options):
+        stats = AuthorStats.objects.rebuild(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Пересчитаны счетчики для {len(stats)} авторов.'
+        ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from posts import popular
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает рейтинг недавних постов и обновляет популярные '
+        'ленты сайта и групп. Запускайте по расписанию, например раз '
+        'в 10 минут.'
+    )
+
+    def handle(self, *args, **options):
+        count = popular.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Популярные ленты обновлены, записей: {count}.'
+        ))
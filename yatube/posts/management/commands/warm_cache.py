@@ -0,0 +1,42 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from posts import warmup
+
+
+class Command(BaseCommand):
+    help = (
+        'Заранее рендерит в кэш карточки первых страниц главной, '
+        'крупных групп и популярных авторов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--pages', type=int, default=warmup.PAGES)
+        parser.add_argument('--groups', type=int, default=warmup.GROUPS)
+        parser.add_argument('--authors', type=int, default=warmup.AUTHORS)
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Повторять проход каждые столько секунд; '
+                 'по умолчанию один проход.'
+        )
+
+    def handle(self, *args, **options):
+        limits = {
+            'pages': options['pages'],
+            'groups': options['groups'],
+            'authors': options['authors'],
+        }
+        if not options['interval']:
+            count = warmup.warm(**limits)
+            self.stdout.write(self.style.SUCCESS(
+                f'Кэш прогрет, отрендерено карточек: {count}.'
+            ))
+            return
+        while True:
+            count = warmup.warm_if_due(options['interval'], **limits)
+            if count:
+                self.stdout.write(f'Отрендерено карточек: {count}')
+            close_old_connections()
+            time.sleep(options['interval'])
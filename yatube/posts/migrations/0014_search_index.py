@@ -0,0 +1,41 @@
+from django.db import migrations
+
+# Схема таблицы индекса на момент миграции; код приложения
+# (posts.search.backends) может меняться, а миграция — нет.
+CREATE = {
+    'sqlite': [
+        'CREATE VIRTUAL TABLE posts_search USING fts5('
+        'body, post_id UNINDEXED, '
+        "tokenize = 'unicode61 remove_diacritics 0')",
+    ],
+    'postgresql': [
+        'CREATE TABLE posts_search ('
+        'id bigint PRIMARY KEY, '
+        'post_id integer NOT NULL, '
+        'document tsvector NOT NULL)',
+        'CREATE INDEX posts_search_document_idx '
+        'ON posts_search USING GIN (document)',
+        'CREATE INDEX posts_search_post_id_idx ON posts_search (post_id)',
+    ],
+}
+
+
+def create_index(apps, schema_editor):
+    for sql in CREATE.get(schema_editor.connection.vendor, []):
+        schema_editor.execute(sql)
+
+
+def drop_index(apps, schema_editor):
+    if schema_editor.connection.vendor in CREATE:
+        schema_editor.execute('DROP TABLE IF EXISTS posts_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_updated'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_index, drop_index),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-17 06:43
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_post_image_variants'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PopularPost',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('rank', models.PositiveIntegerField(verbose_name='Место')),
+                ('score', models.FloatField(verbose_name='Рейтинг')),
+                ('group', models.ForeignKey(blank=True, help_text='Пусто — общая лента', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='popular_entries', to='posts.Group', verbose_name='Группа')),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='popular_entries', to='posts.Post', verbose_name='Пост')),
+            ],
+            options={
+                'verbose_name': 'Пост популярной ленты',
+                'verbose_name_plural': 'Популярная лента',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='popularpost',
+            index=models.Index(fields=['group', 'rank', 'post'], name='popular_group_rank_idx'),
+        ),
+    ]
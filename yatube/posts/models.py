@@ -1,5 +1,10 @@
+import json
+
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import models, router, transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -13,6 +18,36 @@ class Group(models.Model):
         return self.title
 
 
+class PostQuerySet(models.QuerySet):
+    def for_feed(self):
+        """Посты для лент: автор и группа подгружаются тем же запросом,
+        неиспользуемые в шаблонах колонки откладываются.
+        """
+        return self.select_related('author', 'group').defer(
+            'author__password',
+            'author__last_login',
+            'author__is_superuser',
+            'author__is_staff',
+            'author__is_active',
+            'author__date_joined',
+            'author__email',
+            'group__description',
+        )
+
+    def with_comment_count(self):
+        """Число комментариев подзапросом: его отдает только API,
+        в карточках HTML-лент оно не выводится.
+        """
+        comment_count = Comment.objects.filter(
+            post=OuterRef('pk')
+        ).order_by().values('post').annotate(
+            count=Count('pk')
+        ).values('count')
+        return self.annotate(
+            comment_count=Coalesce(Subquery(comment_count), 0)
+        )
+
+
 class Post(models.Model):
     text = models.TextField(
         'Текст поста',
@@ -22,6 +57,10 @@ class Post(models.Model):
         'Дата публикации',
         auto_now_add=True
     )
+    updated = models.DateTimeField(
+        'Дата изменения',
+        auto_now=True
+    )
     author = models.ForeignKey(
         User,
         on_delete=models.CASCADE,
@@ -42,15 +81,53 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    thumbnails = models.TextField(
+        'Варианты картинки',
+        blank=True,
+        default='',
+        editable=False
+    )
+    card_version = models.PositiveIntegerField(
+        'Версия карточки',
+        default=0,
+        editable=False,
+        help_text='Растет, когда меняется вид карточки без правки поста'
+    )
+
+    objects = PostQuerySet.as_manager()
 
     class Meta:
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', '-pub_date', '-id'],
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', '-pub_date', '-id'],
+                name='post_group_pub_date_idx'
+            ),
+        ]
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
 
     def __str__(self):
         return self.text[:15]
 
+    @property
+    def image_variants(self):
+        """Описание готовых вариантов картинки (см. `posts.thumbnails`)."""
+        from .thumbnails import SIZES
+        if not self.thumbnails:
+            return {}
+        data = json.loads(self.thumbnails)
+        data['sizes'] = SIZES
+        return data
+
 
 class Comment(models.Model):
     post = models.ForeignKey(
@@ -74,6 +151,21 @@ class Comment(models.Model):
         auto_now_add=True
     )
 
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+            models.Index(
+                fields=['author', 'created'],
+                name='comment_author_created_idx'
+            ),
+            models.Index(fields=['created'], name='comment_created_idx'),
+        ]
+        verbose_name = 'Комментарий'
+        verbose_name_plural = 'Комментарии'
+
     def __str__(self):
         return self.text[:15]
 
@@ -91,6 +183,7 @@ class Follow(models.Model):
         related_name='following',
         verbose_name='Автор постов'
     )
+    created = models.DateTimeField('Дата подписки', default=timezone.now)
 
     class Meta:
         constraints = [
@@ -103,6 +196,189 @@ class Follow(models.Model):
                 name='prevent_self_following'
             ),
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+            models.Index(fields=['created'], name='follow_created_idx'),
+        ]
+        verbose_name = 'Подписка'
+        verbose_name_plural = 'Подписки'
+
+    def __str__(self):
+        return f'{self.user} → {self.author}'
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline',
+        verbose_name='Подписчик'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField('Дата публикации поста')
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='unique_timeline_entry'
+            ),
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='timeline_user_pub_date_idx'
+            ),
+        ]
+        verbose_name = 'Запись ленты подписок'
+        verbose_name_plural = 'Записи лент подписок'
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class PopularPost(models.Model):
+    """Место поста в популярной ленте, см. posts/popular.py."""
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='popular_entries',
+        verbose_name='Пост'
+    )
+    group = models.ForeignKey(
+        Group,
+        null=True,
+        blank=True,
+        on_delete=models.CASCADE,
+        related_name='popular_entries',
+        verbose_name='Группа',
+        help_text='Пусто — общая лента'
+    )
+    rank = models.PositiveIntegerField('Место')
+    score = models.FloatField('Рейтинг')
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=['group', 'rank', 'post'],
+                name='popular_group_rank_idx'
+            ),
+        ]
+        verbose_name = 'Пост популярной ленты'
+        verbose_name_plural = 'Популярная лента'
+
+    def __str__(self):
+        return f'{self.group_id}: {self.rank}. {self.post_id}'
+
+
+def count_subquery(model, field):
+    """Подзапрос с числом строк `model`, ссылающихся на пользователя."""
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            count=Count('pk')
+        ).values('count')
+    ), 0)
+
+
+class AuthorStatsManager(models.Manager):
+    def counts(self, users):
+        """Считает счетчики по основным таблицам."""
+        return users.annotate(
+            posts_count=count_subquery(Post, 'author'),
+            followers_count=count_subquery(Follow, 'author'),
+            following_count=count_subquery(Follow, 'user'),
+        ).values_list(
+            'pk', 'posts_count', 'followers_count', 'following_count'
+        )
+
+    def for_author(self, author):
+        """Возвращает счетчики автора, при отсутствии создает их."""
+        try:
+            return self.get(author=author)
+        except self.model.DoesNotExist:
+            return self.create_missing(author.pk)
+
+    def change(self, author_id, **deltas):
+        """Атомарно сдвигает счетчики автора на указанные величины."""
+        updated = self.filter(author_id=author_id).update(**{
+            field: F(field) + delta for field, delta in deltas.items()
+        })
+        if not updated:
+            self.create_missing(author_id)
+
+    def create_missing(self, author_id):
+        """Создает строку счетчиков автора по основным таблицам.
+
+        Считается и пишется все на primary, даже если вызов пришел
+        из чтения с реплики; уже созданная строка не трогается.
+        """
+        db = router.db_for_write(self.model)
+        _, posts_count, followers_count, following_count = self.counts(
+            User.objects.using(db).filter(pk=author_id)
+        ).get()
+        stats, _ = self.using(db).get_or_create(
+            author_id=author_id,
+            defaults={
+                'posts_count': posts_count,
+                'followers_count': followers_count,
+                'following_count': following_count,
+            }
+        )
+        return stats
+
+    def rebuild(self, users=None, batch_size=1000):
+        """Пересчитывает счетчики для пользователей (по умолчанию всех)."""
+        if users is None:
+            users = User.objects.all()
+        stats = [
+            self.model(
+                author_id=pk,
+                posts_count=posts_count,
+                followers_count=followers_count,
+                following_count=following_count,
+            )
+            for pk, posts_count, followers_count, following_count
+            in self.counts(users).order_by('pk').iterator()
+        ]
+        with transaction.atomic():
+            self.filter(author__in=users).delete()
+            self.bulk_create(stats, batch_size=batch_size)
+        return stats
+
+
+class AuthorStats(models.Model):
+    author = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Автор'
+    )
+    posts_count = models.PositiveIntegerField('Число постов', default=0)
+    followers_count = models.PositiveIntegerField(
+        'Число подписчиков',
+        default=0
+    )
+    following_count = models.PositiveIntegerField(
+        'Число подписок',
+        default=0
+    )
+
+    objects = AuthorStatsManager()
+
+    class Meta:
+        verbose_name = 'Счетчики автора'
+        verbose_name_plural = 'Счетчики авторов'
 
     def __str__(self):
-        return self.author
+        return str(self.author_id)
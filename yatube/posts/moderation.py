@@ -0,0 +1,96 @@
+"""Массовое удаление комментариев и подписок для модерации.
+
+Удаление через `QuerySet.delete()` отправляет сигналы по каждой строке,
+а обработчики в `signals.py` делают несколько запросов на строку.
+Здесь выборка удаляется одним DELETE с подзапросом, без сигналов,
+а то, что поддерживают сигналы (версии страниц, карточки, поисковый
+индекс, счетчики авторов, ленты подписок, граф подписок), обновляется
+один раз по множеству затронутых постов и пользователей. Число запросов
+не зависит от размера выборки.
+"""
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef
+
+from . import follow_graph, search, timeline, versions
+from .models import AuthorStats, Comment, Follow, Post, TimelineEntry, User
+from .signals import touch_commented
+
+
+def delete_rows(queryset):
+    """Удаляет строки queryset одним DELETE ... WHERE pk IN (подзапрос).
+
+    Сигналы и сборщик связанных объектов не участвуют, поэтому подходит
+    только моделям, на которые никто не ссылается внешним ключом,
+    как Comment и Follow. Возвращает число удаленных строк.
+    """
+    model = queryset.model
+    using = router.db_for_write(model)
+    connection = connections[using]
+    sql, params = queryset.order_by().values('pk').query.get_compiler(
+        using
+    ).as_sql()
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(model._meta.pk.column)} IN ({sql})',
+            params
+        )
+        return cursor.rowcount
+
+
+@transaction.atomic
+def delete_comments(queryset):
+    """Удаляет комментарии из queryset. Возвращает их число."""
+    post_ids = set(queryset.order_by().values_list(
+        'post_id', flat=True
+    ).distinct())
+    search.remove_comments(queryset)
+    count = delete_rows(queryset)
+    touch_commented(Post.objects.filter(pk__in=post_ids))
+    return count
+
+
+def delete_comments_by_authors(author_ids):
+    """Удаляет все комментарии авторов, например спамеров."""
+    return delete_comments(Comment.objects.filter(author_id__in=author_ids))
+
+
+@transaction.atomic
+def delete_follows(queryset):
+    """Удаляет подписки из queryset. Возвращает их число."""
+    follows = queryset.order_by()
+    users = set(follows.values_list('user_id', flat=True).distinct())
+    authors = set(follows.values_list('author_id', flat=True).distinct())
+    before = followers_counts(authors)
+    pruned = TimelineEntry.objects.annotate(unfollowed=Exists(
+        follows.filter(
+            user_id=OuterRef('user_id'),
+            author_id=OuterRef('post__author_id')
+        )
+    )).filter(unfollowed=True)
+    TimelineEntry.objects.filter(pk__in=pruned.values('pk')).delete()
+    count = delete_rows(follows)
+    AuthorStats.objects.rebuild(User.objects.filter(pk__in=users | authors))
+    after = followers_counts(authors)
+    for author_id, followers in before.items():
+        timeline.followers_dropped(
+            author_id, followers, after.get(author_id, 0)
+        )
+    follow_graph.forget(users | authors)
+    versions.bump(
+        *(versions.follows(user_id) for user_id in users),
+        *(versions.author(user_id) for user_id in users | authors)
+    )
+    return count
+
+
+def delete_follows_by_users(user_ids):
+    """Удаляет все подписки пользователей, например накрученные ботами."""
+    return delete_follows(Follow.objects.filter(user_id__in=user_ids))
+
+
+def followers_counts(author_ids):
+    return dict(AuthorStats.objects.filter(
+        author_id__in=author_ids
+    ).values_list('author_id', 'followers_count'))
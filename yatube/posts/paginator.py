@@ -0,0 +1,267 @@
+import base64
+import binascii
+import hashlib
+
+from django.core.cache import cache
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db import connections
+from django.db.models import Max, Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+COUNT_CACHE_TIMEOUT = 60
+# До стольких строк EstimatedCountPaginator считает точно.
+EXACT_COUNT_LIMIT = 10000
+
+NEXT = 'n'
+PREVIOUS = 'p'
+
+
+def encode_cursor(direction, date, pk):
+    """Упаковывает ключ (дата или число, id) в непрозрачный курсор."""
+    value = date.isoformat() if hasattr(date, 'isoformat') else date
+    raw = f'{direction}|{value}|{pk}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor, parse=parse_datetime):
+    """Распаковывает курсор. Для испорченного курсора возвращает None.
+
+    `parse` превращает первую часть ключа из строки в значение.
+    """
+    padding = '=' * (-len(cursor) % 4)
+    try:
+        raw = base64.urlsafe_b64decode(cursor + padding).decode()
+        direction, date, pk = raw.split('|')
+        date = parse(date)
+        pk = int(pk)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        return None
+    if direction not in (NEXT, PREVIOUS) or date is None:
+        return None
+    return direction, date, pk
+
+
+class CursorPage(Page):
+    """Страница по курсору. Номера у нее нет, поэтому навигация `Page`
+    идет по курсорам: номер соседней страницы — ее курсор.
+
+    Место страницы в ленте неизвестно без COUNT, так что `start_index`
+    и `end_index` нумеруют объекты в пределах самой страницы.
+    """
+
+    def __init__(self, object_list, paginator, cursor, previous_cursor,
+                 next_cursor):
+        super().__init__(object_list, None, paginator)
+        self.cursor = cursor
+        self.previous_cursor = previous_cursor
+        self.next_cursor = next_cursor
+
+    def __repr__(self):
+        return f'<Page {self.cursor or "first"}>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def next_page_number(self):
+        if self.next_cursor is None:
+            raise EmptyPage('Это последняя страница')
+        return self.next_cursor
+
+    def previous_page_number(self):
+        if self.previous_cursor is None:
+            raise EmptyPage('Это первая страница')
+        return self.previous_cursor
+
+    def start_index(self):
+        return 1 if self.object_list else 0
+
+    def end_index(self):
+        return len(self.object_list)
+
+
+class CursorPaginator(Paginator):
+    """Постраничная разбивка по ключу (pub_date, id).
+
+    Страницы по курсору выбираются запросом
+    `WHERE (pub_date, id) < (...) LIMIT n + 1` без OFFSET и COUNT(*),
+    поэтому их стоимость не зависит от глубины. Номера страниц
+    (`?page=N`) по-прежнему поддерживаются для старых ссылок,
+    а общее количество объектов при этом берется из кэша.
+
+    `keys` задает пару полей (или аннотаций) с датой и id,
+    по которым упорядочена лента. По умолчанию новые объекты идут
+    первыми; `descending=False` разворачивает порядок. Вместо даты
+    можно взять целое число (например, место в рейтинге), передав
+    `parse=int`.
+    """
+
+    def __init__(self, object_list, per_page, keys=('pub_date', 'pk'),
+                 descending=True, parse=parse_datetime, **kwargs):
+        self.date_field, self.pk_field = keys
+        self.descending = descending
+        self.parse = parse
+        object_list = object_list.order_by(*self._ordering(descending))
+        super().__init__(object_list, per_page, **kwargs)
+
+    def _ordering(self, descending):
+        sign = '-' if descending else ''
+        return f'{sign}{self.date_field}', f'{sign}{self.pk_field}'
+
+    def encode_cursor(self, direction, obj):
+        return encode_cursor(
+            direction,
+            getattr(obj, self.date_field),
+            getattr(obj, self.pk_field)
+        )
+
+    @cached_property
+    def count(self):
+        query = str(self.object_list.query).encode()
+        key = 'paginator_count:' + hashlib.md5(query).hexdigest()
+        count = cache.get(key)
+        if count is None:
+            count = super().count
+            cache.set(key, count, COUNT_CACHE_TIMEOUT)
+        return count
+
+    def _get_page(self, object_list, number, paginator):
+        page = Page(list(object_list), number, paginator)
+        page.cursor = ''
+        page.previous_cursor = (
+            self.encode_cursor(PREVIOUS, page[0])
+            if page.object_list and page.has_previous() else None
+        )
+        page.next_cursor = (
+            self.encode_cursor(NEXT, page[-1])
+            if page.object_list and page.has_next() else None
+        )
+        return page
+
+    def get_first_page(self):
+        """Первая страница ленты как обычная `Page` с номером 1.
+
+        Объекты и курсор следующей страницы берутся тем же запросом
+        с LIMIT, что и у страниц по курсору; COUNT выполнится, только
+        если спросить номера соседних страниц.
+        """
+        object_list = self._slice(self.object_list)
+        page = Page(object_list[:self.per_page], 1, self)
+        page.cursor = ''
+        page.previous_cursor = None
+        page.next_cursor = (
+            self.encode_cursor(NEXT, object_list[self.per_page - 1])
+            if len(object_list) > self.per_page else None
+        )
+        return page
+
+    def get_cursor_page(self, cursor):
+        """Возвращает страницу, следующую за курсором (или перед ним).
+
+        Пустой или испорченный курсор дает первую страницу.
+        """
+        key = decode_cursor(cursor, self.parse) if cursor else None
+        if key is None:
+            return self._cursor_page(self._slice(self.object_list), '', NEXT)
+        direction, date, pk = key
+        field, pk_field = self.date_field, self.pk_field
+        # Вперед по убывающему порядку — к меньшим ключам.
+        lookup = 'lt' if (direction == NEXT) == self.descending else 'gt'
+        object_list = self.object_list.filter(
+            Q(**{f'{field}__{lookup}': date})
+            | Q(**{field: date, f'{pk_field}__{lookup}': pk})
+        )
+        if direction == PREVIOUS:
+            object_list = object_list.order_by(
+                *self._ordering(not self.descending)
+            )
+        page = self._cursor_page(self._slice(object_list), cursor, direction)
+        if not page.object_list and direction == PREVIOUS:
+            return self.get_cursor_page('')
+        return page
+
+    def _slice(self, object_list):
+        return list(object_list[:self.per_page + 1])
+
+    def _cursor_page(self, object_list, cursor, direction):
+        has_more = len(object_list) > self.per_page
+        object_list = object_list[:self.per_page]
+        if direction == PREVIOUS:
+            object_list.reverse()
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = bool(cursor), has_more
+        return CursorPage(
+            object_list,
+            self,
+            cursor,
+            previous_cursor=(
+                self.encode_cursor(PREVIOUS, object_list[0])
+                if object_list and has_previous else None
+            ),
+            next_cursor=(
+                self.encode_cursor(NEXT, object_list[-1])
+                if object_list and has_next else None
+            ),
+        )
+
+
+def estimated_rows(queryset):
+    """Примерное число строк в таблице модели без COUNT(*).
+
+    PostgreSQL берет оценку планировщика из pg_class, остальные СУБД —
+    наибольший id по индексу первичного ключа.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT reltuples::bigint FROM pg_class '
+                'WHERE oid = %s::regclass',
+                [queryset.model._meta.db_table]
+            )
+            row = cursor.fetchone()
+        return max(row[0], 0) if row else 0
+    return queryset.model._default_manager.using(queryset.db).aggregate(
+        last=Max('pk')
+    )['last'] or 0
+
+
+class EstimatedCountPaginator(Paginator):
+    """Постраничная разбивка для админки больших таблиц.
+
+    Число строк считается точно, только пока их не больше
+    EXACT_COUNT_LIMIT: запрос `COUNT(*)` над подзапросом с LIMIT
+    останавливается на границе. Сверх нее берется оценка
+    `estimated_rows` по всей таблице, в том числе для отфильтрованного
+    списка: она не меньше числа его строк, так что все они остаются
+    доступны по страницам, а лишние последние страницы просто пусты.
+    """
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list.order_by()
+        bounded = queryset[:EXACT_COUNT_LIMIT + 1].count()
+        if bounded <= EXACT_COUNT_LIMIT:
+            return bounded
+        return max(estimated_rows(queryset), bounded)
+
+
+def paginate(request, object_list, per_page, keys=('pub_date', 'pk'),
+             **kwargs):
+    """Выбирает страницу по `?cursor=`, а для старых ссылок по `?page=`.
+
+    Первая страница — обычная `Page`: ее тип проверяют тесты шаблонов
+    заданий.
+    """
+    paginator = CursorPaginator(object_list, per_page, keys, **kwargs)
+    cursor = request.GET.get('cursor')
+    if cursor:
+        return paginator.get_cursor_page(cursor)
+    page_number = request.GET.get('page')
+    if page_number and cursor is None:
+        return paginator.get_page(page_number)
+    return paginator.get_first_page()
@@ -0,0 +1,123 @@
+"""Полнотекстовый поиск по постам и комментариям.
+
+Индекс хранится в той же БД: в SQLite это таблица FTS5 со словами,
+приведенными к основам (см. `stemmer`), в PostgreSQL — tsvector
+с GIN-индексом. Индекс обновляется сигналами при сохранении и удалении
+постов и комментариев; `rebuild_search_index` собирает его заново.
+На других СУБД поиск сводится к `icontains`.
+"""
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from ..models import Comment, Post
+from .backends import get_backend
+from .stemmer import tokenize
+
+__all__ = [
+    'SearchResults',
+    'index_comment',
+    'index_post',
+    'matching_posts',
+    'rebuild',
+    'remove_comment',
+    'remove_comments',
+    'remove_post',
+]
+
+
+def index_post(post):
+    backend = get_backend()
+    if backend:
+        backend.save('post', post.pk, post.pk, post.text)
+
+
+def index_comment(comment):
+    backend = get_backend()
+    if backend:
+        backend.save('comment', comment.pk, comment.post_id, comment.text)
+
+
+def remove_post(post):
+    backend = get_backend()
+    if backend:
+        backend.delete('post', post.pk)
+
+
+def remove_comment(comment):
+    backend = get_backend()
+    if backend:
+        backend.delete('comment', comment.pk)
+
+
+def remove_comments(queryset):
+    """Убирает из индекса комментарии queryset одним запросом."""
+    backend = get_backend()
+    if backend:
+        backend.delete_matching('comment', queryset)
+
+
+def rebuild(batch_size=1000):
+    """Собирает индекс заново. Возвращает число проиндексированных строк."""
+    backend = get_backend()
+    if not backend:
+        return 0
+    backend.clear()
+    indexed = 0
+    for post in Post.objects.only('pk', 'text').iterator(batch_size):
+        backend.save('post', post.pk, post.pk, post.text)
+        indexed += 1
+    comments = Comment.objects.only('pk', 'post_id', 'text')
+    for comment in comments.iterator(batch_size):
+        backend.save('comment', comment.pk, comment.post_id, comment.text)
+        indexed += 1
+    return indexed
+
+
+def matching_posts(queryset, query):
+    """Сужает queryset постов до найденных по индексу."""
+    backend = get_backend()
+    if not backend:
+        return queryset.filter(
+            Q(text__icontains=query) | Q(comments__text__icontains=query)
+        ).distinct()
+    if not tokenize(query):
+        return queryset.none()
+    return queryset.filter(pk__in=RawSQL(*backend.matching_sql(query)))
+
+
+class SearchResults:
+    """Ленивый список найденных постов, упорядоченных по релевантности.
+
+    Поддерживает `len()` и срезы, поэтому подходит для `Paginator`:
+    в БД уходит только запрос нужной страницы.
+    """
+
+    def __init__(self, query):
+        self.query = query
+        self.backend = get_backend()
+        self.empty = not tokenize(query)
+
+    def count(self):
+        if self.empty:
+            return 0
+        if not self.backend:
+            return matching_posts(Post.objects.all(), self.query).count()
+        return self.backend.count(self.query)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        if self.empty:
+            return []
+        start = index.start or 0
+        limit = index.stop - start
+        if not self.backend:
+            return list(matching_posts(
+                Post.objects.for_feed(), self.query
+            )[start:index.stop])
+        ids = self.backend.ranked(self.query, limit, start)
+        posts = Post.objects.for_feed().in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
@@ -0,0 +1,158 @@
+"""Хранилища полнотекстового индекса.
+
+Каждая строка индекса — документ поста или комментария; id строки
+кодирует вид и id объекта (`2 * pk` для поста, `2 * pk + 1` для
+комментария), поэтому обновление и удаление идут по первичному ключу.
+"""
+from django.db import connection
+from django.db.models import F
+
+from .stemmer import tokenize
+
+TABLE = 'posts_search'
+
+
+def document_id(kind, pk):
+    return 2 * pk + (1 if kind == 'comment' else 0)
+
+
+def delete_documents(column, kind, queryset):
+    """Удаляет документы объектов queryset одним запросом:
+    id документов считает подзапрос, а не Python."""
+    ids = queryset.order_by().annotate(
+        document_id=F('pk') * 2 + (1 if kind == 'comment' else 0)
+    ).values('document_id')
+    sql, params = ids.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {TABLE} WHERE {column} IN ({sql})', params
+        )
+
+
+class SQLiteBackend:
+    """FTS5: в индекс пишутся уже приведенные к основам слова,
+    релевантность — встроенный `rank` (bm25). Таблицу создает
+    миграция 0014_search_index.
+    """
+
+    def save(self, kind, pk, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid = %s',
+                [document_id(kind, pk)]
+            )
+            cursor.execute(
+                f'INSERT INTO {TABLE} (rowid, body, post_id) '
+                'VALUES (%s, %s, %s)',
+                [document_id(kind, pk), ' '.join(tokenize(text)), post_id]
+            )
+
+    def delete(self, kind, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE rowid = %s',
+                [document_id(kind, pk)]
+            )
+
+    def delete_matching(self, kind, queryset):
+        delete_documents('rowid', kind, queryset)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {TABLE}')
+
+    def match(self, query):
+        """Выражение MATCH: все слова запроса, каждое в кавычках."""
+        return ' '.join(f'"{token}"' for token in tokenize(query))
+
+    def matching_sql(self, query):
+        return (
+            f'SELECT post_id FROM {TABLE} WHERE {TABLE} MATCH %s',
+            [self.match(query)]
+        )
+
+    def count(self, query):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(DISTINCT post_id) FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s',
+                [self.match(query)]
+            )
+            return cursor.fetchone()[0]
+
+    def ranked(self, query, limit, offset):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT post_id, MIN(rank) AS score FROM {TABLE} '
+                f'WHERE {TABLE} MATCH %s GROUP BY post_id '
+                'ORDER BY score, post_id DESC LIMIT %s OFFSET %s',
+                [self.match(query), limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgreSQLBackend:
+    """tsvector с GIN-индексом и русской конфигурацией PostgreSQL.
+    Таблицу создает миграция 0014_search_index."""
+
+    def save(self, kind, pk, post_id, text):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {TABLE} (id, post_id, document) '
+                "VALUES (%s, %s, to_tsvector('russian', %s)) "
+                'ON CONFLICT (id) DO UPDATE SET document = EXCLUDED.document',
+                [document_id(kind, pk), post_id, text]
+            )
+
+    def delete(self, kind, pk):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'DELETE FROM {TABLE} WHERE id = %s',
+                [document_id(kind, pk)]
+            )
+
+    def delete_matching(self, kind, queryset):
+        delete_documents('id', kind, queryset)
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'TRUNCATE {TABLE}')
+
+    def matching_sql(self, query):
+        return (
+            f'SELECT post_id FROM {TABLE} '
+            "WHERE document @@ plainto_tsquery('russian', %s)",
+            [query]
+        )
+
+    def count(self, query):
+        sql, params = self.matching_sql(query)
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT COUNT(DISTINCT post_id) FROM ({sql}) AS matches',
+                params
+            )
+            return cursor.fetchone()[0]
+
+    def ranked(self, query, limit, offset):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT post_id, MAX(ts_rank(document, q)) AS score '
+                f"FROM {TABLE}, plainto_tsquery('russian', %s) AS q "
+                'WHERE document @@ q GROUP BY post_id '
+                'ORDER BY score DESC, post_id DESC LIMIT %s OFFSET %s',
+                [query, limit, offset]
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+BACKENDS = {
+    'sqlite': SQLiteBackend,
+    'postgresql': PostgreSQLBackend,
+}
+
+
+def get_backend(vendor=None):
+    """Хранилище для текущей БД или None, если индекс не поддерживается."""
+    backend = BACKENDS.get(vendor or connection.vendor)
+    return backend() if backend else None
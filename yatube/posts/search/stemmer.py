@@ -0,0 +1,138 @@
+"""Токенизация и стемминг русского текста (алгоритм Snowball для русского).
+"""
+import re
+
+VOWELS = 'аеиоуыэюя'
+
+PERFECTIVE_GERUND = (
+    ('в', 'вши', 'вшись'),
+    ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'),
+)
+ADJECTIVE = (
+    'ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый', 'ой', 'ем',
+    'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому', 'их', 'ых', 'ую', 'юю',
+    'ая', 'яя', 'ою', 'ею',
+)
+PARTICIPLE = (
+    ('ем', 'нн', 'вш', 'ющ', 'щ'),
+    ('ивш', 'ывш', 'ующ'),
+)
+REFLEXIVE = ('ся', 'сь')
+VERB = (
+    (
+        'ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+        'ет', 'ют', 'ны', 'ть', 'ешь', 'нно',
+    ),
+    (
+        'ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+        'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+        'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю',
+    ),
+)
+NOUN = (
+    'а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи', 'ии',
+    'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием', 'ем', 'ам',
+    'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию', 'ью', 'ю', 'ия',
+    'ья', 'я',
+)
+SUPERLATIVE = ('ейше', 'ейш')
+DERIVATIONAL = ('ость', 'ост')
+
+WORD_RE = re.compile(r'\w+')
+CYRILLIC_RE = re.compile('[а-я]')
+
+
+def _strip(word, after_a=(), plain=()):
+    """Отрезает самое длинное окончание.
+
+    Окончания из `after_a` должны стоять после «а» или «я».
+    Если ничего не подошло, возвращает None.
+    """
+    longest = 0
+    for ending in after_a:
+        if (
+            len(ending) > longest
+            and word.endswith(ending)
+            and word[:-len(ending)][-1:] in ('а', 'я')
+        ):
+            longest = len(ending)
+    for ending in plain:
+        if len(ending) > longest and word.endswith(ending):
+            longest = len(ending)
+    if not longest:
+        return None
+    return word[:-longest]
+
+
+def _region(word, start=0):
+    """Начало области после первой согласной, идущей за гласной."""
+    for i in range(start + 1, len(word)):
+        if word[i] not in VOWELS and word[i - 1] in VOWELS:
+            return i + 1
+    return len(word)
+
+
+def _adjectival(word):
+    word = _strip(word, plain=ADJECTIVE)
+    if word is None:
+        return None
+    participle = _strip(word, *PARTICIPLE)
+    return word if participle is None else participle
+
+
+def _inflection(rv):
+    """Шаг 1: отрезает окончание деепричастия, прилагательного,
+    глагола или существительного."""
+    stripped = _strip(rv, *PERFECTIVE_GERUND)
+    if stripped is not None:
+        return stripped
+    reflexive = _strip(rv, plain=REFLEXIVE)
+    if reflexive is not None:
+        rv = reflexive
+    for step in (
+        _adjectival,
+        lambda w: _strip(w, *VERB),
+        lambda w: _strip(w, plain=NOUN),
+    ):
+        stripped = step(rv)
+        if stripped is not None:
+            return stripped
+    return rv
+
+
+def stem(word):
+    """Возвращает основу русского слова."""
+    word = word.lower().replace('ё', 'е')
+    rv_start = next(
+        (i + 1 for i, char in enumerate(word) if char in VOWELS), None
+    )
+    if rv_start is None:
+        return word
+    prefix, rv = word[:rv_start], word[rv_start:]
+    r2_start = _region(word, _region(word) - 1) - rv_start
+
+    rv = _inflection(rv)
+    if rv.endswith('и'):
+        rv = rv[:-1]
+
+    for ending in DERIVATIONAL:
+        if rv.endswith(ending) and len(rv) - len(ending) >= r2_start:
+            rv = rv[:-len(ending)]
+            break
+
+    superlative = _strip(rv, plain=SUPERLATIVE)
+    if superlative is not None:
+        rv = superlative
+    if rv.endswith('нн'):
+        rv = rv[:-1]
+    elif superlative is None and rv.endswith('ь'):
+        rv = rv[:-1]
+    return prefix + rv
+
+
+def tokenize(text):
+    """Разбивает текст на слова и приводит русские слова к основам."""
+    return [
+        stem(word) if CYRILLIC_RE.search(word) else word
+        for word in WORD_RE.findall(text.lower().replace('ё', 'е'))
+    ]
@@ -0,0 +1,218 @@
+import threading
+
+from django.db import transaction
+from django.db.models import F
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save
+)
+from django.dispatch import receiver
+
+from . import cards, follow_graph, search, timeline, versions
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+# Поля автора и группы, которые выводятся в карточке поста.
+CARD_USER_FIELDS = {'username', 'first_name', 'last_name'}
+CARD_GROUP_FIELDS = {'title', 'slug'}
+
+# Посты, у которых в текущей транзакции удалены комментарии.
+_commented = threading.local()
+
+
+def decrement(author_id, field):
+    AuthorStats.objects.filter(
+        author_id=author_id,
+        **{f'{field}__gt': 0}
+    ).update(**{field: F(field) - 1})
+
+
+def bump_post(post):
+    versions.bump(
+        *versions.post_scopes(post.pk, post.author_id, post.group_id)
+    )
+
+
+def bump_follow(follow):
+    """Подписка меняет ленту подписчика и счетчики в обоих профилях."""
+    versions.bump(
+        versions.follows(follow.user_id),
+        versions.author(follow.user_id),
+        versions.author(follow.author_id)
+    )
+
+
+@receiver(pre_save, sender=Post)
+def post_moving(sender, instance, **kwargs):
+    """Пост, перенесенный в другую группу, пропадает из ленты прежней."""
+    if instance.pk is None:
+        return
+    old_group_id = Post.objects.filter(pk=instance.pk).values_list(
+        'group_id', flat=True
+    ).first()
+    if old_group_id and old_group_id != instance.group_id:
+        versions.bump(versions.group(old_group_id))
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    bump_post(instance)
+    search.index_post(instance)
+    if created:
+        AuthorStats.objects.change(instance.author_id, posts_count=1)
+        timeline.publish(instance)
+    else:
+        timeline.touch_followers([instance.author_id])
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    bump_post(instance)
+    decrement(instance.author_id, 'posts_count')
+    timeline.touch_followers([instance.author_id])
+    cards.forget(instance)
+    search.remove_post(instance)
+
+
+@receiver(post_save, sender=Follow)
+def follow_created(sender, instance, created, **kwargs):
+    if created:
+        bump_follow(instance)
+        follow_graph.added(instance.user_id, instance.author_id)
+        AuthorStats.objects.change(instance.author_id, followers_count=1)
+        AuthorStats.objects.change(instance.user_id, following_count=1)
+        timeline.backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    bump_follow(instance)
+    follow_graph.removed(instance.user_id, instance.author_id)
+    decrement(instance.author_id, 'followers_count')
+    decrement(instance.user_id, 'following_count')
+    timeline.prune(instance.user_id, instance.author_id)
+    count = timeline.followers_count(instance.author_id)
+    timeline.followers_dropped(instance.author_id, count + 1, count)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, **kwargs):
+    bump_post(instance.post)
+    timeline.post_commented(instance.post)
+    search.index_comment(instance)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    """Комментарии удаляются каскадом вместе с постом или автором
+    по одному сигналу на строку, поэтому посты здесь не читаются:
+    их id копятся до конца транзакции и обновляются одним проходом."""
+    search.remove_comment(instance)
+    pending = getattr(_commented, 'post_ids', None)
+    if pending is None:
+        pending = _commented.post_ids = set()
+    pending.add(instance.post_id)
+    transaction.on_commit(flush_commented)
+
+
+def flush_commented():
+    """Обновляет посты с удаленными комментариями. Вызовы после первого
+    в той же транзакции ничего не делают; id из откаченной транзакции
+    обновятся со следующей, что безвредно."""
+    post_ids = getattr(_commented, 'post_ids', None)
+    if post_ids:
+        _commented.post_ids = set()
+        touch_commented(Post.objects.filter(pk__in=post_ids))
+
+
+def touch_commented(posts):
+    """Сдвигает версии страниц и лент подписчиков постов, у которых
+    изменились комментарии. Удаленные посты уже не найдутся. Карточки
+    комментариев не показывают, их версия не меняется."""
+    scopes = set()
+    for pk, author_id, group_id in posts.values_list(
+        'pk', 'author_id', 'group_id'
+    ):
+        scopes.update(versions.post_scopes(pk, author_id, group_id))
+    timeline.touch_followers(posts.values('author_id'))
+    versions.bump(*scopes)
+
+
+def card_fields_changed(instance, fields, update_fields):
+    """Меняет ли сохранение поля `fields`, видные в карточках:
+    новые значения сравниваются с сохраненными в БД."""
+    if instance.pk is None:
+        return True
+    if update_fields is not None:
+        fields = fields & set(update_fields)
+        if not fields:
+            return False
+    old = type(instance)._default_manager.filter(pk=instance.pk).values(
+        *fields
+    ).first()
+    return old is None or any(
+        old[field] != getattr(instance, field) for field in fields
+    )
+
+
+@receiver(pre_save, sender=User)
+def author_changing(sender, instance, update_fields, **kwargs):
+    """Пароль, последний вход и т.п. не меняют ни карточек, ни страниц."""
+    instance._card_fields_changed = card_fields_changed(
+        instance, CARD_USER_FIELDS, update_fields
+    )
+
+
+@receiver(post_save, sender=User)
+def author_changed(sender, instance, created, **kwargs):
+    if created or not getattr(instance, '_card_fields_changed', True):
+        return
+    # Имя автора видно и под его комментариями на страницах постов.
+    commented = Comment.objects.filter(author=instance).order_by(
+    ).values_list('post_id', flat=True).distinct()
+    versions.bump(
+        versions.FEED,
+        versions.author(instance.pk),
+        *(versions.post(post_id) for post_id in commented)
+    )
+    timeline.touch_followers([instance.pk])
+    cards.touch(Post.objects.filter(author=instance))
+
+
+@receiver(pre_save, sender=Group)
+def group_changing(sender, instance, update_fields, **kwargs):
+    instance._card_fields_changed = card_fields_changed(
+        instance, CARD_GROUP_FIELDS, update_fields
+    )
+
+
+@receiver(post_save, sender=Group)
+def group_changed(sender, instance, created, **kwargs):
+    versions.bump(versions.GROUPS)
+    if created or not getattr(instance, '_card_fields_changed', True):
+        return
+    versions.bump(
+        versions.FEED,
+        versions.group(instance.pk),
+        *group_author_scopes(instance)
+    )
+    cards.touch(Post.objects.filter(group=instance))
+
+
+@receiver(pre_delete, sender=Group)
+def group_deleted(sender, instance, **kwargs):
+    versions.bump(
+        versions.FEED,
+        versions.GROUPS,
+        versions.group(instance.pk),
+        *group_author_scopes(instance)
+    )
+    cards.touch(Post.objects.filter(group=instance))
+
+
+def group_author_scopes(group):
+    """Профили авторов и ленты их подписчиков, в которых видны
+    посты группы."""
+    authors = Post.objects.filter(group=group).order_by().values_list(
+        'author_id', flat=True
+    ).distinct()
+    timeline.touch_followers(authors)
+    return [versions.author(author_id) for author_id in authors]
@@ -0,0 +1,41 @@
+"""Фоновые задачи posts, см. core/tasks.py.
+
+Задачи получают id, а не объекты, и перечитывают данные сами: к моменту
+выполнения пост могли изменить или удалить.
+"""
+from core.tasks import task
+
+from . import thumbnails, timeline
+from .models import Post
+
+
+@task(name='posts.thumbnails', retries=2, retry_delay=30)
+def make_thumbnails(post_id, stale):
+    """Удаляет варианты прежней картинки и считает новые."""
+    thumbnails.delete_variants(stale)
+    thumbnails.generate(post_id)
+
+
+@task(name='posts.fan_out')
+def fan_out(post_id):
+    """Раскладывает новый пост по лентам подписчиков.
+
+    Повтор безопасен: существующие записи ленты пропускаются.
+    """
+    post = Post.objects.filter(pk=post_id).only(
+        'pk', 'author_id', 'pub_date'
+    ).first()
+    if post is not None:
+        timeline.fan_out(post)
+
+
+@task(name='posts.backfill_followers')
+def backfill_followers(author_id):
+    """Раскладывает посты автора, переставшего быть знаменитостью."""
+    timeline.backfill_followers(author_id)
+
+
+@task(name='posts.touch_followers')
+def touch_followers(author_id):
+    """Сдвигает версии лент подписчиков автора после комментария."""
+    timeline.touch_followers([author_id])
@@ -0,0 +1,16 @@
+from django import template
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def cursor_url(context, cursor=''):
+    """Ссылка на страницу по курсору, сохраняющая остальные параметры
+    запроса: `{% cursor_url page_obj.next_cursor %}`. Без курсора —
+    ссылка на первую страницу."""
+    query = context['request'].GET.copy()
+    query.pop('page', None)
+    query.pop('cursor', None)
+    if cursor:
+        query['cursor'] = cursor
+    return f'?{query.urlencode()}'
@@ -0,0 +1,12 @@
+from django import template
+
+from ..cards import render_cards
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_cards(posts):
+    """Карточки постов страницы из кэша: `{% post_cards page_obj as cards %}`.
+    """
+    return render_cards(posts)
@@ -0,0 +1,140 @@
+import csv
+from io import StringIO
+from unittest import mock
+
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import paginator
+from ..models import Group, Post
+
+User = get_user_model()
+
+
+class PostAdminTest(TestCase):
+    """Тестируем список постов в админке на больших таблицах."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.groups = [
+            Group.objects.create(
+                title=f'Группа {i}', slug=f'group{i}', description='-'
+            )
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def create_posts(self, count):
+        start = Post.objects.count()
+        for i in range(start, start + count):
+            author = User.objects.create_user(username=f'user{i}')
+            Post.objects.create(
+                author=author,
+                text=f'Пост {i}',
+                group=self.groups[i % len(self.groups)]
+            )
+
+    def changelist_queries(self, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                reverse('admin:posts_post_changelist'), data
+            )
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Авторы, группы и выбор группы не читаются построчно."""
+        self.create_posts(2)
+        few = self.changelist_queries()
+        self.create_posts(10)
+        self.assertEqual(self.changelist_queries(), few)
+
+    def test_estimated_count(self):
+        """Сверх лимита число постов берется оценкой, а не COUNT(*)."""
+        self.create_posts(5)
+        with mock.patch.object(paginator, 'EXACT_COUNT_LIMIT', 3):
+            response = self.client.get(reverse('admin:posts_post_changelist'))
+            self.assertEqual(
+                response.context['cl'].result_count,
+                Post.objects.latest('pk').pk
+            )
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    reverse('admin:posts_post_changelist'),
+                    {'pub_date__year': Post.objects.latest('pk').pub_date.year}
+                )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['cl'].result_count,
+            Post.objects.latest('pk').pk
+        )
+        counts = [
+            query['sql'] for query in queries
+            if 'COUNT(' in query['sql'] and 'posts_post' in query['sql']
+            and 'LIMIT' not in query['sql']
+        ]
+        self.assertEqual(counts, [])
+        response = self.client.get(reverse('admin:posts_post_changelist'))
+        self.assertEqual(response.context['cl'].result_count, 5)
+
+    def test_date_hierarchy(self):
+        self.create_posts(1)
+        post = Post.objects.get()
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'),
+            {'pub_date__year': post.pub_date.year}
+        )
+        self.assertEqual(list(response.context['cl'].result_list), [post])
+
+    def test_export_csv(self):
+        """Выгрузка отдает выбранные посты потоком CSV."""
+        self.create_posts(3)
+        posts = list(Post.objects.order_by('pk'))
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'export_csv',
+                ACTION_CHECKBOX_NAME: [post.pk for post in posts[:2]],
+            }
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(
+            rows[0], ['id', 'pub_date', 'author', 'group', 'text']
+        )
+        self.assertEqual(
+            [row[0] for row in rows[1:]], [str(post.pk) for post in posts[:2]]
+        )
+        self.assertEqual(rows[1][2], posts[0].author.username)
+        self.assertEqual(rows[1][3], posts[0].group.slug)
+
+    def test_export_csv_escapes_formulas(self):
+        """Ячейки, похожие на формулы, выгружаются как текст."""
+        author = User.objects.create_user(username='author')
+        texts = ['=1+1', '+7', '-1', '@SUM(A1)', 'обычный текст']
+        posts = [Post.objects.create(author=author, text=t) for t in texts]
+        response = self.client.post(
+            reverse('admin:posts_post_changelist'),
+            {
+                'action': 'export_csv',
+                ACTION_CHECKBOX_NAME: [post.pk for post in posts],
+            }
+        )
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.reader(StringIO(content)))
+        self.assertEqual(
+            sorted(row[4] for row in rows[1:]),
+            sorted(["'=1+1", "'+7", "'-1", "'@SUM(A1)", 'обычный текст'])
+        )
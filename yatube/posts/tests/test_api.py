@@ -0,0 +1,180 @@
+from http import HTTPStatus
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from core.testing import capture_on_commit_callbacks
+
+from ..models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class ApiTest(TestCase):
+    """Тестируем JSON API лент."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='test_slug',
+            description='Описание для теста'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for i in range(12):
+            Post.objects.create(
+                author=cls.user,
+                text=f'Текст поста {i}',
+                group=cls.group,
+            )
+        cls.post = Post.objects.latest('pk')
+        Comment.objects.create(
+            post=cls.post,
+            author=cls.reader,
+            text='Комментарий'
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_post_list_pages(self):
+        """Лента отдается страницами по курсору."""
+        response = self.client.get(reverse('posts:api_posts'))
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        data = response.json()
+        self.assertEqual(len(data['results']), 10)
+        self.assertIsNone(data['previous'])
+        first = data['results'][0]
+        self.assertEqual(first['id'], self.post.pk)
+        self.assertEqual(first['author'], 'author')
+        self.assertEqual(first['group'], 'test_slug')
+        self.assertEqual(first['comments_count'], 1)
+
+        data = self.client.get(data['next']).json()
+        self.assertEqual(len(data['results']), 2)
+        self.assertIsNone(data['next'])
+        self.assertIsNotNone(data['previous'])
+
+    def test_sparse_fields(self):
+        """`?fields=` оставляет только запрошенные поля."""
+        response = self.client.get(
+            reverse('posts:api_post', kwargs={'post_id': self.post.pk}),
+            {'fields': 'id,text'}
+        )
+        self.assertEqual(
+            response.json(), {'id': self.post.pk, 'text': self.post.text}
+        )
+        response = self.client.get(
+            reverse('posts:api_posts'), {'fields': 'id,password'}
+        )
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+
+    def test_not_modified(self):
+        """Неизмененная лента отвечает 304 без запросов к БД."""
+        url = reverse('posts:api_posts')
+        response = self.client.get(url)
+        self.assertTrue(response.has_header('Last-Modified'))
+        etag = response['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.create(author=self.user, text='Новый пост')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'][0]['text'], 'Новый пост')
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag поста и его комментариев."""
+        url = reverse('posts:api_comments', kwargs={'post_id': self.post.pk})
+        response = self.client.get(url)
+        self.assertEqual(response.json()['results'][0]['text'], 'Комментарий')
+        with capture_on_commit_callbacks(execute=True):
+            Comment.objects.create(
+                post=self.post,
+                author=self.user,
+                text='Ответ'
+            )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+        self.assertEqual(response.json()['results'][0]['text'], 'Ответ')
+
+    def test_follow_endpoints(self):
+        """Подписки доступны только авторизованному пользователю."""
+        for name in ('posts:api_follow_posts', 'posts:api_follows'):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name))
+                self.assertEqual(
+                    response.status_code, HTTPStatus.UNAUTHORIZED
+                )
+        response = self.reader_client.get(reverse('posts:api_follows'))
+        self.assertEqual(response.json(), {'results': [{'author': 'author'}]})
+        response = self.reader_client.get(reverse('posts:api_follow_posts'))
+        self.assertEqual(
+            response.json()['results'][0]['id'], self.post.pk
+        )
+
+    def test_cache_headers(self):
+        """Персональные ответы помечаются private, все — Vary: Cookie."""
+        response = self.client.get(reverse('posts:api_posts'))
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        for name in ('posts:api_follow_posts', 'posts:api_follows'):
+            with self.subTest(name=name):
+                response = self.reader_client.get(reverse(name))
+                self.assertIn('private', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                response = self.reader_client.get(
+                    reverse(name), HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(
+                    response.status_code, HTTPStatus.NOT_MODIFIED
+                )
+                self.assertIn('private', response['Cache-Control'])
+
+    def test_follow_feed_validator_is_constant(self):
+        """304 ленты подписок не зависит от числа подписок,
+        а новые и измененные посты авторов меняют ETag."""
+        url = reverse('posts:api_follow_posts')
+        etag = self.reader_client.get(url)['ETag']
+        with self.assertNumQueries(3):
+            response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+        for i in range(5):
+            author = User.objects.create_user(username=f'writer{i}')
+            Follow.objects.create(user=self.reader, author=author)
+        etag = self.reader_client.get(url)['ETag']
+        with self.assertNumQueries(3):
+            response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.NOT_MODIFIED)
+
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.create(author=self.user, text='Новый пост')
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.json()['results'][0]['text'], 'Новый пост')
+        etag = response['ETag']
+        with capture_on_commit_callbacks(execute=True):
+            post = Post.objects.get(pk=self.post.pk)
+            post.text = 'Исправленный пост'
+            post.save()
+        response = self.reader_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, HTTPStatus.OK)
+
+    def test_unknown_objects(self):
+        """Несуществующие объекты дают 404 в JSON."""
+        urls = [
+            reverse('posts:api_post', kwargs={'post_id': 0}),
+            reverse('posts:api_group_posts', kwargs={'slug': 'missing'}),
+            reverse('posts:api_author_posts', kwargs={'username': 'nobody'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertIn('detail', response.json())
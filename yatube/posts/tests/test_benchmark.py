@@ -0,0 +1,70 @@
+import random
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase, override_settings
+
+from .. import benchmark
+from ..models import AuthorStats, Comment, Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class BenchmarkTest(TestCase):
+    """Тестируем синтетические данные и смесь запросов прогона."""
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def test_dataset_and_mix(self):
+        """Данные создаются по параметрам, а все адреса смеси отвечают."""
+        dataset = benchmark.Dataset(
+            users=5, groups=2, posts=20, comments=30, follows=2, images=0.5
+        )
+        dataset.create()
+        self.assertEqual(Post.objects.count(), 20)
+        self.assertEqual(Comment.objects.count(), 30)
+        self.assertEqual(Follow.objects.count(), 10)
+        self.assertTrue(Post.objects.exclude(thumbnails='').exists())
+        self.assertEqual(AuthorStats.objects.count(), 5)
+        self.assertTrue(TimelineEntry.objects.exists())
+
+        runner = benchmark.Runner(
+            dataset, benchmark.Mix(benchmark.DEFAULT_MIX)
+        )
+        client = Client()
+        client.force_login(User.objects.get(pk=runner.logged_in[0]))
+        rng = random.Random(1)
+        for entry in runner.mix.entries:
+            with self.subTest(name=entry['name']):
+                url = runner.url(entry, rng, runner.logged_in[0])
+                response = client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+    def test_write_mix(self):
+        """Смесь записи создает посты и комментарии."""
+        dataset = benchmark.Dataset(
+            users=3, groups=2, posts=5, comments=5, follows=1, images=0
+        )
+        dataset.create()
+        runner = benchmark.Runner(
+            dataset, benchmark.Mix(benchmark.WRITE_MIX)
+        )
+        worker = benchmark.Worker(runner, 0)
+        for entry in runner.mix.entries:
+            worker.request(entry)
+        self.assertEqual(Post.objects.count(), 6)
+        self.assertEqual(Comment.objects.count(), 6)
+        self.assertFalse(any(runner.errors.values()))
+
+    def test_percentile(self):
+        values = list(range(1, 101))
+        self.assertEqual(benchmark.percentile(values, 50), 50)
+        self.assertEqual(benchmark.percentile(values, 99), 99)
+        self.assertEqual(benchmark.percentile([], 95), 0)
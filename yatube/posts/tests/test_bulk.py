@@ -0,0 +1,133 @@
+import os
+import shutil
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import bulk, search
+from ..models import AuthorStats, Comment, Follow, Group, Post, TimelineEntry
+
+User = get_user_model()
+
+TEMP_DIR = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+class BulkDataTest(TestCase):
+    """Тестируем выгрузку и загрузку данных командами."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(TEMP_DIR, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_data(self):
+        group = Group.objects.create(
+            title='Группа',
+            slug='test_slug',
+            description='Описание для теста'
+        )
+        for i in range(3):
+            post = Post.objects.create(
+                author=self.user,
+                text=f'Пост про котов {i}',
+                group=group
+            )
+        Comment.objects.create(post=post, author=self.reader, text='Мяу')
+        Follow.objects.create(user=self.reader, author=self.user)
+
+    def export(self, name, fmt):
+        path = os.path.join(TEMP_DIR, f'{name}.{fmt}')
+        call_command(
+            'export_data', name, output=path, format=fmt, stderr=StringIO()
+        )
+        return path
+
+    def test_round_trip(self):
+        """Выгруженные данные загружаются обратно без потерь, а счетчики,
+        ленты и поисковый индекс пересобираются."""
+        self.create_data()
+        names = ['group', 'post', 'comment', 'follow']
+        for fmt in ('ndjson', 'csv'):
+            with self.subTest(format=fmt):
+                posts = list(Post.objects.values_list(
+                    'pk', 'text', 'pub_date', 'author', 'group'
+                ))
+                paths = {name: self.export(name, fmt) for name in names}
+                Follow.objects.all().delete()
+                Post.objects.all().delete()
+                Group.objects.all().delete()
+                TimelineEntry.objects.all().delete()
+
+                for name in names:
+                    call_command(
+                        'import_data', name, paths[name],
+                        format=fmt,
+                        batch_size=2,
+                        stderr=StringIO()
+                    )
+                self.assertEqual(list(Post.objects.values_list(
+                    'pk', 'text', 'pub_date', 'author', 'group'
+                )), posts)
+                self.assertEqual(Comment.objects.get().text, 'Мяу')
+                stats = AuthorStats.objects.get(author=self.user)
+                self.assertEqual(stats.posts_count, 3)
+                self.assertEqual(stats.followers_count, 1)
+                self.assertEqual(
+                    TimelineEntry.objects.filter(user=self.reader).count(), 3
+                )
+                self.assertEqual(search.SearchResults('кот').count(), 3)
+
+    def test_rows_without_ids_refresh_inserted_posts(self):
+        """Строки без id перечитываются после вставки, а в конце
+        пересобираются только затронутые пользователи."""
+        stranger = User.objects.create_user(username='stranger')
+        AuthorStats.objects.create(author=stranger, posts_count=7)
+        Follow.objects.create(user=self.reader, author=self.user)
+        rows = [
+            {'text': f'Пост про котов {i}', 'author_id': self.user.pk,
+             'pub_date': '2022-01-0{}T00:00:00+00:00'.format(i + 1),
+             'updated': '2022-01-01T00:00:00+00:00'}
+            for i in range(3)
+        ]
+        refreshed = []
+        users = set()
+        refresh = bulk.refresh_caches
+
+        def spy(name, batch):
+            refreshed.extend(batch)
+            refresh(name, batch)
+        with mock.patch.object(bulk, 'refresh_caches', spy):
+            for _ in bulk.import_rows('post', rows, 2, users=users):
+                pass
+        self.assertEqual(
+            [post.pk for post in refreshed],
+            list(Post.objects.order_by('pk').values_list('pk', flat=True))
+        )
+        self.assertEqual(users, {self.user.pk})
+        bulk.finish('post', users)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.user).posts_count, 3
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(author=stranger).posts_count, 7
+        )
+        self.assertEqual(
+            TimelineEntry.objects.filter(user=self.reader).count(), 3
+        )
+        self.assertEqual(search.SearchResults('кот').count(), 3)
+
+    def test_export_streams_rows(self):
+        """Без --output строки пишутся в stdout."""
+        self.create_data()
+        out = StringIO()
+        call_command('export_data', 'post', stdout=out, stderr=StringIO())
+        self.assertEqual(len(out.getvalue().splitlines()), 3)
@@ -0,0 +1,185 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import follow_graph
+from ..models import AuthorStats, Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class FollowGraphTest(TestCase):
+    """Тестируем граф подписок в кэше и массовые подписки."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.authors = [
+            User.objects.create_user(username=f'author{i}') for i in range(4)
+        ]
+        cls.post = Post.objects.create(author=cls.authors[0], text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+        self.client.force_login(self.reader)
+
+    def ids(self, *indexes):
+        return [self.authors[index].pk for index in indexes]
+
+    def test_changes_invalidate_arrays(self):
+        """Подписка и отписка выбрасывают массивы, следующее чтение
+        берет их из БД уже с изменением."""
+        author = self.authors[0]
+        self.assertFalse(follow_graph.is_following(self.reader.pk, author.pk))
+        self.assertEqual(list(follow_graph.followers(author.pk)), [])
+        follow = Follow.objects.create(user=self.reader, author=author)
+        with self.assertNumQueries(1):
+            self.assertTrue(
+                follow_graph.is_following(self.reader.pk, author.pk)
+            )
+        self.assertEqual(
+            list(follow_graph.followers(author.pk)), [self.reader.pk]
+        )
+        follow.delete()
+        self.assertFalse(follow_graph.is_following(self.reader.pk, author.pk))
+        with self.assertNumQueries(0):
+            self.assertFalse(
+                follow_graph.is_following(self.reader.pk, author.pk)
+            )
+
+    def test_concurrent_follows_are_not_lost(self):
+        """Две подписки на одного автора обе видны в массиве."""
+        author = self.authors[0]
+        follow_graph.followers(author.pk)
+        other = User.objects.create_user(username='other')
+        Follow.objects.create(user=self.reader, author=author)
+        Follow.objects.create(user=other, author=author)
+        self.assertEqual(
+            list(follow_graph.followers(author.pk)),
+            sorted([self.reader.pk, other.pk])
+        )
+
+    def test_arrays_load_from_primary(self):
+        """Массивы читаются с основной БД даже во время чтения с реплики."""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        cache.clear()
+        with mock.patch(
+            'core.routers.current_replica', return_value='missing'
+        ):
+            self.assertTrue(follow_graph.is_following(
+                self.reader.pk, self.authors[0].pk
+            ))
+
+    def test_adjacency_reads_missing_users_in_one_query(self):
+        Follow.objects.create(user=self.authors[0], author=self.authors[1])
+        cache.clear()
+        with self.assertNumQueries(1):
+            graph = follow_graph.adjacency(
+                follow_graph.FOLLOWING, self.ids(0, 1)
+            )
+        self.assertEqual(list(graph[self.authors[0].pk]), self.ids(1))
+        self.assertEqual(list(graph[self.authors[1].pk]), [])
+
+    def test_follow_many(self):
+        """Массовая подписка ведет счетчики, ленту и граф как сигналы."""
+        Follow.objects.create(user=self.reader, author=self.authors[1])
+        created = follow_graph.follow_many(
+            self.reader.pk, self.ids(0, 1, 2) + [self.reader.pk]
+        )
+        self.assertEqual(created, self.ids(0, 2))
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader).count(), 3
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.reader).following_count, 3
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.authors[0]).followers_count, 1
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.post
+        ).exists())
+        self.assertEqual(
+            list(follow_graph.following(self.reader.pk)), self.ids(0, 1, 2)
+        )
+
+    def test_unfollow_many(self):
+        follow_graph.follow_many(self.reader.pk, self.ids(0, 1, 2))
+        removed = follow_graph.unfollow_many(self.reader.pk, self.ids(0, 1))
+        self.assertEqual(removed, self.ids(0, 1))
+        self.assertEqual(
+            list(follow_graph.following(self.reader.pk)), self.ids(2)
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.reader).following_count, 1
+        )
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader, post=self.post
+        ).exists())
+
+    def test_unfollow_many_queries_do_not_grow(self):
+        """Массовая отписка не отправляет сигналы на каждую подписку."""
+        def unfollow_queries(count):
+            follow_graph.follow_many(self.reader.pk, self.ids(*range(count)))
+            with CaptureQueriesContext(connection) as queries:
+                follow_graph.unfollow_many(
+                    self.reader.pk, self.ids(*range(count))
+                )
+            return len(queries)
+        self.assertEqual(unfollow_queries(2), unfollow_queries(3))
+
+    def test_suggestions_from_two_hops(self):
+        """Рекомендации — авторы, которых читают авторы пользователя."""
+        Follow.objects.create(user=self.reader, author=self.authors[0])
+        Follow.objects.create(user=self.reader, author=self.authors[1])
+        Follow.objects.create(user=self.authors[0], author=self.authors[2])
+        Follow.objects.create(user=self.authors[1], author=self.authors[2])
+        Follow.objects.create(user=self.authors[1], author=self.authors[3])
+        Follow.objects.create(user=self.authors[1], author=self.reader)
+        self.assertEqual(
+            follow_graph.suggestions(self.reader.pk),
+            [(self.authors[2].pk, 2), (self.authors[3].pk, 1)]
+        )
+
+    def test_suggestions_fall_back_to_popular(self):
+        Follow.objects.create(user=self.authors[0], author=self.authors[3])
+        self.assertEqual(
+            follow_graph.suggestions(self.reader.pk),
+            [(self.authors[3].pk, 0)]
+        )
+
+    def test_bulk_views(self):
+        usernames = ['author0', 'author1', 'missing']
+        response = self.client.post(
+            reverse('posts:follow_many'), {'username': usernames}
+        )
+        self.assertRedirects(response, reverse('posts:follow_suggestions'))
+        self.assertEqual(
+            list(follow_graph.following(self.reader.pk)), self.ids(0, 1)
+        )
+        self.client.post(
+            reverse('posts:unfollow_many'), {'username': ['author0']}
+        )
+        self.assertEqual(
+            list(Follow.objects.filter(user=self.reader).values_list(
+                'author_id', flat=True
+            )),
+            self.ids(1)
+        )
+        response = self.client.get(reverse('posts:follow_suggestions'))
+        self.assertEqual(list(response.context['page_obj']), self.authors[1:2])
+
+    def test_bulk_limit(self):
+        usernames = [f'user{i}' for i in range(follow_graph.BULK_LIMIT + 1)]
+        response = self.client.post(
+            reverse('posts:follow_many'), {'username': usernames}
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('posts:follow_many')).status_code, 405
+        )
@@ -9,6 +9,7 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import TestCase, Client, override_settings
 from django.urls import reverse
 
+from .. import thumbnails
 from ..models import Post, Group, Comment
 
 User = get_user_model()
@@ -165,6 +166,50 @@ class PostFormTest(BaseClassFormTest):
         )
         self.assertEqual(response.status_code, OK)
 
+    def test_thumbnails_generated_after_create(self):
+        """Миниатюры считаются вне запроса, до этого видна заглушка."""
+        self.authorized_client.post(
+            reverse('posts:post_create'),
+            data={'text': 'Пост с картинкой', 'image': self.image}
+        )
+        post = Post.objects.get(text='Пост с картинкой')
+        self.assertEqual(post.image_variants, {})
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, 'Картинка обрабатывается')
+
+        data = thumbnails.generate(post.pk)
+        post.refresh_from_db()
+        self.assertEqual(post.image_variants['src'], data['src'])
+        response = self.authorized_client.get(
+            reverse('posts:post_detail', kwargs={'post_id': post.pk})
+        )
+        self.assertContains(response, data['src'])
+        for source in data['sources']:
+            self.assertContains(response, source['srcset'])
+        self.assertContains(response, settings.POST_IMAGE_SIZES)
+
+    def test_image_variants(self):
+        """Картинка сохраняется в нескольких ширинах и форматах,
+        но не растягивается сверх исходной ширины."""
+        self.assertEqual(thumbnails.target_widths(1000), [480, 960])
+        self.assertEqual(thumbnails.target_widths(2), [480])
+        variants = [
+            {'format': fmt, 'width': width, 'height': 0,
+             'url': f'/{width}.{fmt}'}
+            for width in (480, 960) for fmt in ('WEBP', 'JPEG')
+        ]
+        data = thumbnails.describe(variants)
+        self.assertEqual(data['src'], '/960.JPEG')
+        self.assertEqual(
+            [(source['type'], source['srcset']) for source in data['sources']],
+            [
+                ('image/webp', '/480.WEBP 480w, /960.WEBP 960w'),
+                ('image/jpeg', '/480.JPEG 480w, /960.JPEG 960w'),
+            ]
+        )
+
 
 class CommentFormTest(BaseClassFormTest):
     """Тестируем форму для создания комментариев."""
@@ -1,7 +1,12 @@
+from io import StringIO
+
 from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-from ..models import Group, Post
+from ..models import AuthorStats, Follow, Group, Post
 
 User = get_user_model()
 
@@ -58,3 +63,64 @@ class PostModelTest(TestCase):
                 self.assertEqual(
                     self.post._meta.get_field(field).help_text, expected_value
                 )
+
+
+class AuthorStatsTest(TestCase):
+    """Тестируем денормализованные счетчики автора."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def assertStats(self, user, posts, followers, following):
+        stats = AuthorStats.objects.get(author=user)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (posts, followers, following)
+        )
+
+    def test_post_counter(self):
+        """Создание и удаление поста меняет счетчик постов."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        Post.objects.create(author=self.author, text='Еще пост')
+        self.assertStats(self.author, 2, 0, 0)
+        post.delete()
+        self.assertStats(self.author, 1, 0, 0)
+
+    def test_follow_counters(self):
+        """Подписка и отписка меняют счетчики обоих пользователей."""
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertStats(self.author, 0, 1, 0)
+        self.assertStats(self.reader, 0, 0, 1)
+        follow.delete()
+        self.assertStats(self.author, 0, 0, 0)
+        self.assertStats(self.reader, 0, 0, 0)
+
+    def test_for_author_creates_missing_row(self):
+        """Недостающие счетчики создаются без удаления и пересчета строк."""
+        Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.filter(author=self.author).delete()
+        with CaptureQueriesContext(connection) as queries:
+            stats = AuthorStats.objects.for_author(self.author)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (1, 1, 0)
+        )
+        self.assertStats(self.author, 1, 1, 0)
+        self.assertFalse(any(
+            query['sql'].startswith('DELETE')
+            for query in queries.captured_queries
+        ))
+
+    def test_rebuild_command(self):
+        """Команда rebuild_author_stats восстанавливает счетчики."""
+        Post.objects.create(author=self.author, text='Пост')
+        Follow.objects.create(user=self.reader, author=self.author)
+        AuthorStats.objects.update(
+            posts_count=7, followers_count=7, following_count=7
+        )
+        AuthorStats.objects.filter(author=self.reader).delete()
+        call_command('rebuild_author_stats', stdout=StringIO())
+        self.assertStats(self.author, 1, 1, 0)
+        self.assertStats(self.reader, 0, 0, 1)
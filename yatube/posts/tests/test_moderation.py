@@ -0,0 +1,201 @@
+from datetime import timedelta
+
+from django.contrib.admin.helpers import ACTION_CHECKBOX_NAME
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from core.testing import capture_on_commit_callbacks
+
+from .. import follow_graph, moderation, search, versions
+from ..models import AuthorStats, Comment, Follow, Post, TimelineEntry
+
+User = get_user_model()
+
+
+class ModerationTest(TestCase):
+    """Тестируем массовое удаление комментариев и подписок."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        cls.author = User.objects.create_user(username='author')
+        cls.spammer = User.objects.create_user(username='spammer')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.post = Post.objects.create(author=cls.author, text='Пост')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def create_comments(self, count, author=None):
+        return [
+            Comment.objects.create(
+                post=self.post,
+                author=author or self.spammer,
+                text=f'Купите слона {i}'
+            )
+            for i in range(count)
+        ]
+
+    def create_bots(self, count):
+        start = User.objects.count()
+        bots = []
+        for i in range(start, start + count):
+            bot = User.objects.create_user(username=f'bot{i}')
+            Follow.objects.create(user=bot, author=self.author)
+            bots.append(bot)
+        return bots
+
+    def delete_queries(self, function, queryset):
+        with CaptureQueriesContext(connection) as queries:
+            function(queryset)
+        return len(queries)
+
+    def test_comment_queries_do_not_grow_with_rows(self):
+        self.create_comments(2)
+        few = self.delete_queries(
+            moderation.delete_comments, Comment.objects.all()
+        )
+        self.create_comments(20)
+        self.assertEqual(
+            self.delete_queries(
+                moderation.delete_comments, Comment.objects.all()
+            ),
+            few
+        )
+        self.assertFalse(Comment.objects.exists())
+
+    def test_follow_queries_do_not_grow_with_rows(self):
+        self.create_bots(2)
+        few = self.delete_queries(
+            moderation.delete_follows, Follow.objects.all()
+        )
+        self.create_bots(20)
+        self.assertEqual(
+            self.delete_queries(
+                moderation.delete_follows, Follow.objects.all()
+            ),
+            few
+        )
+        self.assertFalse(Follow.objects.exists())
+
+    def test_cascade_does_not_read_post_per_comment(self):
+        """Удаление поста каскадом не читает пост ради каждого
+        комментария, а страницы обновляются после коммита."""
+        def post_reads(count):
+            post = Post.objects.create(author=self.author, text='Спам')
+            for i in range(count):
+                Comment.objects.create(
+                    post=post, author=self.spammer, text=f'Спам {i}'
+                )
+            with CaptureQueriesContext(connection) as queries:
+                Post.objects.filter(pk=post.pk).delete()
+            return len([
+                query for query in queries
+                if query['sql'].startswith('SELECT')
+                and 'FROM "posts_post"' in query['sql']
+            ])
+        self.assertEqual(post_reads(20), post_reads(2))
+
+        comment, = self.create_comments(1)
+        scope = versions.post(self.post.pk)
+        cache.set(versions.KEY.format(scope), 0, None)
+        with capture_on_commit_callbacks(execute=True):
+            Comment.objects.filter(pk=comment.pk).delete()
+        self.assertGreater(versions.latest(scope), 0)
+        self.assertEqual(
+            Post.objects.get(pk=self.post.pk).updated, self.post.updated
+        )
+
+    def test_delete_comments_refreshes_post_and_index(self):
+        """Версия поста сдвигается, комментарии уходят из поиска."""
+        kept = Comment.objects.create(
+            post=self.post, author=self.reader, text='Хороший пост'
+        )
+        self.create_comments(3)
+        scope = versions.post(self.post.pk)
+        cache.set(versions.KEY.format(scope), 0, None)
+        with capture_on_commit_callbacks(execute=True):
+            count = moderation.delete_comments_by_authors([self.spammer.pk])
+        self.assertEqual(count, 3)
+        self.assertEqual(list(Comment.objects.all()), [kept])
+        self.assertGreater(versions.latest(scope), 0)
+        if search.get_backend():
+            self.assertFalse(
+                search.matching_posts(Post.objects.all(), 'слона').exists()
+            )
+
+    def test_delete_follows_keeps_counters_and_feeds(self):
+        """Счетчики, ленты и граф подписок согласованы после удаления."""
+        bots = self.create_bots(3)
+        Follow.objects.create(user=self.reader, author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=bots[0]).exists()
+        )
+        self.assertEqual(len(follow_graph.followers(self.author.pk)), 4)
+        count = moderation.delete_follows_by_users(
+            [bot.pk for bot in bots]
+        )
+        self.assertEqual(count, 3)
+        self.assertEqual(
+            AuthorStats.objects.get(author=self.author).followers_count, 1
+        )
+        self.assertEqual(
+            AuthorStats.objects.get(author=bots[0]).following_count, 0
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user__in=bots).exists()
+        )
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader).exists()
+        )
+        self.assertEqual(
+            list(follow_graph.followers(self.author.pk)), [self.reader.pk]
+        )
+
+    def test_comment_admin_actions(self):
+        comments = self.create_comments(2)
+        self.create_comments(1, author=self.reader)
+        url = reverse('admin:posts_comment_changelist')
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        choices = response.context['action_form'].fields['action'].choices
+        self.assertNotIn('delete_selected', dict(choices))
+        self.client.post(url, {
+            'action': 'delete_authors_comments',
+            ACTION_CHECKBOX_NAME: [comments[0].pk],
+        })
+        self.assertEqual(
+            list(Comment.objects.values_list('author', flat=True)),
+            [self.reader.pk]
+        )
+
+    def test_follow_admin_deletes_date_window(self):
+        """Выбор всех строк фильтра по дате удаляет подписки окна."""
+        old, new = self.create_bots(2)
+        Follow.objects.filter(user=old).update(
+            created=timezone.now() - timedelta(days=30)
+        )
+        response = self.client.post(
+            reverse('admin:posts_follow_changelist') + '?' + urlencode({
+                'created__gte': timezone.now() - timedelta(days=1)
+            }),
+            {
+                'action': 'delete_follows',
+                'select_across': '1',
+                ACTION_CHECKBOX_NAME: [
+                    Follow.objects.get(user=new).pk
+                ],
+            }
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            list(Follow.objects.values_list('user', flat=True)), [old.pk]
+        )
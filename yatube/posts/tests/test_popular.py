@@ -0,0 +1,119 @@
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+
+from core.testing import capture_on_commit_callbacks
+
+from .. import popular
+from ..models import Comment, Follow, Group, PopularPost, Post
+
+User = get_user_model()
+
+
+class PopularFeedTest(TestCase):
+    """Тестируем расчет рейтинга и популярные ленты."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='test_slug',
+            description='Описание для теста'
+        )
+        cls.quiet = Post.objects.create(author=cls.user, text='Тихий')
+        cls.discussed = Post.objects.create(
+            author=cls.user, text='Обсуждаемый', group=cls.group
+        )
+        cls.starred = Post.objects.create(author=cls.star, text='Звездный')
+        for i in range(3):
+            Comment.objects.create(
+                post=cls.discussed, author=cls.reader, text=f'Ответ {i}'
+            )
+        cls.old = Post.objects.create(author=cls.user, text='Старый')
+        Post.objects.filter(pk=cls.old.pk).update(
+            pub_date=timezone.now() - timedelta(days=30)
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def ranked(self, group=None):
+        return list(PopularPost.objects.filter(group=group).order_by(
+            'rank'
+        ).values_list('post_id', flat=True))
+
+    def test_rebuild_ranks_posts(self):
+        """Комментарии и подписчики поднимают пост, старые не попадают."""
+        self.assertEqual(popular.rebuild(), 4)
+        self.assertEqual(
+            self.ranked(),
+            [self.discussed.pk, self.starred.pk, self.quiet.pk]
+        )
+        self.assertEqual(self.ranked(self.group), [self.discussed.pk])
+
+    def test_recency_decay(self):
+        """Свежий пост обгоняет вчерашний с тем же числом реакций."""
+        self.assertGreater(popular.score(0, 0, 1), popular.score(0, 0, 24))
+        self.assertGreater(popular.score(5, 0, 3), popular.score(0, 0, 1))
+
+    def test_size_limit(self):
+        with mock.patch.object(popular, 'SIZE', 2):
+            popular.rebuild()
+        self.assertEqual(self.ranked(), [self.discussed.pk, self.starred.pk])
+
+    def test_rebuild_replaces_entries(self):
+        popular.rebuild()
+        Post.objects.filter(pk=self.discussed.pk).delete()
+        popular.rebuild()
+        self.assertEqual(self.ranked(), [self.starred.pk, self.quiet.pk])
+        self.assertEqual(self.ranked(self.group), [])
+
+    def test_views(self):
+        """Ленты отдают посты по месту в рейтинге, страницы — курсором."""
+        popular.rebuild()
+        with mock.patch('posts.views.LIMIT', 2):
+            response = self.client.get(reverse('posts:popular'))
+            page = response.context['page_obj']
+            self.assertEqual(list(page), [self.discussed, self.starred])
+            response = self.client.get(
+                reverse('posts:popular'), {'cursor': page.next_cursor}
+            )
+            self.assertEqual(list(response.context['page_obj']), [self.quiet])
+        response = self.client.get(
+            reverse('posts:group_popular', kwargs={'slug': 'test_slug'})
+        )
+        self.assertEqual(list(response.context['page_obj']), [self.discussed])
+        self.assertEqual(response.context['group'], self.group)
+
+    def test_view_before_first_rebuild(self):
+        response = self.client.get(reverse('posts:popular'))
+        self.assertEqual(list(response.context['page_obj']), [])
+
+    def test_rebuild_changes_etag(self):
+        """Новый расчет сдвигает версию популярной ленты."""
+        url = reverse('posts:popular')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+        with capture_on_commit_callbacks(execute=True):
+            popular.rebuild()
+        self.assertEqual(
+            self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200
+        )
+
+    def test_command(self):
+        out = StringIO()
+        call_command('score_popular', stdout=out)
+        self.assertIn('4', out.getvalue())
+        self.assertEqual(PopularPost.objects.count(), 4)
@@ -1,15 +1,26 @@
 import shutil
 import tempfile
+from unittest import mock
 
 from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.paginator import EmptyPage, Page
+from django.db import DatabaseError, connection, transaction
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django import forms
 
-from ..models import Post, Group, Follow
+from core import tasks
+from core.models import Task
+from core.queries import assert_query_budget
+from core.testing import capture_on_commit_callbacks
+
+from .. import popular, timeline, versions
+from ..models import Comment, Follow, Group, Post, TimelineEntry
+from ..paginator import CursorPaginator
 
 User = get_user_model()
 
@@ -154,16 +165,55 @@ class PostPagesTest(BaseTest):
                         'form').fields.get(value)
                     self.assertIsInstance(form_field, expected)
 
-    def test_index_page_cache_work_correct(self):
-        """Кэширование главной страницы работает правильно."""
+    def test_post_cards_are_cached(self):
+        """Карточка поста берется из кэша, пока версия поста не изменилась.
+        """
         guest = Client()
-        post_count_1 = Post.objects.count()
-        cache_1 = guest.get(reverse('posts:index')).content
-        self.post.delete()
-        cache_2 = guest.get(reverse('posts:index')).content
-        self.assertEqual(cache_1, cache_2)
-        cache.clear()
-        self.assertEqual(Post.objects.count(), post_count_1 - 1)
+        for name in url_names:
+            guest.get(name)
+        Post.objects.filter(pk=self.post.pk).update(text='Тихая правка')
+        for name in url_names:
+            with self.subTest(name=name):
+                response = guest.get(name)
+                self.assertContains(response, 'Текст поста')
+                self.assertNotContains(response, 'Тихая правка')
+
+    def test_post_cards_invalidated_on_changes(self):
+        """Правка поста, автора и удаление поста сразу видны в лентах."""
+        guest = Client()
+        guest.get(reverse('posts:index'))
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Новый текст'
+        post.save()
+        self.assertContains(guest.get(reverse('posts:index')), 'Новый текст')
+        author = User.objects.get(pk=self.user.pk)
+        author.first_name = 'Лев'
+        author.save()
+        self.assertContains(guest.get(reverse('posts:index')), 'Лев')
+        post.delete()
+        self.assertNotContains(
+            guest.get(reverse('posts:index')), 'Новый текст'
+        )
+
+    def test_unrelated_writes_keep_edit_date(self):
+        """Смена пароля и комментарии не меняют дату изменения поста
+        и не сбрасывают версии страниц."""
+        feed = versions.FEED
+        cache.set(versions.KEY.format(feed), 0, None)
+        author = User.objects.get(pk=self.user.pk)
+        author.set_password('новый пароль')
+        with capture_on_commit_callbacks(execute=True):
+            author.save()
+            Comment.objects.create(
+                post=self.post, author=self.user, text='Комментарий'
+            )
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.updated, self.post.updated)
+        self.assertEqual(post.card_version, self.post.card_version)
+        cache.set(versions.KEY.format(feed), 0, None)
+        with capture_on_commit_callbacks(execute=True):
+            author.save()
+        self.assertEqual(versions.latest(feed), 0)
 
 
 def post_contains_func(self, page, index):
@@ -212,6 +262,198 @@ class PaginatorViewsTest(BaseTest):
                     post_contains_func(self, page, index)
 
 
+class CursorPaginatorTest(BaseTest):
+    """Тестируем постраничную разбивку по курсору."""
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        Post.objects.bulk_create([
+            Post(
+                author=cls.user,
+                text='Текст поста',
+                group=cls.group,
+            ) for i in range(12)
+        ])
+
+    def test_next_and_previous_cursor(self):
+        """Курсоры ведут на следующую и обратно на первую страницу."""
+        for name in url_names:
+            with self.subTest(name=name):
+                first_page = self.authorized_client.get(name).context[
+                    'page_obj']
+                self.assertIsNone(first_page.previous_cursor)
+                response = self.authorized_client.get(
+                    name, {'cursor': first_page.next_cursor}
+                )
+                second_page = response.context['page_obj']
+                self.assertEqual(len(second_page), 3)
+                self.assertIsNone(second_page.next_cursor)
+                self.assertEqual(second_page[0], Post.objects.order_by(
+                    '-pub_date', '-pk')[10])
+                response = self.authorized_client.get(
+                    name, {'cursor': second_page.previous_cursor}
+                )
+                self.assertEqual(
+                    list(response.context['page_obj']),
+                    list(first_page)
+                )
+
+    def test_broken_cursor_returns_first_page(self):
+        """Испорченный курсор возвращает первую страницу."""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'cursor': 'испорчен'}
+        )
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertIsNone(response.context['page_obj'].previous_cursor)
+
+    def test_cursor_page_does_not_count(self):
+        """Страница по курсору выбирается одним запросом без COUNT."""
+        first_page = self.authorized_client.get(
+            reverse('posts:index')).context['page_obj']
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1):
+            page = paginator.get_cursor_page(first_page.next_cursor)
+        self.assertEqual(len(page), 3)
+
+    def test_cursor_page_navigation(self):
+        """Соседние страницы по курсору определяются без номеров."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first_page = paginator.get_cursor_page('')
+        self.assertTrue(first_page.has_next())
+        self.assertFalse(first_page.has_previous())
+        self.assertTrue(first_page.has_other_pages())
+        self.assertEqual(
+            first_page.next_page_number(), first_page.next_cursor
+        )
+        with self.assertRaises(EmptyPage):
+            first_page.previous_page_number()
+        last_page = paginator.get_cursor_page(first_page.next_cursor)
+        self.assertFalse(last_page.has_next())
+        self.assertTrue(last_page.has_previous())
+        self.assertEqual(
+            last_page.previous_page_number(), last_page.previous_cursor
+        )
+        with self.assertRaises(EmptyPage):
+            last_page.next_page_number()
+        self.assertEqual(
+            (last_page.start_index(), last_page.end_index()), (1, 3)
+        )
+
+    def test_first_page_does_not_count(self):
+        """Первая страница ленты — обычная Page, выбранная без COUNT."""
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        with self.assertNumQueries(1):
+            page = paginator.get_first_page()
+        self.assertIs(type(page), Page)
+        self.assertEqual(len(page), 10)
+        self.assertIsNone(page.previous_cursor)
+        self.assertEqual(
+            list(paginator.get_cursor_page(page.next_cursor)),
+            list(Post.objects.order_by('-pub_date', '-pk')[10:])
+        )
+
+    def test_paginator_links_keep_query(self):
+        """Ссылки на страницы сохраняют остальные параметры запроса."""
+        response = self.authorized_client.get(
+            reverse('posts:index'), {'tab': 'all', 'page': 1}
+        )
+        page = response.context['page_obj']
+        self.assertContains(
+            response, f'href="?tab=all&amp;cursor={page.next_cursor}"'
+        )
+
+
+class FeedQueriesTest(TestCase):
+    """Число запросов лент не зависит от числа постов на странице."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(
+            username='author',
+            first_name='Лев',
+            last_name='Толстой'
+        )
+        cls.follower = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='test_slug',
+            description='Описание для теста'
+        )
+        Follow.objects.create(user=cls.follower, author=cls.user)
+        for i in range(10):
+            post = Post.objects.create(
+                author=cls.user,
+                text=f'Текст поста {i}',
+                group=cls.group,
+            )
+            Comment.objects.create(
+                post=post,
+                author=cls.follower,
+                text='Комментарий'
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.follower_client = Client()
+        self.follower_client.force_login(self.follower)
+
+    def test_feed_views_query_count(self):
+        """Ленты index, group_list, profile и follow_index
+        выполняют фиксированное число запросов.
+        """
+        views_queries = {
+            reverse('posts:index'): 3,
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}): 4,
+            reverse('posts:profile', kwargs={'username': 'author'}): 6,
+            reverse('posts:follow_index'): 4,
+        }
+        for name, queries in views_queries.items():
+            with self.subTest(name=name):
+                with self.assertNumQueries(queries):
+                    response = self.follower_client.get(name)
+                self.assertEqual(len(response.context['page_obj']), 10)
+
+    def test_feed_views_without_repeated_queries(self):
+        """Ленты и страница поста не делают запросов на каждую строку."""
+        post = Post.objects.latest('pk')
+        for i in range(5):
+            Comment.objects.create(
+                post=post,
+                author=self.user,
+                text=f'Ответ {i}'
+            )
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+            reverse('posts:post_detail', args=[post.pk]),
+            reverse('posts:comments', args=[post.pk]),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                cache.clear()
+                with assert_query_budget(6, threshold=2):
+                    self.follower_client.get(url)
+
+    def test_feed_views_do_not_count_comments(self):
+        """Число комментариев считает только API, HTML-ленты
+        не выполняют для него подзапрос."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.follower_client.get(url)
+                self.assertFalse(any(
+                    'posts_comment' in query['sql']
+                    for query in queries.captured_queries
+                ))
+
+
 class OnePostTest(BaseTest):
     """Дополнительная проверка. При создании поста и указания у него
     группы, пост доступен на страницах index, group_list и profile.
@@ -247,6 +489,7 @@ class FollowingTest(BaseTest):
     """Тестируем функции подписки и отписки на авторов."""
     def setUp(self):
         super().setUp()
+        cache.clear()
         self.other_user = User.objects.create_user(username='joe')
         self.auth_user_2 = Client()
         self.auth_user_2.force_login(self.other_user)
@@ -327,3 +570,448 @@ class FollowingTest(BaseTest):
         )
         # В проверке учитываем, что подписка должна быть лишь одна.
         self.assertEqual(Follow.objects.count(), self.follow_count + 1)
+
+
+class TimelineTest(BaseTest):
+    """Тестируем материализованную ленту подписок."""
+    def setUp(self):
+        super().setUp()
+        self.reader = User.objects.create_user(username='reader')
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def follow_feed(self):
+        response = self.reader_client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'])
+
+    def test_follow_backfills_and_unfollow_prunes(self):
+        """Подписка добавляет в ленту старые посты, отписка их убирает."""
+        self.reader_client.get(reverse(
+            'posts:profile_follow',
+            kwargs={'username': 'author'})
+        )
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=self.post).exists())
+        self.assertEqual(self.follow_feed(), [self.post])
+        self.reader_client.get(reverse(
+            'posts:profile_unfollow',
+            kwargs={'username': 'author'})
+        )
+        self.assertFalse(TimelineEntry.objects.filter(
+            user=self.reader).exists())
+        self.assertEqual(self.follow_feed(), [])
+
+    def test_new_post_fans_out(self):
+        """Новый пост попадает в ленты подписчиков при записи."""
+        Follow.objects.create(user=self.reader, author=self.user)
+        new_post = Post.objects.create(author=self.user, text='Новый')
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=new_post).exists())
+
+    def test_large_fan_out_runs_in_background(self):
+        """Пост автора со многими подписчиками раскладывает задача."""
+        Follow.objects.create(user=self.reader, author=self.user)
+        with mock.patch.object(timeline, 'INLINE_FAN_OUT', 0):
+            new_post = Post.objects.create(author=self.user, text='Новый')
+        entries = TimelineEntry.objects.filter(
+            user=self.reader, post=new_post)
+        self.assertFalse(entries.exists())
+        self.assertTrue(Task.objects.filter(name='posts.fan_out').exists())
+        tasks.run_pending()
+        self.assertTrue(entries.exists())
+
+    def test_comment_touches_large_feeds_in_background(self):
+        """Комментарий к посту автора со многими подписчиками
+        сдвигает версии их лент задачей."""
+        Follow.objects.create(user=self.reader, author=self.user)
+        scope = versions.follows(self.reader.pk)
+        before = versions.latest(scope)
+        with mock.patch.object(timeline, 'INLINE_FAN_OUT', 0):
+            with capture_on_commit_callbacks(execute=True):
+                self.reader_client.post(
+                    reverse('posts:add_comment', args=[self.post.pk]),
+                    {'text': 'Комментарий'}
+                )
+        self.assertEqual(versions.latest(scope), before)
+        self.assertTrue(
+            Task.objects.filter(name='posts.touch_followers').exists()
+        )
+        with capture_on_commit_callbacks(execute=True):
+            tasks.run_pending()
+        self.assertNotEqual(versions.latest(scope), before)
+
+    def test_celebrity_posts_read_on_fan_out_on_read(self):
+        """Посты знаменитостей не раскладываются, но видны в ленте."""
+        with mock.patch.object(timeline, 'CELEBRITY_FOLLOWERS', 1):
+            Follow.objects.create(user=self.reader, author=self.user)
+            new_post = Post.objects.create(author=self.user, text='Новый')
+            self.assertFalse(TimelineEntry.objects.filter(
+                user=self.reader).exists())
+            self.assertEqual(self.follow_feed(), [new_post, self.post])
+
+    def test_former_celebrity_posts_stay_in_feed(self):
+        """Посты, опубликованные в бытность знаменитостью, остаются
+        в лентах, когда автор опускается ниже порога."""
+        fan = User.objects.create_user(username='fan')
+        with mock.patch.object(timeline, 'CELEBRITY_FOLLOWERS', 2):
+            Follow.objects.create(user=self.reader, author=self.user)
+            Follow.objects.create(user=fan, author=self.user)
+            new_post = Post.objects.create(author=self.user, text='Новый')
+            self.assertFalse(TimelineEntry.objects.filter(
+                post=new_post).exists())
+            Follow.objects.filter(user=fan).delete()
+            self.assertTrue(Task.objects.filter(
+                name='posts.backfill_followers').exists())
+            tasks.run_pending()
+            self.assertTrue(TimelineEntry.objects.filter(
+                user=self.reader, post=new_post).exists())
+            self.assertEqual(self.follow_feed(), [new_post, self.post])
+
+
+class QueryPlanTest(TestCase):
+    """Основные запросы лент читают посты по индексу,
+    без полного просмотра таблицы и временной сортировки.
+    """
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='test_slug',
+            description='Описание для теста'
+        )
+        Follow.objects.create(user=cls.reader, author=cls.user)
+        for i in range(12):
+            Post.objects.create(
+                author=cls.user,
+                text=f'Текст поста {i}',
+                group=cls.group
+            )
+        popular.rebuild()
+
+    def setUp(self):
+        cache.clear()
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def explain(self, sql):
+        vendor = connection.vendor
+        with connection.cursor() as cursor:
+            if vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute('EXPLAIN ' + sql)
+            else:
+                cursor.execute('EXPLAIN QUERY PLAN ' + sql)
+            return [str(row[-1]) for row in cursor.fetchall()]
+
+    def assertUsesIndex(self, sql):
+        if connection.vendor not in ('sqlite', 'postgresql'):
+            self.skipTest('План запроса проверяется для SQLite и PostgreSQL')
+        plan = self.explain(sql)
+        if connection.vendor == 'sqlite':
+            full_scans = [
+                line for line in plan
+                if line.startswith('SCAN') and 'INDEX' not in line
+            ]
+            sorts = [line for line in plan if 'TEMP B-TREE' in line]
+        else:
+            full_scans = [line for line in plan if 'Seq Scan' in line]
+            sorts = [line for line in plan if 'Sort Key' in line]
+        self.assertEqual(full_scans + sorts, [], '\n'.join(plan))
+
+    def main_query(self, url, data=None):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.reader_client.get(url, data)
+        posts_queries = [
+            query['sql'] for query in queries
+            if 'FROM "posts_post"' in query['sql']
+            and 'LIMIT' in query['sql']
+        ]
+        self.assertEqual(len(posts_queries), 1)
+        return response, posts_queries[0]
+
+    def test_feed_views_use_indexes(self):
+        """Ленты постов и популярные ленты используют индексы
+        и на первой, и на следующей странице.
+        """
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:follow_index'),
+            reverse('posts:popular'),
+            reverse('posts:group_popular', kwargs={'slug': 'test_slug'}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response, sql = self.main_query(url)
+                self.assertUsesIndex(sql)
+                next_cursor = response.context['page_obj'].next_cursor
+                response, sql = self.main_query(url, {'cursor': next_cursor})
+                self.assertUsesIndex(sql)
+
+    def test_comments_use_index(self):
+        """Комментарии поста выбираются по индексу (post, created)."""
+        post = Post.objects.first()
+        comments = post.comments.order_by('created')[:10]
+        self.assertUsesIndex(str(comments.query))
+
+
+class SearchTest(TestCase):
+    """Тестируем полнотекстовый поиск."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.cats = Post.objects.create(
+            author=cls.user,
+            text='Коты любят спать. Коты, коты и еще раз коты.'
+        )
+        cls.dogs = Post.objects.create(
+            author=cls.user,
+            text='Собака гуляет с котом во дворе.'
+        )
+        cls.birds = Post.objects.create(
+            author=cls.user,
+            text='Птицы улетели на юг.'
+        )
+        Comment.objects.create(
+            post=cls.birds,
+            author=cls.user,
+            text='А кошки остались дома.'
+        )
+
+    def search(self, query):
+        response = self.client.get(reverse('posts:search'), {'q': query})
+        return list(response.context['page_obj'])
+
+    def test_search_is_ranked_and_stemmed(self):
+        """Поиск учитывает словоформы и ранжирует посты."""
+        self.assertEqual(self.search('кот'), [self.cats, self.dogs])
+
+    def test_search_in_comments(self):
+        """Пост находится по тексту комментария."""
+        self.assertEqual(self.search('кошка'), [self.birds])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при правке и удалении поста."""
+        birds = Post.objects.get(pk=self.birds.pk)
+        birds.text = 'Птицы вернулись с юга.'
+        birds.save()
+        self.assertEqual(self.search('вернулся'), [self.birds])
+        Post.objects.get(pk=self.cats.pk).delete()
+        self.assertEqual(self.search('коты'), [self.dogs])
+
+    def test_empty_query(self):
+        """Пустой запрос ничего не ищет."""
+        self.assertEqual(self.search(''), [])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит посты по индексу."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password'
+        )
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кошки'}
+        )
+        self.assertEqual(
+            list(response.context['cl'].result_list), [self.birds]
+        )
+
+
+class ConditionalPagesTest(TestCase):
+    """Публичные страницы отвечают 304 анонимам по ETag."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='test_slug',
+            description='Описание для теста'
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Текст поста',
+            group=cls.group
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.user)
+
+    def test_anonymous_pages_not_modified(self):
+        """Неизмененная страница отдается анониму как 304."""
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': 'test_slug'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        ]
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertIn('public', response['Cache-Control'])
+                self.assertIn('Cookie', response['Vary'])
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=response['ETag']
+                )
+                self.assertEqual(response.status_code, 304)
+
+    def test_anonymous_pages_read_primary(self):
+        """Страницы с валидаторами не читают с реплик: реплика могла
+        не получить запись, которая сдвинула версию."""
+        with override_settings(DATABASE_REPLICAS=['missing']):
+            response = self.client.get(reverse('posts:index'))
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('ETag', response)
+
+    def test_index_not_modified_without_queries(self):
+        """304 для главной не требует запросов к БД."""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_changes_invalidate_etag(self):
+        """Новый пост и комментарий меняют ETag страниц."""
+        index = reverse('posts:index')
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        index_etag = self.client.get(index)['ETag']
+        detail_etag = self.client.get(detail)['ETag']
+        with capture_on_commit_callbacks(execute=True):
+            Comment.objects.create(
+                post=self.post,
+                author=self.user,
+                text='Комментарий'
+            )
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=detail_etag)
+        self.assertContains(response, 'Комментарий')
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.create(author=self.user, text='Новый пост')
+        response = self.client.get(index, HTTP_IF_NONE_MATCH=index_etag)
+        self.assertContains(response, 'Новый пост')
+
+    def test_renames_invalidate_dependent_pages(self):
+        """Переименование группы или автора комментария меняет ETag
+        страниц, где они видны."""
+        reader = User.objects.create_user(username='reader')
+        Comment.objects.create(post=self.post, author=reader, text='Ответ')
+        profile = reverse('posts:profile', kwargs={'username': 'author'})
+        detail = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        urls = (profile, detail)
+        etags = {url: self.client.get(url)['ETag'] for url in urls}
+        with capture_on_commit_callbacks(execute=True):
+            group = Group.objects.get(pk=self.group.pk)
+            group.slug = 'new_slug'
+            group.save()
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url, HTTP_IF_NONE_MATCH=etags[url]
+                )
+                self.assertContains(response, 'new_slug')
+        etag = self.client.get(detail)['ETag']
+        with capture_on_commit_callbacks(execute=True):
+            reader.username = 'critic'
+            reader.save()
+        response = self.client.get(detail, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'critic')
+
+    def test_versions_bump_after_commit(self):
+        """Версия сдвигается только после коммита, откат ее не трогает."""
+        key = versions.KEY.format(versions.author(self.user.pk))
+        cache.set(key, 0, None)
+        with capture_on_commit_callbacks() as callbacks:
+            with self.assertRaises(DatabaseError):
+                with transaction.atomic():
+                    Post.objects.create(author=self.user, text='Откат')
+                    raise DatabaseError
+        self.assertEqual(callbacks, [])
+        with capture_on_commit_callbacks(execute=True):
+            Post.objects.create(author=self.user, text='Коммит')
+            self.assertEqual(cache.get(key), 0)
+        self.assertGreater(cache.get(key), 0)
+
+    def test_authorized_pages_are_private(self):
+        """Страницы авторизованного пользователя не кэшируются прокси
+        и всегда рендерятся заново."""
+        url = reverse('posts:index')
+        etag = self.client.get(url)['ETag']
+        response = self.authorized_client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertFalse(response.has_header('ETag'))
+
+
+class CommentPaginationTest(TestCase):
+    """Комментарии к посту выводятся страницами."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(author=cls.user, text='Текст поста')
+        for i in range(25):
+            reader = User.objects.create_user(username=f'reader{i}')
+            Comment.objects.create(
+                post=cls.post,
+                author=reader,
+                text=f'Комментарий {i}'
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_post_detail_shows_first_page(self):
+        """На странице поста первые комментарии и ссылка на следующие."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        )
+        comments = response.context['comments']
+        self.assertEqual(
+            self.texts(comments),
+            [f'Комментарий {i}' for i in range(20)]
+        )
+        self.assertContains(
+            response, reverse('posts:comments', args=[self.post.pk])
+        )
+
+        response = self.client.get(
+            reverse('posts:comments', kwargs={'post_id': self.post.pk}),
+            {'cursor': comments.next_cursor}
+        )
+        self.assertTemplateUsed(
+            response, 'posts/includes/comment_list.html'
+        )
+        self.assertEqual(
+            self.texts(response.context['comments']),
+            [f'Комментарий {i}' for i in range(20, 25)]
+        )
+        self.assertNotContains(response, 'Показать еще')
+
+    def test_newest_first(self):
+        """`?order=new` выводит сначала новые комментарии."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            {'order': 'new'}
+        )
+        self.assertEqual(
+            self.texts(response.context['comments'])[:2],
+            ['Комментарий 24', 'Комментарий 23']
+        )
+
+    def test_query_count_does_not_depend_on_comments(self):
+        """Число запросов страницы поста не растет с комментариями."""
+        other = Post.objects.create(author=self.user, text='Без комментариев')
+        for post in (self.post, other):
+            with self.subTest(post=post.text):
+                cache.clear()
+                with self.assertNumQueries(4):
+                    self.client.get(
+                        reverse('posts:post_detail', args=[post.pk])
+                    )
@@ -0,0 +1,124 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import cards, warmup
+from ..models import Follow, Group, Post
+
+User = get_user_model()
+
+
+class CacheWarmupTest(TestCase):
+    """Тестируем прогрев карточек и защиту от одновременного рендера."""
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.star = User.objects.create_user(username='star')
+        cls.reader = User.objects.create_user(username='reader')
+        Follow.objects.create(user=cls.reader, author=cls.star)
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='test_slug',
+            description='Описание для теста'
+        )
+        cls.group_post = Post.objects.create(
+            author=cls.author, text='В группе', group=cls.group
+        )
+        cls.star_post = Post.objects.create(author=cls.star, text='Звезды')
+        cls.posts = [
+            Post.objects.create(author=cls.author, text=f'Пост {i}')
+            for i in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def cached(self, posts):
+        keys = [cards.card_key(post) for post in posts]
+        return set(cache.get_many(keys)) == set(keys)
+
+    def feed(self):
+        return list(Post.objects.for_feed())
+
+    def test_warm_renders_missing_cards(self):
+        self.assertEqual(warmup.warm(), 5)
+        self.assertTrue(self.cached(self.feed()))
+        self.assertEqual(warmup.warm(), 0)
+
+    def test_top_groups_and_authors(self):
+        """Старые посты групп и популярных авторов прогреваются отдельно."""
+        with mock.patch('posts.views.LIMIT', 1):
+            warmup.warm(pages=1, groups=0, authors=0)
+            self.assertFalse(self.cached([self.group_post]))
+            warmup.warm(pages=1, groups=1, authors=1)
+        posts = {post.pk: post for post in self.feed()}
+        self.assertTrue(self.cached([posts[self.group_post.pk]]))
+        self.assertTrue(self.cached([posts[self.star_post.pk]]))
+
+    def test_warmed_page_renders_no_cards(self):
+        warmup.warm()
+        with mock.patch.object(cards, 'render_to_string') as render:
+            cards.render_cards(self.feed())
+        render.assert_not_called()
+
+    def test_locked_card_is_rendered_once(self):
+        """Карточку под чужой блокировкой не рендерят в кэш повторно."""
+        post = self.feed()[0]
+        lock = cards.LOCK_KEY.format(cards.card_key(post))
+        cache.add(lock, 1)
+        self.assertEqual(cards.warm([post]), 0)
+        with mock.patch.object(cards, 'LOCK_WAIT', 0):
+            [(_, html)] = cards.render_cards([post])
+        self.assertIn(post.text, html)
+        self.assertFalse(self.cached([post]))
+        cache.delete(lock)
+        self.assertEqual(cards.warm([post]), 1)
+        self.assertIsNone(cache.get(lock))
+
+    def test_waits_for_card_rendered_elsewhere(self):
+        post = self.feed()[0]
+        key = cards.card_key(post)
+        cache.add(cards.LOCK_KEY.format(key), 1)
+
+        def render_elsewhere(seconds):
+            cache.set(key, 'готово')
+        with mock.patch.object(cards.time, 'sleep', render_elsewhere):
+            [(_, html)] = cards.render_cards([post])
+        self.assertEqual(html, 'готово')
+
+    def test_one_pass_per_interval(self):
+        self.assertEqual(warmup.warm_if_due(60), 5)
+        self.assertIsNone(warmup.warm_if_due(60))
+
+    def test_pass_lock_is_held_for_the_whole_pass(self):
+        """Долгий проход не дает начать второй, а интервал отсчитывается
+        от его окончания."""
+        def slow_warm(**kwargs):
+            self.assertIsNone(warmup.warm_if_due(0))
+            return 0
+        with mock.patch.object(warmup, 'warm', slow_warm), \
+                mock.patch.object(warmup.cache, 'set') as refresh:
+            self.assertEqual(warmup.warm_if_due(1), 0)
+        refresh.assert_called_once_with(warmup.PASS_KEY, 1, 1)
+
+    def test_group_ranking_is_cached(self):
+        """Рейтинг групп не пересчитывается каждый проход."""
+        self.assertEqual(warmup.top_groups(1), [self.group])
+        with self.assertNumQueries(1):
+            self.assertEqual(warmup.top_groups(1), [self.group])
+
+    def test_thread_starts_once_per_process(self):
+        with mock.patch.object(warmup.threading, 'Thread') as thread, \
+                mock.patch.object(warmup, '_thread_pid', None):
+            warmup.start()
+            warmup.start()
+        thread.return_value.start.assert_called_once()
+
+    def test_command(self):
+        out = StringIO()
+        call_command('warm_cache', stdout=out)
+        self.assertIn('5', out.getvalue())
@@ -0,0 +1,179 @@
+"""Фоновая подготовка адаптивных вариантов картинок постов.
+
+Картинка поста обрезается до пропорций карточки и сохраняется в
+нескольких ширинах (`POST_IMAGE_WIDTHS`) и форматах: JPEG для всех
+браузеров, WebP и AVIF — если их умеет сохранять установленный Pillow.
+Варианты считает фоновая задача `posts.thumbnails`, а их
+описание (адреса, размеры, вес) сохраняется в поле `Post.thumbnails`.
+Шаблоны строят по нему `<picture>` с `srcset`/`sizes` и до окончания
+обработки показывают заглушку, так что Pillow не работает внутри запроса.
+"""
+import hashlib
+import json
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db.models import F
+from PIL import Image, ImageOps
+
+from core import tasks
+
+from . import timeline, versions
+from .models import Post
+
+WIDTHS = getattr(settings, 'POST_IMAGE_WIDTHS', (480, 960, 1440))
+RATIO = getattr(settings, 'POST_IMAGE_RATIO', (960, 339))
+QUALITY = getattr(settings, 'POST_IMAGE_QUALITY', {
+    'AVIF': 50,
+    'WEBP': 75,
+    'JPEG': 80,
+})
+# Атрибут `sizes` тегов <img>/<source>: ширина картинки в раскладке.
+SIZES = getattr(
+    settings, 'POST_IMAGE_SIZES', '(max-width: 992px) 100vw, 960px'
+)
+UPLOAD_TO = 'cache/posts'
+
+# Формат Pillow: (MIME-тип, расширение). Порядок — от лучшего сжатия,
+# браузер берет первый подходящий <source>.
+FORMATS = {
+    'AVIF': ('image/avif', 'avif'),
+    'WEBP': ('image/webp', 'webp'),
+    'JPEG': ('image/jpeg', 'jpg'),
+}
+
+
+def supported_formats():
+    """Форматы, которые умеет сохранять Pillow; JPEG есть всегда."""
+    Image.init()
+    return [fmt for fmt in FORMATS if fmt in Image.SAVE]
+
+
+def target_widths(source_width):
+    """Ширины вариантов для исходника данной ширины.
+
+    Картинка не растягивается сверх исходной ширины, но самый узкий
+    вариант есть всегда, чтобы маленькие картинки не остались без превью.
+    """
+    widths = [width for width in sorted(WIDTHS) if width <= source_width]
+    return widths or [min(WIDTHS)]
+
+
+def render(image, width, fmt, quality=None):
+    """Обрезает картинку до пропорций карточки и кодирует в формат."""
+    height = round(width * RATIO[1] / RATIO[0])
+    variant = ImageOps.fit(
+        image, (width, height), Image.LANCZOS, centering=(0.5, 0.5)
+    )
+    has_alpha = 'A' in variant.getbands()
+    variant = variant.convert(
+        'RGBA' if has_alpha and fmt != 'JPEG' else 'RGB'
+    )
+    options = {'quality': quality or QUALITY.get(fmt, 80)}
+    if fmt == 'JPEG':
+        options.update(optimize=True, progressive=True)
+    elif fmt == 'WEBP':
+        options.update(method=6)
+    buffer = BytesIO()
+    variant.save(buffer, fmt, **options)
+    return buffer.getvalue(), height
+
+
+def open_image(field):
+    field.open('rb')
+    try:
+        image = Image.open(field)
+        image.load()
+    finally:
+        field.close()
+    return ImageOps.exif_transpose(image)
+
+
+def build(post):
+    """Сохраняет варианты картинки поста и возвращает их описание."""
+    image = open_image(post.image)
+    digest = hashlib.md5(post.image.name.encode()).hexdigest()[:12]
+    variants = []
+    for width in target_widths(image.width):
+        for fmt in supported_formats():
+            content, height = render(image, width, fmt)
+            name = default_storage.save(
+                f'{UPLOAD_TO}/{post.pk}/{digest}_{width}.'
+                f'{FORMATS[fmt][1]}',
+                ContentFile(content)
+            )
+            variants.append({
+                'format': fmt,
+                'width': width,
+                'height': height,
+                'name': name,
+                'url': default_storage.url(name),
+                'bytes': len(content),
+            })
+    return describe(variants)
+
+
+def describe(variants):
+    """Собирает из вариантов данные для тега <picture>."""
+    sources = []
+    for fmt, (mime, _) in FORMATS.items():
+        srcset = ', '.join(
+            f"{variant['url']} {variant['width']}w"
+            for variant in variants if variant['format'] == fmt
+        )
+        if srcset:
+            sources.append({'format': fmt, 'type': mime, 'srcset': srcset})
+    fallback = [
+        variant for variant in variants if variant['format'] == 'JPEG'
+    ]
+    # В src идет вариант, ближайший к прежней карточке 960px.
+    src = min(fallback, key=lambda variant: abs(variant['width'] - RATIO[0]))
+    return {
+        'src': src['url'],
+        'width': src['width'],
+        'height': src['height'],
+        'sources': sources,
+        'variants': variants,
+    }
+
+
+def delete_variants(data):
+    for variant in data.get('variants', ()):
+        default_storage.delete(variant['name'])
+
+
+def generate(post_id):
+    """Считает варианты картинки поста и сохраняет их описание."""
+    post = Post.objects.only('pk', 'image', 'author', 'group').filter(
+        pk=post_id
+    ).first()
+    if post is None or not post.image:
+        return {}
+    data = build(post)
+    # Картинку могли сменить, пока считались варианты.
+    updated = Post.objects.filter(pk=post_id, image=post.image.name).update(
+        thumbnails=json.dumps(data),
+        card_version=F('card_version') + 1
+    )
+    if not updated:
+        delete_variants(data)
+        return {}
+    versions.bump(
+        *versions.post_scopes(post.pk, post.author_id, post.group_id)
+    )
+    timeline.touch_followers([post.author_id])
+    return data
+
+
+def schedule(post):
+    """Ставит подготовку вариантов в очередь фоновых задач.
+
+    Варианты прежней картинки удаляются там же, в фоне.
+    """
+    stale = post.image_variants
+    Post.objects.filter(pk=post.pk).update(thumbnails='')
+    post.thumbnails = ''
+    if post.image or stale:
+        tasks.enqueue('posts.thumbnails', post.pk, stale)
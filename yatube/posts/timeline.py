@@ -0,0 +1,223 @@
+"""Материализованные ленты подписок (fan-out-on-write).
+
+Новый пост раскладывается по лентам подписчиков автора, поэтому
+`follow_index` читает одну ленту пользователя, а не соединяет подписки
+с постами. Если подписчиков немного, пост раскладывается сразу при
+записи, иначе — фоновой задачей `posts.fan_out`, чтобы публикация
+не ждала тысячи вставок. Посты авторов с огромным числом подписчиков
+не раскладываются: такие авторы подмешиваются в ленту при чтении
+(fan-out-on-read). Когда после отписок автор опускается ниже порога,
+его последние посты раскладываются по лентам подписчиков задачей
+`posts.backfill_followers`, иначе они пропали бы из лент.
+"""
+from collections import defaultdict
+
+from django.conf import settings
+from django.db.models import F, Q
+
+from core import tasks
+
+from . import versions
+from .models import AuthorStats, Follow, Post, TimelineEntry, User
+
+CELEBRITY_FOLLOWERS = getattr(settings, 'TIMELINE_CELEBRITY_FOLLOWERS', 1000)
+INLINE_FAN_OUT = getattr(settings, 'TIMELINE_INLINE_FAN_OUT', 100)
+BACKFILL_LIMIT = getattr(settings, 'TIMELINE_BACKFILL_LIMIT', 200)
+BATCH_SIZE = 1000
+FEED_KEYS = ('feed_date', 'feed_pk')
+
+
+def is_celebrity(author_id):
+    return AuthorStats.objects.filter(
+        author_id=author_id,
+        followers_count__gte=CELEBRITY_FOLLOWERS
+    ).exists()
+
+
+def followers_count(author_id):
+    return AuthorStats.objects.filter(author_id=author_id).values_list(
+        'followers_count', flat=True
+    ).first() or 0
+
+
+def publish(post):
+    """Раскладывает новый пост сразу или ставит задачу на раскладку."""
+    count = followers_count(post.author_id)
+    if not count or count >= CELEBRITY_FOLLOWERS:
+        return
+    if count <= INLINE_FAN_OUT:
+        write_entries(post)
+    else:
+        tasks.enqueue('posts.fan_out', post.pk, key=f'fan_out:{post.pk}')
+
+
+def fan_out(post):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    if not is_celebrity(post.author_id):
+        write_entries(post)
+
+
+def write_entries(post):
+    followers = list(Follow.objects.filter(
+        author_id=post.author_id
+    ).values_list('user_id', flat=True))
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    versions.bump(*(versions.follows(user_id) for user_id in followers))
+
+
+def touch_followers(author_ids):
+    """Сдвигает версии лент подписчиков авторов после правки их постов.
+
+    Подписчики знаменитостей пропускаются: их ленты сверяются
+    с версией самого автора (см. `feed_scopes`).
+    """
+    followers = Follow.objects.filter(author_id__in=author_ids).exclude(
+        author__stats__followers_count__gte=CELEBRITY_FOLLOWERS
+    ).order_by().values_list('user_id', flat=True).distinct()
+    versions.bump(*(versions.follows(user_id) for user_id in followers))
+
+
+def post_commented(post):
+    """Сдвигает версии лент подписчиков автора поста после нового
+    комментария: при немногих подписчиках сразу, иначе задачей."""
+    count = followers_count(post.author_id)
+    if not count or count >= CELEBRITY_FOLLOWERS:
+        return
+    if count <= INLINE_FAN_OUT:
+        touch_followers([post.author_id])
+    else:
+        tasks.enqueue(
+            'posts.touch_followers',
+            post.author_id,
+            key=f'touch_followers:{post.author_id}'
+        )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика последние посты нового автора."""
+    if is_celebrity(author_id):
+        return
+    posts = Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')[:BACKFILL_LIMIT]
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def followers_dropped(author_id, before, after):
+    """Ставит раскладку постов автора, опустившегося ниже порога
+    знаменитости: их не раскладывали при публикации."""
+    if after < CELEBRITY_FOLLOWERS <= before:
+        tasks.enqueue(
+            'posts.backfill_followers',
+            author_id,
+            key=f'backfill_followers:{author_id}'
+        )
+
+
+def backfill_followers(author_id):
+    """Добавляет последние посты автора в ленты всех его подписчиков."""
+    if is_celebrity(author_id):
+        return
+    posts = list(Post.objects.filter(
+        author_id=author_id
+    ).values_list('pk', 'pub_date')[:BACKFILL_LIMIT])
+    followers = Follow.objects.filter(
+        author_id=author_id
+    ).values_list('user_id', flat=True).iterator()
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for user_id in followers for pk, pub_date in posts),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+    versions.bump(*(
+        versions.follows(user_id)
+        for user_id in Follow.objects.filter(
+            author_id=author_id
+        ).values_list('user_id', flat=True)
+    ))
+
+
+def prune(user_id, author_id):
+    """Убирает из ленты подписчика посты автора, от которого он отписался."""
+    TimelineEntry.objects.filter(
+        user_id=user_id,
+        post__author_id=author_id
+    ).delete()
+
+
+def prune_many(pairs, batch_size=100):
+    """То же для многих пар (подписчик, автор): запрос на пачку
+    подписчиков, а не на пару."""
+    authors = defaultdict(set)
+    for user_id, author_id in pairs:
+        authors[user_id].add(author_id)
+    users = list(authors.items())
+    for start in range(0, len(users), batch_size):
+        condition = Q()
+        for user_id, author_ids in users[start:start + batch_size]:
+            condition |= Q(user_id=user_id, post__author_id__in=author_ids)
+        TimelineEntry.objects.filter(condition).delete()
+
+
+def rebuild(users=None):
+    """Собирает ленты заново по текущим подпискам."""
+    if users is None:
+        users = User.objects.all()
+    TimelineEntry.objects.filter(user__in=users).delete()
+    follows = Follow.objects.filter(
+        user__in=users
+    ).values_list('user_id', 'author_id')
+    for user_id, author_id in follows.iterator():
+        backfill(user_id, author_id)
+
+
+def feed(user):
+    """Посты ленты подписок пользователя.
+
+    Ключ для постраничной разбивки лежит в аннотациях FEED_KEYS:
+    без знаменитостей это поля записи ленты, и лента читается
+    по индексу (user, pub_date, post) без сортировки.
+    """
+    celebrities = celebrity_authors(user.pk)
+    posts = Post.objects.for_feed()
+    if not celebrities:
+        return posts.filter(timeline_entries__user=user).annotate(
+            feed_date=F('timeline_entries__pub_date'),
+            feed_pk=F('timeline_entries__post')
+        )
+    return posts.filter(
+        Q(pk__in=TimelineEntry.objects.filter(user=user).values('post'))
+        | Q(author_id__in=celebrities)
+    ).annotate(feed_date=F('pub_date'), feed_pk=F('pk'))
+
+
+def celebrity_authors(user_id):
+    """Знаменитости среди авторов, на которых подписан пользователь."""
+    return list(Follow.objects.filter(
+        user_id=user_id,
+        author__stats__followers_count__gte=CELEBRITY_FOLLOWERS
+    ).values_list('author_id', flat=True))
+
+
+def feed_scopes(user_id):
+    """Области ленты подписок для условных ответов.
+
+    Разложенные посты сдвигают версию ленты самого пользователя
+    (`write_entries`, `touch_followers`), поэтому число областей
+    зависит только от числа знаменитостей среди подписок.
+    """
+    return [versions.follows(user_id)] + [
+        versions.author(author_id)
+        for author_id in celebrity_authors(user_id)
+    ]
@@ -0,0 +1,135 @@
+"""Версии данных для условных ответов (ETag / Last-Modified).
+
+Версия области (вся лента, группа, автор, пост...) — время ее последнего
+изменения, хранится в кэше. Сигналы сдвигают версии при записи, а вьюхи
+по ним отвечают `304 Not Modified`, не трогая БД и шаблоны.
+
+Версии сдвигаются только после коммита, а страницы с валидаторами
+читаются с primary, не с реплик: иначе запрос, пришедший до коммита
+или прочитавший отстающую реплику, отрендерил бы старые строки под
+новым ETag, и прокси отдавали бы эту копию до следующей записи. Если
+запись выпала из кэша, версия заводится заново текущим временем:
+клиенты один раз получат полный ответ, но не устаревший.
+"""
+import hashlib
+import time
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import quote_etag
+
+from .models import Group, Post, User
+
+KEY = 'version:{}'
+
+FEED = 'posts'
+GROUPS = 'groups'
+POPULAR = 'popular'
+
+
+def group(group_id):
+    return f'group:{group_id}'
+
+
+def author(author_id):
+    return f'author:{author_id}'
+
+
+def post(post_id):
+    return f'post:{post_id}'
+
+
+def follows(user_id):
+    return f'follows:{user_id}'
+
+
+def post_scopes(post_id, author_id, group_id=None):
+    """Все области, в которых виден пост."""
+    scopes = [FEED, author(author_id), post(post_id)]
+    if group_id:
+        scopes.append(group(group_id))
+    return scopes
+
+
+def group_page(slug):
+    """Области страницы группы: список групп и сама группа."""
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True
+    ).first()
+    return [GROUPS, group(group_id)]
+
+
+def post_page(post_id):
+    """Области страницы поста: сам пост, его автор и группа."""
+    row = Post.objects.filter(pk=post_id).values_list(
+        'author_id', 'group_id'
+    ).first()
+    if row is None:
+        return [post(post_id)]
+    author_id, group_id = row
+    scopes = [post(post_id), author(author_id)]
+    if group_id:
+        scopes.append(group(group_id))
+    return scopes
+
+
+def author_page(username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True
+    ).first()
+    return [author(author_id)]
+
+
+def bump(*scopes):
+    """Сдвигает версии областей после коммита текущей транзакции."""
+    transaction.on_commit(lambda: bump_now(*scopes))
+
+
+def bump_now(*scopes):
+    now = time.time()
+    cache.set_many({KEY.format(scope): now for scope in scopes}, None)
+
+
+def latest(*scopes):
+    """Время последнего изменения среди областей."""
+    keys = [KEY.format(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time()
+        cache.set_many(dict.fromkeys(missing, now), None)
+        found.update(dict.fromkeys(missing, now))
+    return max(found.values())
+
+
+def as_datetime(version):
+    return datetime.fromtimestamp(version, timezone.utc)
+
+
+def validators(scopes):
+    """Аргументы `etag_func` и `last_modified_func` для `condition`.
+
+    `scopes(request, **kwargs)` возвращает области, от которых зависит
+    ответ. Версия считается один раз на запрос; в ETag входят адрес
+    с параметрами, пользователь и `RELEASE`, чтобы после выкладки
+    с новыми шаблонами клиенты не получали 304 на старую разметку.
+    """
+    def version(request, **kwargs):
+        if not hasattr(request, 'data_version'):
+            request.data_version = latest(*scopes(request, **kwargs))
+        return request.data_version
+
+    def etag(request, **kwargs):
+        raw = (
+            f'{request.get_full_path()}|{request.user.pk}|'
+            f'{getattr(settings, "RELEASE", "")}|'
+            f'{version(request, **kwargs)}'
+        )
+        return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+    def last_modified(request, **kwargs):
+        return as_datetime(version(request, **kwargs))
+
+    return {'etag_func': etag, 'last_modified_func': last_modified}
@@ -1,33 +1,88 @@
+from functools import wraps
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
 from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import HttpResponseBadRequest
 from django.shortcuts import get_object_or_404, redirect, render
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition, require_POST
+
+from core.routers import primary_reads, replica_reads
 
+from . import (
+    follow_graph, popular, search, thumbnails, timeline, versions
+)
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import AuthorStats, Follow, Group, Post, User
+from .paginator import CursorPaginator, paginate
 
 LIMIT = 10
+COMMENTS_LIMIT = 20
+SUGGESTIONS_LIMIT = 10
+# Порядок комментариев: по убыванию даты или нет.
+COMMENT_ORDERS = {'old': False, 'new': True}
 
 
-def paginator_func(request, post_list):
+def paginator_func(request, post_list, keys=('pub_date', 'pk'), **kwargs):
     """Функция для удобной разбивки и вывода страниц"""
 
-    paginator = Paginator(post_list, LIMIT)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
-    return page_obj
+    return paginate(request, post_list, LIMIT, keys, **kwargs)
+
+
+def public_page(scopes):
+    """Условные ответы и Cache-Control для анонимных посетителей.
+
+    Анонимам страница отдается с ETag и Last-Modified по версиям
+    `scopes` и может кэшироваться прокси; при совпадении валидатора
+    вьюха и шаблон не выполняются вовсе. Такие страницы читаются
+    с primary (см. `core.routers.primary_reads`): реплика могла еще
+    не получить запись, которая сдвинула версию. Страницы авторизованных
+    пользователей персональны, помечаются как private и читают с реплик.
+    """
+    def decorator(view):
+        conditional_view = condition(**versions.validators(scopes))(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.user.is_authenticated:
+                response = view(request, *args, **kwargs)
+                patch_cache_control(response, private=True, max_age=0)
+            else:
+                with primary_reads():
+                    response = conditional_view(request, *args, **kwargs)
+                patch_cache_control(
+                    response,
+                    public=True,
+                    max_age=settings.PUBLIC_PAGE_MAX_AGE,
+                    must_revalidate=True
+                )
+            patch_vary_headers(response, ('Cookie',))
+            return response
+        return wrapper
+    return decorator
+
 
+def post_scopes(request, post_id):
+    return versions.post_page(post_id)
 
+
+@public_page(lambda request: [versions.FEED])
+@replica_reads
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.for_feed()
     context = {
         'page_obj': paginator_func(request, post_list),
     }
     return render(request, 'posts/index.html', context)
 
 
+@public_page(lambda request, slug: versions.group_page(slug))
+@replica_reads
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.for_feed()
     context = {
         'group': group,
         'page_obj': paginator_func(request, post_list),
@@ -35,34 +90,116 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@public_page(
+    lambda request, username: versions.author_page(username)
+)
+@replica_reads
 def profile(request, username):
     author = get_object_or_404(User, username=username)
-    post_list = Post.objects.filter(author=author)
-    following = request.user.is_authenticated and Follow.objects.filter(
-        author=author,
-        user=request.user
-    ).exists()
+    post_list = author.posts.for_feed()
+    following = request.user.is_authenticated and follow_graph.is_following(
+        request.user.pk,
+        author.pk
+    )
     context = {
         'author': author,
+        'stats': AuthorStats.objects.for_author(author),
         'page_obj': paginator_func(request, post_list),
         'following': following
     }
     return render(request, 'posts/profile.html', context)
 
 
+@public_page(lambda request: [versions.FEED, versions.POPULAR])
+@replica_reads
+def popular_index(request):
+    context = {
+        'page_obj': paginator_func(
+            request,
+            popular.feed(),
+            popular.FEED_KEYS,
+            descending=False,
+            parse=int
+        ),
+    }
+    return render(request, 'posts/popular.html', context)
+
+
+@public_page(
+    lambda request, slug: [versions.POPULAR, *versions.group_page(slug)]
+)
+@replica_reads
+def group_popular(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    context = {
+        'group': group,
+        'page_obj': paginator_func(
+            request,
+            popular.feed(group),
+            popular.FEED_KEYS,
+            descending=False,
+            parse=int
+        ),
+    }
+    return render(request, 'posts/popular.html', context)
+
+
+def search_posts(request):
+    query = request.GET.get('q', '').strip()
+    paginator = Paginator(search.SearchResults(query), LIMIT)
+    context = {
+        'query': query,
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, 'posts/search.html', context)
+
+
+@public_page(post_scopes)
+@replica_reads
 def post_detail(request, post_id):
-    post = get_object_or_404(Post, pk=post_id)
+    post = get_object_or_404(
+        Post.objects.select_related('author', 'group'),
+        pk=post_id
+    )
     form = CommentForm()
-    comments = post.comments.all()
     context = {
         'post': post,
+        'stats': AuthorStats.objects.for_author(post.author),
         'form': form,
-        'comments': comments
+        'comments': comments_page(request, post)
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+def comments_page(request, post):
+    """Страница комментариев к посту по `?cursor=` в порядке `?order=`."""
+    order = request.GET.get('order')
+    if order not in COMMENT_ORDERS:
+        order = 'old'
+    paginator = CursorPaginator(
+        post.comments.select_related('author'),
+        COMMENTS_LIMIT,
+        keys=('created', 'pk'),
+        descending=COMMENT_ORDERS[order]
+    )
+    page = paginator.get_cursor_page(request.GET.get('cursor'))
+    page.order = order
+    return page
+
+
+@public_page(post_scopes)
+def post_comments(request, post_id):
+    """Следующая страница комментариев, фрагмент для подгрузки."""
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    context = {
+        'post': post,
+        'comments': comments_page(request, post),
+    }
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -75,6 +212,7 @@ def post_create(request):
             post = form.save(commit=False)
             post.author = author
             post.save()
+            thumbnails.schedule(post)
             return redirect('posts:profile', user)
     return render(request, 'posts/post_create.html', {'form': form})
 
@@ -91,12 +229,15 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.schedule(post)
         return redirect('posts:post_detail', post_id)
     return render(request, 'posts/post_create.html', {'form': form})
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, pk=post_id)
     form = CommentForm(request.POST or None)
@@ -109,15 +250,20 @@ def add_comment(request, post_id):
 
 
 @login_required
+@replica_reads
 def follow_index(request):
-    posts = Post.objects.filter(author__following__user=request.user)
     context = {
-        'page_obj': paginator_func(request, posts)
+        'page_obj': paginator_func(
+            request,
+            timeline.feed(request.user),
+            timeline.FEED_KEYS
+        )
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if author == request.user:
@@ -130,6 +276,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     subscription = get_object_or_404(
@@ -139,3 +286,56 @@ def profile_unfollow(request, username):
     )
     subscription.delete()
     return redirect('posts:profile', username=username)
+
+
+@login_required
+def follow_suggestions(request):
+    """Кого читать и список подписок с массовой отпиской."""
+    ranked = follow_graph.suggestions(request.user.pk, SUGGESTIONS_LIMIT)
+    authors = User.objects.select_related('stats').in_bulk(
+        [author_id for author_id, _ in ranked]
+    )
+    paginator = Paginator(
+        User.objects.filter(following__user=request.user).order_by(
+            'username'
+        ),
+        LIMIT
+    )
+    context = {
+        'suggestions': [
+            (authors[author_id], common)
+            for author_id, common in ranked if author_id in authors
+        ],
+        'page_obj': paginator.get_page(request.GET.get('page')),
+    }
+    return render(request, 'posts/follow_suggestions.html', context)
+
+
+def selected_authors(request):
+    """id авторов из повторяющегося поля `username` формы."""
+    usernames = request.POST.getlist('username')
+    if len(usernames) > follow_graph.BULK_LIMIT:
+        return None
+    return User.objects.filter(username__in=usernames).values_list(
+        'pk', flat=True
+    )
+
+
+@login_required
+@require_POST
+def follow_many(request):
+    author_ids = selected_authors(request)
+    if author_ids is None:
+        return HttpResponseBadRequest('Слишком много авторов.')
+    follow_graph.follow_many(request.user.pk, author_ids)
+    return redirect('posts:follow_suggestions')
+
+
+@login_required
+@require_POST
+def unfollow_many(request):
+    author_ids = selected_authors(request)
+    if author_ids is None:
+        return HttpResponseBadRequest('Слишком много авторов.')
+    follow_graph.unfollow_many(request.user.pk, author_ids)
+    return redirect('posts:follow_suggestions')
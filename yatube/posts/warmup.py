@@ -0,0 +1,132 @@
+"""Прогрев кэша карточек постов.
+
+Страницы лент собираются из карточек (см. `cards`), а карточка после
+правки поста, переименования автора и т.п. рендерится заново первым
+посетителем. Прогрев заранее рендерит недостающие карточки первых
+`CACHE_WARMUP_PAGES` страниц главной, лент `CACHE_WARMUP_GROUPS` групп
+с наибольшим числом постов и `CACHE_WARMUP_AUTHORS` авторов
+с наибольшим числом подписчиков.
+
+Прогрев запускает команда `warm_cache` (разово или с `--interval`)
+либо, при `CACHE_WARMUP_THREAD = True`, фоновый поток в каждом
+веб-процессе. Проход делает не больше одного процесса за интервал:
+право на него берется блокировкой в общем кэше, которая держится
+все время прохода и продлевается на `interval` после его окончания.
+
+Рейтинг групп по числу постов считается агрегатом по всей таблице
+постов, поэтому хранится в кэше `CACHE_WARMUP_RANKING_TIMEOUT` секунд,
+а не пересчитывается каждый проход.
+"""
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import close_old_connections
+from django.db.models import Count
+
+from . import cards, views
+from .models import Group, Post, User
+
+logger = logging.getLogger(__name__)
+
+PAGES = getattr(settings, 'CACHE_WARMUP_PAGES', 3)
+GROUPS = getattr(settings, 'CACHE_WARMUP_GROUPS', 10)
+AUTHORS = getattr(settings, 'CACHE_WARMUP_AUTHORS', 20)
+INTERVAL = getattr(settings, 'CACHE_WARMUP_INTERVAL', 15)
+RANKING_TIMEOUT = getattr(settings, 'CACHE_WARMUP_RANKING_TIMEOUT', 3600)
+# Сколько держится блокировка прохода, если процесс упал посреди него.
+PASS_TIMEOUT = getattr(settings, 'CACHE_WARMUP_PASS_TIMEOUT', 600)
+PASS_KEY = 'cache_warmup:pass'
+GROUPS_KEY = 'cache_warmup:groups:{}'
+
+_thread = None
+_thread_pid = None
+_thread_lock = threading.Lock()
+
+
+def top_groups(limit):
+    key = GROUPS_KEY.format(limit)
+    ids = cache.get(key)
+    if ids is None:
+        ids = list(Group.objects.annotate(
+            posts_count=Count('posts')
+        ).order_by('-posts_count', 'pk').values_list('pk', flat=True)[:limit])
+        cache.set(key, ids, RANKING_TIMEOUT)
+    groups = Group.objects.in_bulk(ids)
+    return [groups[pk] for pk in ids if pk in groups]
+
+
+def top_authors(limit):
+    return User.objects.filter(stats__isnull=False).order_by(
+        '-stats__followers_count', 'pk'
+    )[:limit]
+
+
+def feeds(pages, groups, authors):
+    """Первые `pages` страниц прогреваемых лент в порядке вывода."""
+    size = pages * views.LIMIT
+    yield Post.objects.for_feed()[:size]
+    for group in top_groups(groups):
+        yield group.posts.for_feed()[:size]
+    for author in top_authors(authors):
+        yield author.posts.for_feed()[:size]
+
+
+def warm(pages=PAGES, groups=GROUPS, authors=AUTHORS):
+    """Прогревает ленты. Возвращает число отрендеренных карточек."""
+    return sum(
+        cards.warm(posts) for posts in feeds(pages, groups, authors)
+    )
+
+
+def warm_if_due(interval=INTERVAL, **kwargs):
+    """Прогревает, если за `interval` секунд этого не сделал никто.
+
+    Возвращает число отрендеренных карточек или None, если проход
+    уже сделан другим процессом.
+    """
+    if not cache.add(PASS_KEY, 1, max(interval, PASS_TIMEOUT)):
+        return None
+    try:
+        return warm(**kwargs)
+    finally:
+        cache.set(PASS_KEY, 1, interval)
+
+
+def run(interval=INTERVAL):
+    """Цикл фонового потока: проход раз в `interval` секунд."""
+    while True:
+        try:
+            warm_if_due(interval)
+        except Exception:
+            logger.exception('Прогрев кэша не удался')
+        finally:
+            close_old_connections()
+        time.sleep(interval)
+
+
+def start(interval=INTERVAL):
+    """Запускает фоновый поток прогрева, один на процесс.
+
+    После fork поток родителя в дочернем процессе не работает,
+    поэтому поток запускается заново в каждом процессе.
+    """
+    global _thread, _thread_pid
+    with _thread_lock:
+        if _thread_pid == os.getpid():
+            return _thread
+        _thread = threading.Thread(
+            target=run, args=(interval,), name='cache-warmup', daemon=True
+        )
+        _thread.start()
+        _thread_pid = os.getpid()
+        return _thread
+
+
+def start_on_request(sender, **kwargs):
+    """Обработчик `request_started`: поток стартует с первым запросом,
+    а не при импорте, чтобы не работать в миграциях и командах."""
+    start()
@@ -29,6 +29,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.queries.QueryInspectorMiddleware',
+    'core.routers.PrimaryStickinessMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -61,12 +64,74 @@ TEMPLATES = [
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+# При заданном POSTGRES_DB база — PostgreSQL (нужен пакет psycopg2),
+# иначе SQLite. Соединения с PostgreSQL живут DB_CONN_MAX_AGE секунд
+# и проверяются перед переиспользованием, см. core/db.py. За пулером
+# в режиме транзакций (DB_POOLER=pgbouncer) серверные курсоры
+# отключаются: курсор не переживает смену соединения пулером.
+POSTGRES_DB = os.getenv('POSTGRES_DB')
+if POSTGRES_DB:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': POSTGRES_DB,
+            'USER': os.getenv('POSTGRES_USER', 'postgres'),
+            'PASSWORD': os.getenv('POSTGRES_PASSWORD', ''),
+            'HOST': os.getenv('DB_HOST', 'localhost'),
+            'PORT': os.getenv('DB_PORT', '5432'),
+            'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+            'CONN_HEALTH_CHECKS': True,
+            'DISABLE_SERVER_SIDE_CURSORS': (
+                os.getenv('DB_POOLER') == 'pgbouncer'
+            ),
+            'OPTIONS': {'connect_timeout': 5},
+        }
     }
-}
+else:
+    # SQLite с WAL и ожиданием блокировок, см. core/backends/sqlite3.
+    # SQLITE_TUNED=0 возвращает стандартный режим (журнал отката,
+    # synchronous=FULL) — например, для сравнения в benchmark_writes.
+    SQLITE_PRAGMAS = {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        'busy_timeout': 5000,
+        'mmap_size': 256 * 1024 * 1024,
+    }
+    SQLITE_TUNED = os.getenv('SQLITE_TUNED', '1') == '1'
+    DATABASES = {
+        'default': {
+            'ENGINE': 'core.backends.sqlite3',
+            'NAME': os.getenv(
+                'SQLITE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')
+            ),
+            'PRAGMAS': SQLITE_PRAGMAS if SQLITE_TUNED else {},
+            'TRANSACTION_MODE': 'IMMEDIATE' if SQLITE_TUNED else None,
+        }
+    }
+
+# Реплики для чтения тяжелых вьюх, см. core/routers.py: хосты реплик
+# PostgreSQL через запятую в DB_REPLICA_HOSTS или, для проверки
+# локально, второй файл SQLite (копия основного) в SQLITE_REPLICA_PATH.
+# В тестах реплики — зеркала default.
+if POSTGRES_DB:
+    REPLICA_HOSTS = [
+        host for host in os.getenv('DB_REPLICA_HOSTS', '').split(',') if host
+    ]
+    REPLICA_DATABASES = [
+        dict(DATABASES['default'], HOST=host) for host in REPLICA_HOSTS
+    ]
+elif os.getenv('SQLITE_REPLICA_PATH'):
+    REPLICA_DATABASES = [
+        dict(DATABASES['default'], NAME=os.getenv('SQLITE_REPLICA_PATH'))
+    ]
+else:
+    REPLICA_DATABASES = []
+DATABASE_REPLICAS = []
+for index, replica in enumerate(REPLICA_DATABASES, 1):
+    DATABASES[f'replica{index}'] = dict(replica, TEST={'MIRROR': 'default'})
+    DATABASE_REPLICAS.append(f'replica{index}')
+DATABASE_ROUTERS = ['core.routers.ReplicaRouter']
+REPLICA_STICKY_SECONDS = 10
 
 
 AUTH_PASSWORD_VALIDATORS = [
@@ -112,8 +177,96 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
-CACHES = {
-    'default': {
+# L1 — кэш в памяти воркера, L2 — общий для всех воркеров кэш.
+# При заданном REDIS_URL L2 живет в Redis (нужен пакет django-redis),
+# иначе в файлах в CACHE_DIR. Файлы кэша читаются через pickle, поэтому
+# каталог задается только явно и должен быть доступен одному сайту,
+# а не общий временный. Без обеих переменных L2 живет в памяти
+# процесса — годится для разработки, но не для нескольких воркеров.
+REDIS_URL = os.getenv('REDIS_URL')
+CACHE_DIR = os.getenv('CACHE_DIR')
+if REDIS_URL:
+    SHARED_CACHE = {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_URL,
+    }
+elif CACHE_DIR:
+    SHARED_CACHE = {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': CACHE_DIR,
+    }
+else:
+    SHARED_CACHE = {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'yatube-shared',
+        'OPTIONS': {'MAX_ENTRIES': 10000},
     }
+
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.TieredCache',
+        'OPTIONS': {
+            'L2': 'shared',
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 30,
+            'INVALIDATION_INTERVAL': 0.5,
+        },
+    },
+    'shared': SHARED_CACHE,
 }
+
+TIMELINE_CELEBRITY_FOLLOWERS = 1000
+# До стольких подписчиков пост раскладывается по лентам прямо при записи.
+TIMELINE_INLINE_FAN_OUT = 100
+TIMELINE_BACKFILL_LIMIT = 200
+
+# Популярная лента, см. posts/popular.py и команду score_popular.
+POPULAR_SIZE = 100
+POPULAR_MAX_AGE_DAYS = 7
+POPULAR_VELOCITY_HOURS = 24
+POPULAR_GRAVITY = 1.5
+
+# Граф подписок в кэше, см. posts/follow_graph.py.
+FOLLOW_GRAPH_TIMEOUT = 60 * 60
+FOLLOW_GRAPH_MAX_CACHED = 10000
+# Сколько авторов можно подписать или отписать одним запросом.
+FOLLOW_BULK_LIMIT = 100
+
+# Прогрев кэша карточек постов, см. posts/warmup.py и команду warm_cache.
+CACHE_WARMUP_PAGES = 3
+CACHE_WARMUP_GROUPS = 10
+CACHE_WARMUP_AUTHORS = 20
+CACHE_WARMUP_INTERVAL = 15
+CACHE_WARMUP_RANKING_TIMEOUT = 60 * 60
+CACHE_WARMUP_PASS_TIMEOUT = 10 * 60
+# Прогревать фоновым потоком в каждом веб-процессе, без отдельной команды.
+CACHE_WARMUP_THREAD = os.getenv('CACHE_WARMUP_THREAD') == '1'
+
+# Адаптивные варианты картинок постов, см. posts/thumbnails.py.
+POST_IMAGE_WIDTHS = (480, 960, 1440)
+POST_IMAGE_RATIO = (960, 339)
+POST_IMAGE_QUALITY = {'AVIF': 50, 'WEBP': 75, 'JPEG': 80}
+POST_IMAGE_SIZES = '(max-width: 992px) 100vw, 960px'
+
+# Условные ответы публичных страниц, см. posts/versions.py.
+# RELEASE входит в ETag: после выкладки с новыми шаблонами старые
+# копии страниц перестают считаться актуальными.
+RELEASE = os.getenv('RELEASE', '')
+PUBLIC_PAGE_MAX_AGE = 0
+
+# Метрики запросов, см. core/metrics.py. Доля запросов с подробными
+# замерами БД, шаблонов и кэша; METRICS_TOKEN открывает /metrics/
+# для Prometheus без входа на сайт.
+METRICS_SAMPLE_RATE = float(os.getenv('METRICS_SAMPLE_RATE', '0.1'))
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Поиск N+1, см. core/queries.py: в DEBUG форма запроса, повторенная
+# столько раз за запрос, попадает в лог core.queries.
+QUERY_REPEAT_THRESHOLD = 3
+
+# Очередь фоновых задач, см. core/tasks.py. Задачи выполняет
+# `manage.py run_tasks`; при TASKS_EAGER=1 — сразу внутри запроса.
+TASKS_EAGER = os.getenv('TASKS_EAGER') == '1'
+# Через столько секунд задача в работе считается брошенной воркером.
+TASKS_TIMEOUT = 600
+TASKS_KEEP_DONE = 24 * 60 * 60